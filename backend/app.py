@@ -1,22 +1,43 @@
+import logging
+from importlib import import_module
+
 from flask import Flask
 from flask_cors import CORS
-# from models import db
+from models import db
 from config import Config
-from routes.auth import auth_bp
-from routes.entities import entities_bp
-from routes.users import users_bp
-from routes.regulations import regulations_bp
-from routes.activities import activities_bp
-from routes.categories import categories_bp
-from routes.holidays import holidays_bp
-from routes.tasks import tasks_bp
-from routes.analysis import analysis_bp
-from models.models import *
-from routes.global_dash import analysis_global_dash
+from services.db_pool import instrument_pool
+from services.logging_setup import configure_logging
+from services.request_metrics import init_request_metrics, instrument_queries
+from commands import register_commands
+
+# Blueprints registered by create_app(), as (module, attribute). The route
+# modules are only imported when the app is created, so tools that import
+# one of them (benchmarks, CLI commands) do not load the whole application.
+BLUEPRINTS = (
+    ('routes.auth', 'auth_bp'),
+    ('routes.entities', 'entities_bp'),
+    ('routes.users', 'users_bp'),
+    ('routes.regulations', 'regulations_bp'),
+    ('routes.activities', 'activities_bp'),
+    ('routes.imports', 'imports_bp'),
+    ('routes.categories', 'categories_bp'),
+    ('routes.holidays', 'holidays_bp'),
+    ('routes.tasks', 'tasks_bp'),
+    ('routes.analysis', 'analysis_bp'),
+    ('routes.monitoring', 'monitoring_bp'),
+    ('routes.global_dash', 'analysis_global_dash'),
+)
+
+def _in_cli_command():
+    """True while a `flask <command>` other than `flask run` loads the app."""
+    import click
+    context = click.get_current_context(silent=True)
+    return context is not None and context.info_name != 'run'
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
+    configure_logging(app.config)
     
     # Initialize extensions
     db.init_app(app)
@@ -25,24 +46,24 @@ def create_app(config_class=Config):
     CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True, methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
     
     # Register blueprints
-    app.register_blueprint(auth_bp)
-    app.register_blueprint(entities_bp)
-    app.register_blueprint(users_bp)
-    app.register_blueprint(regulations_bp)
-    app.register_blueprint(activities_bp)
-    app.register_blueprint(categories_bp)
-    app.register_blueprint(holidays_bp)
-    app.register_blueprint(tasks_bp)
-    app.register_blueprint(analysis_bp)
-    # app.register_blueprint(analysis_global_dash)
-    # Create database tables if they don't exist
+    for module_name, attribute in BLUEPRINTS:
+        app.register_blueprint(getattr(import_module(module_name), attribute))
+    register_commands(app)
+    init_request_metrics(app)
     with app.app_context():
-        db.create_all()
+        # Count connections opened by the shared pool
+        instrument_pool(db.engine)
+        if app.config.get('REQUEST_METRICS_ENABLED'):
+            instrument_queries(db.engine)
+    
+    # Deliver queued notifications in the background of the web server when
+    # enabled; CLI commands (migrations, imports, ...) never start the worker
+    if app.config.get('NOTIFICATION_OUTBOX_WORKER') and not _in_cli_command():
+        from services.notification_outbox import start_outbox_worker
+        start_outbox_worker(app)
     
-    # Register blueprint with proper debugging
-    print("Registering analysis_global_dash blueprint")
-    app.register_blueprint(analysis_global_dash)
-    print(f"Registered routes: {[str(rule) for rule in app.url_map.iter_rules()]}")
+    if app.config.get('LOG_REGISTERED_ROUTES'):
+        logging.getLogger(__name__).info("Registered routes", extra={"routes": [str(rule) for rule in app.url_map.iter_rules()]})
     
     return app
 
@@ -50,4 +71,4 @@ def create_app(config_class=Config):
 app = create_app()
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000) 
\ No newline at end of file
+    app.run(debug=True, port=5000)
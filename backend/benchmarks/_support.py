@@ -0,0 +1,62 @@
+"""
+Shared setup for the benchmark scripts in this directory.
+
+Benchmarks run against a throwaway SQLite database (or BENCH_DATABASE_URL) so
+they can be executed from the backend directory without a MySQL server:
+
+    python benchmarks/<script>.py
+"""
+import os
+import sys
+from contextlib import contextmanager
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from flask import Flask
+from sqlalchemy import event
+
+from models import db
+
+
+def create_bench_app(database_url=None, **config):
+    """
+    Create a bare Flask app bound to the benchmark database with all tables created.
+
+    Extra keyword arguments are set as app config values.
+    """
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url or os.environ.get('BENCH_DATABASE_URL', 'sqlite://')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config.update(config)
+    db.init_app(app)
+    with app.app_context():
+        import models.models  # noqa: F401  register the tables
+        db.create_all()
+    return app
+
+
+class QueryCounter:
+    """Counts the SQL statements executed on an engine while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+@contextmanager
+def count_queries():
+    counter = QueryCounter(db.engine)
+    with counter:
+        yield counter
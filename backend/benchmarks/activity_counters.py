@@ -0,0 +1,138 @@
+"""
+Checks and times the entity_regulation activity counters.
+
+Links many entities to a set of regulations, then adds, flips and deletes
+activities through the activity routes and fails (exit status 1) if
+
+- an activity change issues more SQL statements when more entities are linked
+  to its regulation (the delta must be one UPDATE for all of them),
+- the statement counts differ from EXPECTED_STEPS, or
+- the counters differ from a full recount afterwards.
+
+Expected counts: update_activity and delete_activity take 3 statements (lock
+the activity, write it, one counter UPDATE). add_activity takes 4: the
+activity ID reservation (UPDATE and SELECT of id_sequences, on its own
+connection), the INSERT and the counter UPDATE; the first add of a
+regulation takes 5, as creating its ID counter reads MAX(activity_id) and
+INSERTs the counter instead of the SELECT.
+
+Finally corrupts some counters and times reconcile_activity_counts() over the
+whole table.
+"""
+import sys
+import time
+
+from _support import count_queries, create_bench_app
+from sqlalchemy import insert, update
+
+from models import db
+from models.models import ActivityMaster, Category, EntityMaster, EntityRegulation, RegulationMaster
+from routes.activities import activities_bp
+from services.entity_regulations import add_regulations_to_entity, reconcile_activity_counts
+
+REGULATIONS = 80
+ACTIVITIES_PER_REGULATION = 6
+ENTITIES = (5, 500)
+CORRUPTED = 1000
+# Statements of the first add, a later add, an update and a delete (see above)
+EXPECTED_STEPS = (5, 4, 3, 3)
+
+
+def seed():
+    db.session.add(Category(category_id=1, category_type='Bench'))
+    for regulation in range(REGULATIONS):
+        db.session.add(RegulationMaster(regulation_id=f"R{regulation}", regulation_name=f"Act {regulation}",
+                                        category_id=1))
+    db.session.flush()
+    db.session.execute(insert(ActivityMaster), [{
+        "regulation_id": f"R{regulation}", "activity_id": index + 1, "activity_description": "d",
+        "mandatory_optional": "M" if index % 3 else "O", "obsolete_current": "C",
+    } for regulation in range(REGULATIONS) for index in range(ACTIVITIES_PER_REGULATION)])
+    db.session.commit()
+
+
+def link_entities(first, count):
+    db.session.execute(insert(EntityMaster), [{
+        "entity_id": f"E{entity}", "entity_name": f"Entity {entity}", "location": 'l', "contact_phno": '1',
+        "description": 'd', "country": 'IN',
+    } for entity in range(first, first + count)])
+    for entity in range(first, first + count):
+        add_regulations_to_entity(f"E{entity}", [f"R{regulation}" for regulation in range(REGULATIONS)])
+    db.session.commit()
+
+
+def change_activities(client, regulation_id):
+    """Add two activities, flip one and delete one; returns the statement count of each step."""
+    steps = []
+    for _ in range(2):
+        with count_queries() as counter:
+            response = client.post('/add_activity', json={"regulation_id": regulation_id, "mandatory_optional": "M"})
+        assert response.status_code == 201, response.get_json()
+        steps.append(counter.count)
+
+    activity_id = db.session.query(db.func.max(ActivityMaster.activity_id)) \
+                            .filter(ActivityMaster.regulation_id == regulation_id).scalar()
+    with count_queries() as counter:
+        response = client.post(f'/update_activity/{regulation_id}/{activity_id}', json={"mandatory_optional": "O"})
+    assert response.status_code == 200, response.get_json()
+    steps.append(counter.count)
+
+    with count_queries() as counter:
+        response = client.delete(f'/delete_activity/{regulation_id}/1')
+    assert response.status_code == 200, response.get_json()
+    steps.append(counter.count)
+    return steps
+
+
+def main():
+    app = create_bench_app()
+    app.register_blueprint(activities_bp)
+    client = app.test_client()
+    failures = 0
+
+    with app.app_context():
+        seed()
+        seen = set()
+        linked = 0
+        for round_number, entities in enumerate(ENTITIES):
+            link_entities(linked, entities - linked)
+            linked = entities
+            steps = change_activities(client, f"R{round_number}")
+            seen.add(tuple(steps))
+            print(f"{entities:4} linked entities: first add/add/update/delete activity = "
+                  f"{'/'.join(map(str, steps))} statements")
+        if len(seen) != 1:
+            failures += 1
+            print(f"FAIL statement count depends on the number of linked entities: {sorted(seen)}")
+        elif seen != {EXPECTED_STEPS}:
+            failures += 1
+            print(f"FAIL expected {'/'.join(map(str, EXPECTED_STEPS))} statements")
+
+        checked, corrected = reconcile_activity_counts()
+        if corrected:
+            failures += 1
+            print(f"FAIL {corrected} of {checked} counters were wrong after the incremental updates")
+        else:
+            print(f"ok   all {checked} counters match a full recount")
+
+        db.session.execute(
+            update(EntityRegulation)
+            .where(EntityRegulation.entity_id.in_([f"E{entity}" for entity in range(CORRUPTED // REGULATIONS)]))
+            .values(mandatory_activities=99)
+        )
+        db.session.commit()
+        started = time.perf_counter()
+        with count_queries() as counter:
+            checked, corrected = reconcile_activity_counts()
+        elapsed = time.perf_counter() - started
+        print(f"reconcile: {checked} rows checked, {corrected} corrected in {elapsed * 1000:.0f} ms, "
+              f"{counter.count} statements")
+        if corrected != CORRUPTED // REGULATIONS * REGULATIONS or reconcile_activity_counts()[1]:
+            failures += 1
+            print("FAIL reconcile did not repair the corrupted counters")
+        db.drop_all()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""
+Throughput and correctness check of the bulk regulation/activity import.
+
+Generates a regulations CSV and an activities CSV (activities refer to their
+regulation by name, a few rows are deliberately invalid), imports both
+through POST /import/<kind> and fails (exit status 1) unless
+
+- every valid row is imported and every invalid row is reported with its
+  spreadsheet row number,
+- activity IDs are numbered 1..n per regulation,
+- the entity_regulation counters of a linked entity include the imported activities,
+- the statement count grows with the number of chunks, not rows.
+
+Then times the same number of activities posted one at a time to
+/add_activity for comparison. XLSX files are checked as well when openpyxl is
+installed.
+
+    python benchmarks/bulk_import.py [activities]
+"""
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+
+from _support import count_queries, create_bench_app
+
+from config import Config
+from models import db
+from models.models import ActivityMaster, Category, EntityMaster, EntityRegulation
+from routes.activities import activities_bp
+from routes.imports import imports_bp
+from services.entity_regulations import add_regulations_to_entity
+
+REGULATIONS = 20
+CHUNK_SIZE = 1000
+PER_ROW_SAMPLE = 500
+BAD_ACTIVITY_ROWS = {7: "frequency", 123: "mandatory_optional", 4567: "regulation_name"}
+
+
+def regulations_csv():
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["Regulation Name", "Category ID", "Regulatory Body", "Internal External", "Effective From"])
+    for number in range(REGULATIONS):
+        writer.writerow([f"Framework Rule {number}", 1, "Board", "External" if number % 2 else "I", "2026-04-01"])
+    writer.writerow(["Broken Rule", 99, "", "X", "01/04/2026"])  # unknown category, bad code, bad date
+    return buffer.getvalue().encode('utf-8')
+
+
+def activities_csv(count):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["regulation_name", "activity", "activity_description", "mandatory_optional", "frequency",
+                     "criticality"])
+    for index in range(count):
+        row = [f"Framework Rule {index % REGULATIONS}", f"Activity {index}", "Do the thing",
+               "O" if index % 4 == 0 else "M", 12, "High"]
+        broken = BAD_ACTIVITY_ROWS.get(index + 2)  # +2: header row and 1-based numbering
+        if broken == "frequency":
+            row[4] = "monthly"
+        elif broken == "mandatory_optional":
+            row[3] = "Maybe"
+        elif broken == "regulation_name":
+            row[0] = "No Such Rule"
+        writer.writerow(row)
+    return buffer.getvalue().encode('utf-8')
+
+
+def post_file(client, kind, content, filename):
+    with count_queries() as counter:
+        started = time.perf_counter()
+        response = client.post(f'/import/{kind}', data={"file": (io.BytesIO(content), filename)},
+                               content_type='multipart/form-data')
+        elapsed = time.perf_counter() - started
+    assert response.status_code == 200, response.get_json()
+    return response.get_json(), counter.count, elapsed
+
+
+def main():
+    activities = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    Config.IMPORT_CHUNK_SIZE = CHUNK_SIZE
+    handle, path = tempfile.mkstemp(suffix='.db', prefix='rcms_import_')
+    os.close(handle)
+    app = create_bench_app(f"sqlite:///{path}")
+    app.register_blueprint(imports_bp)
+    app.register_blueprint(activities_bp)
+    client = app.test_client()
+    failures = []
+
+    try:
+        with app.app_context():
+            db.session.add(Category(category_id=1, category_type='Bench'))
+            db.session.add(EntityMaster(entity_id='E1', entity_name='Entity', location='l', contact_phno='1',
+                                        description='d', country='IN'))
+            db.session.commit()
+
+            report, statements, elapsed = post_file(client, 'regulations', regulations_csv(), 'rules.csv')
+            print(f"regulations: {report['imported']} imported, {report['failed']} failed, {statements} statements")
+            if report['imported'] != REGULATIONS or {e['row'] for e in report['errors']} != {REGULATIONS + 2}:
+                failures.append(f"regulation import report {report['imported']} / {report['errors']}")
+            framework = [entry['regulation_id'] for entry in report['created']]
+            add_regulations_to_entity('E1', framework)
+            db.session.commit()
+
+            report, statements, elapsed = post_file(client, 'activities', activities_csv(activities), 'acts.csv')
+            print(f"activities:  {report['imported']} of {report['rows']} imported in {report['chunks']} chunks, "
+                  f"{elapsed:.2f} s ({report['rows_per_second']} rows/s), {statements} statements")
+            expected_errors = sorted(row for row in BAD_ACTIVITY_ROWS if row < activities + 2)
+            if report['imported'] != activities - len(expected_errors) \
+                    or sorted(e['row'] for e in report['errors']) != expected_errors:
+                failures.append(f"activity import report {report['imported']} / {report['errors'][:5]}")
+            # Per chunk: regulation lookup, insert, counter update and an ID reservation per
+            # regulation, plus creating each regulation's ID counter once
+            if statements > report['chunks'] * (3 + 2 * REGULATIONS) + REGULATIONS:
+                failures.append(f"{statements} statements for {report['chunks']} chunks")
+
+            first = framework[0]
+            ids = sorted(a.activity_id for a in ActivityMaster.query.filter_by(regulation_id=first))
+            if ids != list(range(1, len(ids) + 1)):
+                failures.append(f"activity ids of {first} are not 1..{len(ids)}")
+            link = db.session.get(EntityRegulation, ('E1', first))
+            mandatory = ActivityMaster.query.filter_by(regulation_id=first, mandatory_optional='M').count()
+            optional = ActivityMaster.query.filter_by(regulation_id=first, mandatory_optional='O').count()
+            if (link.mandatory_activities, link.optional_activities) != (mandatory, optional):
+                failures.append(f"entity counters {link.mandatory_activities}/{link.optional_activities}, "
+                                f"expected {mandatory}/{optional}")
+
+            try:
+                import openpyxl
+            except ImportError:
+                print("xlsx: skipped, openpyxl is not installed")
+            else:
+                workbook = openpyxl.Workbook()
+                sheet = workbook.active
+                for row in csv.reader(io.StringIO(activities_csv(50).decode('utf-8'))):
+                    sheet.append(row)
+                content = io.BytesIO()
+                workbook.save(content)
+                report, _, _ = post_file(client, 'activities', content.getvalue(), 'acts.xlsx')
+                print(f"xlsx: {report['imported']} of {report['rows']} imported")
+                if report['imported'] != 50 - sum(row < 52 for row in BAD_ACTIVITY_ROWS):
+                    failures.append(f"xlsx import report {report}")
+
+            started = time.perf_counter()
+            for index in range(PER_ROW_SAMPLE):
+                client.post('/add_activity', json={"regulation_id": first, "activity": f"One by one {index}"})
+            per_row = PER_ROW_SAMPLE / (time.perf_counter() - started)
+            print(f"one at a time through /add_activity: {per_row:.0f} rows/s")
+
+            db.drop_all()
+    finally:
+        os.unlink(path)
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Compare one Graph event POST per reminder row and per task due date (what
+add_calendar_events_from_queue and schedule_calendar_events did) against the
+coalescing, $batch-based calendar sync, both against the fake Graph server.
+
+The data set has USERS preparer/reviewer pairs, each assigned a weekly, a
+monthly, a quarterly and a one-time activity with every due date up to the
+end of next year, plus two reminders per task in the first REMINDER_DAYS days.
+The run then checks that a second sync sends nothing, that extending a
+weekly series updates its existing event instead of creating a new one, that
+a due date moved off the pattern (as for a holiday) splits a series into one
+event per task and back, and that a series down to one open task keeps its
+event.
+"""
+import logging
+import time
+from datetime import date, timedelta
+
+import requests
+from _support import create_bench_app
+from fake_graph_server import start_fake_graph
+
+from models import db
+from models.models import (
+    ActivityMaster,
+    CalendarEventLink,
+    Category,
+    EntityMaster,
+    EntityRegulationTasks,
+    MessageQueue,
+    RegulationMaster,
+    Users,
+)
+from services.calendar_sync import CalendarSync
+from utils.recurrence import occurrences, to_dates
+
+USERS = 10
+REMINDER_DAYS = 30
+GRAPH_LATENCY = 0.01
+ACTIVITIES = {1: ('Weekly return', 52), 2: ('Monthly filing', 12), 3: ('Quarterly audit', 4), 4: ('Annual licence', 0)}
+
+
+def seed(today):
+    db.session.add(EntityMaster(entity_id='E1', entity_name='Bench', location='l', contact_phno='1',
+                                description='d', country='IN'))
+    db.session.add(Category(category_id=1, category_type='Bench'))
+    db.session.add(RegulationMaster(regulation_id='R1', regulation_name='Bench Act', category_id=1))
+    first_due = today + timedelta(days=1)
+    for activity_id, (name, frequency) in ACTIVITIES.items():
+        db.session.add(ActivityMaster(regulation_id='R1', activity_id=activity_id, activity_description=name,
+                                      activity=name, frequency=frequency, frequency_timeline=first_due))
+    for index in range(USERS * 2):
+        db.session.add(Users(user_id=f"u{index}", entity_id='E1', user_name=f"User {index}", mobile_no=str(index),
+                             email_id=f"user{index}@example.com", password='x', role='User'))
+    db.session.flush()
+
+    horizon = date(today.year + 1, 12, 31)
+    tasks, reminders = [], []
+    for pair in range(USERS):
+        preparer, reviewer = f"u{pair * 2}", f"u{pair * 2 + 1}"
+        for activity_id, (name, frequency) in ACTIVITIES.items():
+            due_dates = to_dates(occurrences(first_due, frequency, horizon)) if frequency else [first_due]
+            for due_on in due_dates:
+                tasks.append(EntityRegulationTasks(
+                    entity_id='E1', regulation_id='R1', activity_id=activity_id, due_on=due_on,
+                    preparation_responsibility=preparer, review_responsibility=reviewer, status='Yet to Start'))
+                if due_on <= today + timedelta(days=REMINDER_DAYS):
+                    for user in (pair * 2, pair * 2 + 1):
+                        reminders.append(MessageQueue(message_des=f"Reminder: {name} Due Soon", date=due_on,
+                                                      email_id=f"user{user}@example.com", status='Scheduled'))
+    db.session.add_all(tasks + reminders)
+    db.session.commit()
+    return len(tasks), len(reminders)
+
+
+def legacy_sync(server):
+    started = time.perf_counter()
+    calls = 0
+    with requests.Session() as http:
+        for message in MessageQueue.query.filter_by(status='Scheduled').all():
+            http.post(f"{server.url}/users/{message.email_id}/events", json={"subject": message.message_des},
+                      headers={'Authorization': 'Bearer bench', 'client-request-id': f"legacy-reminder-{message.s_no}"})
+            calls += 1
+        for task in EntityRegulationTasks.query.all():
+            http.post(f"{server.url}/users/user0@example.com/events", json={"subject": str(task.activity_id)},
+                      headers={'Authorization': 'Bearer bench', 'client-request-id': f"legacy-task-{task.id}"})
+            calls += 1
+    return calls, time.perf_counter() - started
+
+
+def main():
+    logging.basicConfig(level=logging.CRITICAL)
+    server = start_fake_graph(latency=GRAPH_LATENCY)
+    app = create_bench_app(GRAPH_API_BASE_URL=server.url, CALENDAR_SYNC_CONCURRENCY=4)
+    today = date.today()
+    try:
+        with app.app_context():
+            task_count, reminder_count = seed(today)
+            calls, legacy = legacy_sync(server)
+        print(f"data         {task_count} tasks, {reminder_count} reminders")
+        print(f"one by one   {calls} Graph calls in {legacy:6.2f} s")
+
+        sync = CalendarSync(app, token_source=lambda: 'bench-token')
+        stats = sync.run(today)
+        print(f"calendar     {stats['requests']} events in {stats['batches']} $batch calls "
+              f"in {stats['elapsed_seconds']:6.2f} s ({stats['reminder_events']} reminder days, "
+              f"{stats['task_events']} task events)")
+        expected_task_events = USERS * (3 + 1)
+        assert stats['task_events'] == expected_task_events, stats
+        assert stats['created'] == stats['requests'], stats
+
+        rerun = sync.run(today)
+        assert rerun['requests'] == 0, rerun
+        print(f"re-run       {rerun['requests']} Graph requests")
+
+        with app.app_context():
+            last = db.session.query(db.func.max(EntityRegulationTasks.due_on)).filter_by(activity_id=1).scalar()
+            db.session.add(EntityRegulationTasks(
+                entity_id='E1', regulation_id='R1', activity_id=1, due_on=last + timedelta(days=7),
+                preparation_responsibility='u0', review_responsibility='u1', status='Yet to Start'))
+            db.session.commit()
+        extended = sync.run(today)
+        assert extended['updated'] == 1 and extended['created'] == 0, extended
+        print(f"extension    {extended['updated']} series updated in place")
+
+        def open_tasks(activity_id, preparer):
+            return EntityRegulationTasks.query.filter_by(
+                activity_id=activity_id, preparation_responsibility=preparer, status='Yet to Start',
+            ).order_by(EntityRegulationTasks.due_on).all()
+
+        # A monthly due date moved back a day: the pattern no longer fits
+        with app.app_context():
+            monthly = open_tasks(2, 'u2')
+            moved, original = monthly[1].id, monthly[1].due_on
+            monthly[1].due_on = original - timedelta(days=1)
+            db.session.commit()
+        shifted = sync.run(today)
+        assert shifted['updated'] == 1 and shifted['created'] == len(monthly) - 1, shifted
+        print(f"shifted      series split into 1 update and {shifted['created']} task events")
+
+        with app.app_context():
+            db.session.get(EntityRegulationTasks, moved).due_on = original
+            db.session.commit()
+        restored = sync.run(today)
+        assert restored == dict(restored, updated=1, created=0, deleted=len(monthly) - 1), restored
+        print(f"restored     series updated, {restored['deleted']} task events deleted")
+
+        # A quarterly series down to its last open task keeps its event
+        with app.app_context():
+            for task in open_tasks(3, 'u4')[:-1]:
+                task.status = 'Completed'
+            db.session.commit()
+        last_one = sync.run(today)
+        assert last_one['updated'] == 1 and last_one['created'] == 0, last_one
+        print(f"last task    {last_one['updated']} event updated in place")
+
+        with app.app_context():
+            links = CalendarEventLink.query.count()
+            statuses = dict(db.session.query(MessageQueue.status, db.func.count()).group_by(MessageQueue.status).all())
+        assert links == stats['created'], links
+        assert statuses == {'Added to Calendar': reminder_count}, statuses
+        assert not server.duplicates(), server.duplicates()
+        print(f"links        {links} events linked, reminders {statuses}, no duplicate creates")
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Query plan regression check for the dashboard's due date filters.
+
+Seeds entity_regulation_tasks, then EXPLAINs the dashboard queries for each
+kind of time window and fails (exit status 1) if the planner does not use
+the expected entity_regulation_tasks index:
+
+- one entity and a window: ix_ert_entity_due_on
+- every entity (global admin) and a window: ix_ert_due_on_status
+
+Runs on SQLite by default; point BENCH_DATABASE_URL at a MySQL database to
+check the production planner as well (the rollup breakdown query is only
+checked there).
+"""
+import sys
+from datetime import date, timedelta
+
+from _support import create_bench_app
+from sqlalchemy import insert, text
+
+from models import db
+from models.models import Category, EntityMaster, EntityRegulationTasks, RegulationMaster
+from routes.global_dash import (
+    add_detail_filters, build_task_filters, detail_count_sql, detailed_rows_sql, export_rows_sql, status_breakdowns_sql,
+)
+
+ENTITIES = 50
+TASKS_PER_ENTITY = 400
+TODAY = date(2026, 6, 15)
+
+CASES = [
+    ("entity, Current Month", dict(time_period='Current Month', entity_id='E7'), 'ix_ert_entity_due_on'),
+    ("entity, Previous 3 Months", dict(time_period='Previous 3 Months', entity_id='E7'), 'ix_ert_entity_due_on'),
+    ("entity, from/to", dict(entity_id='E7', date_from=date(2026, 1, 1), date_to=date(2026, 1, 31)), 'ix_ert_entity_due_on'),
+    ("global, Next Month", dict(time_period='Next Month', entity_id='PILGC01'), 'ix_ert_due_on_status'),
+    ("global, from only", dict(entity_id='PILGC01', date_from=date(2026, 12, 1)), 'ix_ert_due_on_status'),
+]
+
+
+def seed():
+    db.session.add(Category(category_id=1, category_type='Bench'))
+    db.session.add(RegulationMaster(regulation_id='R1', regulation_name='Bench Act', category_id=1))
+    rows = []
+    for entity in range(ENTITIES):
+        db.session.add(EntityMaster(entity_id=f"E{entity}", entity_name=f"Entity {entity}", location='l',
+                                    contact_phno='1', description='d', country='IN'))
+        rows.extend({
+            "entity_id": f"E{entity}", "regulation_id": 'R1', "activity_id": 1,
+            "due_on": date(2025, 1, 1) + timedelta(days=index * 2),
+            "status": ('Yet to Start', 'WIP', 'Completed')[index % 3],
+        } for index in range(TASKS_PER_ENTITY))
+    db.session.flush()
+    for offset in range(0, len(rows), 5000):
+        db.session.execute(insert(EntityRegulationTasks.__table__).values(rows[offset:offset + 5000]))
+    db.session.commit()
+
+
+def explain(sql, params, dialect):
+    """Return the plan as one lower-cased string."""
+    if dialect == 'sqlite':
+        rows = db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params).all()
+        return "\n".join(str(row[-1]) for row in rows).lower()
+    rows = db.session.execute(text(f"EXPLAIN {sql}"), params).mappings().all()
+    return "\n".join(f"{row.get('table')}: {row.get('key')}" for row in rows).lower()
+
+
+def main():
+    app = create_bench_app()
+    failures = 0
+    with app.app_context():
+        seed()
+        dialect = db.engine.dialect.name
+        if dialect == 'sqlite':
+            db.session.execute(text("ANALYZE"))
+        elif dialect == 'mysql':
+            db.session.execute(text("ANALYZE TABLE entity_regulation_tasks"))
+
+        for label, filters, expected in CASES:
+            filters = dict(dict(time_period='All', internal_external='All', mandatory_optional='All'), **filters)
+            where_sql, params = build_task_filters(current_date=TODAY, **filters)
+            drill_sql, drill_params = add_detail_filters(where_sql, params, status='Due', criticality='High')
+            queries = [("detail page", detailed_rows_sql(where_sql), dict(params, limit=100, offset=0)),
+                       ("drill-down", detailed_rows_sql(drill_sql), dict(drill_params, limit=100, offset=0)),
+                       ("detail count", detail_count_sql(drill_sql), drill_params),
+                       ("export", export_rows_sql(where_sql), params)]
+            if dialect == 'mysql':
+                queries.append(("breakdowns", status_breakdowns_sql(where_sql), params))
+
+            for name, sql, query_params in queries:
+                plan = explain(sql, query_params, dialect)
+                ok = expected in plan
+                failures += not ok
+                print(f"{'ok  ' if ok else 'FAIL'} {label:28} {name:12} expects {expected}")
+                if not ok:
+                    print("     " + plan.replace("\n", "\n     "))
+
+        db.drop_all()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
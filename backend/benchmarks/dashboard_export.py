@@ -0,0 +1,82 @@
+"""
+Peak Python memory of /api/global-task-summary/export against materialising
+the same detail rows as one JSON list, for growing task counts.
+
+The export streams from a server-side cursor in EXPORT_CHUNK_SIZE chunks,
+so its peak should stay flat while the JSON list grows with the row count.
+"""
+import json
+import tracemalloc
+from datetime import date, timedelta
+
+from _support import create_bench_app
+from sqlalchemy import insert, text
+
+from models import db
+from models.models import ActivityMaster, Category, EntityMaster, EntityRegulationTasks, RegulationMaster
+from routes.global_dash import analysis_global_dash, build_task_filters, DETAIL_JOINS_SQL, TASK_STATUS_SQL
+
+SIZES = (10000, 50000, 200000)
+
+
+def seed(count):
+    db.session.execute(text("DELETE FROM entity_regulation_tasks"))
+    if not db.session.get(EntityMaster, 'E1'):
+        db.session.add(EntityMaster(entity_id='E1', entity_name='Bench', location='l', contact_phno='1',
+                                    description='d', country='IN'))
+        db.session.add(Category(category_id=1, category_type='Bench'))
+        db.session.add(RegulationMaster(regulation_id='R1', regulation_name='Bench Act', category_id=1))
+        db.session.add(ActivityMaster(regulation_id='R1', activity_id=1, activity_description='x',
+                                      activity='Bench activity', frequency=52))
+    start = date(2025, 1, 1)
+    rows = [{
+        "entity_id": 'E1', "regulation_id": 'R1', "activity_id": 1, "due_on": start + timedelta(days=index % 700),
+        "status": ('Yet to Start', 'WIP', 'Completed')[index % 3], "end_date": start + timedelta(days=index % 700),
+        "criticality": 'High', "internal_external": 'I', "mandatory_optional": 'M',
+    } for index in range(count)]
+    for offset in range(0, count, 5000):
+        db.session.execute(insert(EntityRegulationTasks.__table__).values(rows[offset:offset + 5000]))
+    db.session.commit()
+
+
+def materialised_json():
+    where_sql, params = build_task_filters('All', 'All', 'All', 'E1', date.today())
+    query = f"SELECT em.entity_name, a.activity, ert.due_on, {TASK_STATUS_SQL} AS status {DETAIL_JOINS_SQL} {where_sql}"
+    rows = [dict(row) for row in db.session.execute(text(query), params).mappings()]
+    return len(json.dumps(rows, default=str))
+
+
+def streamed_export(client):
+    response = client.get('/api/global-task-summary/export?entity_id=E1')
+    size = sum(len(block) for block in response.response)
+    response.close()
+    return size
+
+
+def measure(function, *args):
+    tracemalloc.start()
+    size = function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, peak
+
+
+def main():
+    app = create_bench_app('sqlite:////tmp/rcms_export_bench.db', EXPORT_CHUNK_SIZE=1000)
+    app.register_blueprint(analysis_global_dash)
+    client = app.test_client()
+    try:
+        for count in SIZES:
+            with app.app_context():
+                seed(count)
+                json_size, json_peak = measure(materialised_json)
+            csv_size, csv_peak = measure(streamed_export, client)
+            print(f"{count:>7} tasks  json list {json_size / 1e6:6.1f} MB peak {json_peak / 1e6:7.1f} MB   "
+                  f"csv export {csv_size / 1e6:6.1f} MB peak {csv_peak / 1e6:5.1f} MB")
+    finally:
+        with app.app_context():
+            db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
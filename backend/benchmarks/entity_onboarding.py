@@ -0,0 +1,99 @@
+"""
+Query count regression check for entity onboarding.
+
+Posts /add_entity and /add_entity_regulations with 2, 10 and 80 selected
+regulations and fails (exit status 1) unless every size issues the same
+number of SQL statements: activity counts come from one grouped query, the
+entity_regulation rows from one bulk insert and removals from one UPDATE.
+"""
+import sys
+
+from _support import count_queries, create_bench_app
+
+from models import db
+from models.models import ActivityMaster, Category, EntityRegulation, RegulationMaster
+from routes.entities import entities_bp
+from routes.regulations import regulations_bp
+
+REGULATIONS = 120
+ACTIVITIES_PER_REGULATION = 6
+SIZES = (2, 10, 80)
+
+ENTITY = {
+    "entity_name": "Bench", "location": "l", "contact_phno": "1", "alternate_contact": "2",
+    "description": "d", "country": "IN", "contact_name": "Bench", "alternate_contact_name": "a",
+    "state": "s", "pincode": "1",
+}
+
+
+def seed():
+    db.session.add(Category(category_id=1, category_type='Bench'))
+    activity_id = 0
+    for regulation in range(REGULATIONS):
+        db.session.add(RegulationMaster(regulation_id=f"R{regulation}", regulation_name=f"Act {regulation}",
+                                        category_id=1))
+        for index in range(ACTIVITIES_PER_REGULATION):
+            activity_id += 1
+            db.session.add(ActivityMaster(
+                activity_id=activity_id, regulation_id=f"R{regulation}", activity=f"A{activity_id}",
+                activity_description="d", mandatory_optional="M" if index % 3 else "O",
+                obsolete_current="O" if index == ACTIVITIES_PER_REGULATION - 1 else None,
+            ))
+    db.session.commit()
+
+
+def post(client, path, payload):
+    with count_queries() as counter:
+        response = client.post(path, json=payload)
+    assert response.status_code in (200, 201), response.get_json()
+    return counter.count, response.get_json()
+
+
+def main():
+    app = create_bench_app()
+    app.register_blueprint(entities_bp)
+    app.register_blueprint(regulations_bp)
+    client = app.test_client()
+    counts = {"add_entity": set(), "add_entity_regulations": set()}
+    failures = 0
+
+    with app.app_context():
+        seed()
+        # Creates the entity ID counter, a one-off statement not counted below
+        post(client, '/add_entity', dict(ENTITY, entity_name="Bench warm-up"))
+        for size in SIZES:
+            selected = [f"R{regulation}" for regulation in range(size)]
+            queries, body = post(client, '/add_entity', dict(ENTITY, entity_name=f"Bench {size}", selected_regulations=selected))
+            entity_id = body["entity_id"]
+            counts["add_entity"].add(queries)
+            print(f"add_entity              {size:3} regulations: {queries} statements")
+
+            # Swap half of the selection out for regulations the entity does not have yet
+            kept = selected[size // 2:]
+            new = [f"R{regulation}" for regulation in range(size, size + size // 2)]
+            queries, body = post(client, '/add_entity_regulations',
+                                 {"entity_id": entity_id, "regulation_ids": kept + new})
+            counts["add_entity_regulations"].add(queries)
+            print(f"add_entity_regulations  {size:3} regulations: {queries} statements "
+                  f"(added {body['added']}, removed {body['removed']})")
+
+            # The counts must match what the per-regulation loop used to store
+            row = EntityRegulation.query.filter_by(entity_id=entity_id, regulation_id=kept[0]).one()
+            if (row.mandatory_activities, row.optional_activities) != (3, 2):
+                failures += 1
+                print(f"FAIL wrong activity counts {row.mandatory_activities}/{row.optional_activities}")
+            retired = EntityRegulation.query.filter_by(entity_id=entity_id, obsolete_current='O').count()
+            if retired != size // 2:
+                failures += 1
+                print(f"FAIL {retired} regulations retired, expected {size // 2}")
+
+        for endpoint, seen in counts.items():
+            if len(seen) != 1:
+                failures += 1
+                print(f"FAIL {endpoint} query count grows with the number of regulations: {sorted(seen)}")
+        db.drop_all()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+Local stand-in for the Microsoft Graph endpoints the notification code calls.
+
+Accepts POST /users/<mailbox>/sendMail (202) and /users/<mailbox>/events (201),
+either directly or as sub-requests of a JSON POST /$batch (at most 20), where
+PATCH (200) and DELETE (204) /users/<mailbox>/events/<id> are accepted as well, with
+configurable latency, transient 503s and rejected mailboxes, and records
+every request so tests can check retries and idempotency keys. Run it on its
+own and point GRAPH_API_BASE_URL at it:
+
+    python benchmarks/fake_graph_server.py --port 8765 --latency 0.2
+    GRAPH_API_BASE_URL=http://127.0.0.1:8765/v1.0 python app.py
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PATH_PATTERN = re.compile(r'^/v1\.0/users/(?P<mailbox>[^/]+)/(?P<resource>sendMail|events)(?:/(?P<event_id>[^/]+))?$')
+BATCH_PATH = '/v1.0/$batch'
+BATCH_LIMIT = 20
+
+
+class FakeGraphServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, transient_failures=0, rejected_mailboxes=()):
+        super().__init__(address, FakeGraphHandler)
+        self.latency = latency
+        self.transient_failures = transient_failures
+        self.rejected_mailboxes = set(rejected_mailboxes)
+        self.lock = threading.Lock()
+        self.requests = []
+        self.batches = 0
+        self.failures_by_key = Counter()
+        self.delivered_by_key = Counter()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1.0"
+
+    def duplicates(self):
+        """Idempotency keys that were accepted more than once."""
+        with self.lock:
+            return {key: count for key, count in self.delivered_by_key.items() if count > 1}
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class FakeGraphHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body=None, headers=None):
+        data = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self, path, key, body, authorized, method='POST'):
+        """Record one (sub-)request and return its (status, body, headers)."""
+        server = self.server
+        match = PATH_PATTERN.match(path)
+        # Only events can be updated or deleted, and only by id
+        if match and (method not in ('POST', 'PATCH', 'DELETE') or (method != 'POST') != bool(match['event_id'])):
+            match = None
+        with server.lock:
+            server.requests.append({'path': path, 'key': key, 'body': body, 'method': method})
+            if not match or not authorized:
+                status = 400
+            elif match['mailbox'] in server.rejected_mailboxes:
+                status = 404
+            elif server.failures_by_key[key] < server.transient_failures:
+                server.failures_by_key[key] += 1
+                status = 503
+            elif method == 'PATCH':
+                status = 200
+            elif method == 'DELETE':
+                status = 204
+            else:
+                server.delivered_by_key[key] += 1
+                status = 202 if match['resource'] == 'sendMail' else 201
+
+        if status == 503:
+            return 503, {"error": {"code": "ServiceUnavailable"}}, {'Retry-After': '0'}
+        if status >= 400:
+            return status, {"error": {"code": "ErrorInvalidUser" if status == 404 else "BadRequest"}}, {}
+        if status in (200, 201):
+            return status, {"id": match['event_id'] or f"event-{key}"}, {}
+        return status, None, {}
+
+    def _handle_batch(self, body, authorized):
+        try:
+            sub_requests = json.loads(body)['requests']
+        except (ValueError, KeyError, TypeError):
+            return self._reply(400, {"error": {"code": "BadRequest"}})
+        if len(sub_requests) > BATCH_LIMIT:
+            return self._reply(400, {"error": {"code": "BadRequest", "message": "Too many requests in batch"}})
+
+        with self.server.lock:
+            self.server.batches += 1
+        responses = []
+        for sub in sub_requests:
+            # Sub-request URLs are relative to the version root
+            key = (sub.get('headers') or {}).get('client-request-id', sub['id'])
+            status, sub_body, headers = self._handle(
+                '/v1.0' + sub['url'], key, json.dumps(sub.get('body')).encode(), authorized, sub.get('method', 'GET'))
+            response = {"id": sub['id'], "status": status, "headers": headers}
+            if sub_body is not None:
+                response["body"] = sub_body
+            responses.append(response)
+        self._reply(200, {"responses": responses})
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        authorized = self.headers.get('Authorization', '').startswith('Bearer ')
+        if server.latency:
+            time.sleep(server.latency)
+
+        if self.path == BATCH_PATH:
+            return self._handle_batch(body, authorized)
+        self._reply(*self._handle(self.path, self.headers.get('client-request-id'), body, authorized))
+
+
+def start_fake_graph(port=0, **options):
+    """Start a fake Graph server on a background thread and return it."""
+    server = FakeGraphServer(('127.0.0.1', port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before answering')
+    parser.add_argument('--transient-failures', type=int, default=0, help='503s returned per idempotency key before accepting')
+    parser.add_argument('--reject', action='append', default=[], help='Mailbox answered with 404')
+    args = parser.parse_args()
+
+    server = FakeGraphServer(('127.0.0.1', args.port), args.latency, args.transient_failures, args.reject)
+    print(f"Fake Graph listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
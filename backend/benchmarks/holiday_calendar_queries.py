@@ -0,0 +1,73 @@
+"""
+Compare the queries issued by due-date holiday adjustment before and after the
+in-memory holiday calendar.
+
+The legacy path issues one HolidayMaster lookup per candidate weekday; the
+calendar loads holiday_master once and answers every lookup with a bisect.
+"""
+import time
+from datetime import date, timedelta
+
+from _support import create_bench_app, count_queries
+from dateutil.relativedelta import relativedelta
+
+from models import db
+from models.models import HolidayMaster
+from services.holiday_calendar import holiday_calendar
+
+ENTITY_ID = 'BENCH001'
+START = date(2025, 1, 6)
+WEEKS = 104
+
+
+def legacy_adjust_due_date_for_holidays(due_date):
+    # The per-day lookup loop the routes used before the calendar
+    while True:
+        if due_date.weekday() == 5:
+            due_date -= relativedelta(days=1)
+        elif due_date.weekday() == 6:
+            due_date -= relativedelta(days=2)
+        else:
+            holiday = HolidayMaster.query.filter_by(holiday_date=due_date).first()
+            if holiday:
+                due_date -= relativedelta(days=1)
+            else:
+                break
+    return due_date
+
+
+def seed_holidays():
+    # A holiday on every fourth Monday so some due dates need to roll back
+    for week in range(0, WEEKS, 4):
+        db.session.add(HolidayMaster(
+            holiday_date=START + timedelta(weeks=week),
+            description=f"Bench holiday {week}",
+            entity_id=ENTITY_ID,
+            obsolete_current='C',
+        ))
+    db.session.commit()
+
+
+def run(label, adjust):
+    candidates = [START + timedelta(weeks=week) for week in range(WEEKS)]
+    started = time.perf_counter()
+    with count_queries() as counter:
+        results = [adjust(candidate) for candidate in candidates]
+    elapsed = time.perf_counter() - started
+    print(f"{label:<10} {len(candidates)} due dates  {counter.count:>5} queries  {elapsed * 1000:8.2f} ms")
+    return results
+
+
+def main():
+    app = create_bench_app()
+    with app.app_context():
+        seed_holidays()
+        holiday_calendar.invalidate()
+
+        before = run('before', legacy_adjust_due_date_for_holidays)
+        after = run('after', lambda day: holiday_calendar.previous_business_day(day, ENTITY_ID))
+        assert before == after, "calendar results differ from the legacy lookup loop"
+
+
+if __name__ == '__main__':
+    main()
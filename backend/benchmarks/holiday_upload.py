@@ -0,0 +1,217 @@
+"""
+Statement count and correctness check of the bulk holiday upload and the due
+date readjust job.
+
+Seeds entities with open and completed tasks due on every weekday of next
+year, then uploads an .ics of global holidays and a .csv of per-entity
+holidays through POST /upload_holidays. Fails (exit status 1) unless
+
+- every expected holiday row exists and a re-upload updates instead of duplicating,
+- no open task is left due on a holiday or a weekend, completed tasks keep their date,
+- the dashboard summary matches a full rebuild after the move,
+- /holidays filters by entity and year,
+- a task due today is not moved to a day that has already passed,
+- an upload that fails after the readjust leaves no trace of its holidays in
+  the shared holiday calendar,
+- the statement count does not grow with the number of tasks or holidays.
+
+    python benchmarks/holiday_upload.py [entities]
+"""
+import io
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from _support import count_queries, create_bench_app
+
+from models import db
+from models.models import (
+    ActivityMaster, Category, DashboardTaskSummary, EntityMaster, EntityRegulationTasks, HolidayMaster,
+    RegulationMaster,
+)
+from routes.holidays import holidays_bp
+import services.holiday_import
+from services.dashboard_summary import rebuild_summary
+from services.holiday_calendar import holiday_calendar
+
+YEAR = date.today().year + 1
+# First Monday of each month of next year: global holidays
+GLOBAL_HOLIDAYS = [date(YEAR, month, 1) + timedelta(days=(7 - date(YEAR, month, 1).weekday()) % 7)
+                   for month in range(1, 13)]
+
+
+def weekdays(year):
+    day = date(year, 1, 1)
+    while day.year == year:
+        if day.weekday() < 5:
+            yield day
+        day += timedelta(days=1)
+
+
+def calendar_ics():
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//Bench//Holidays//EN"]
+    for day in GLOBAL_HOLIDAYS:
+        lines += ["BEGIN:VEVENT", f"DTSTART;VALUE=DATE:{day:%Y%m%d}",
+                  f"DTEND;VALUE=DATE:{day + timedelta(days=1):%Y%m%d}",
+                  f"SUMMARY:Bank holiday\\, {day:%B}", "END:VEVENT"]
+    # Two-day event folded over two lines
+    lines += ["BEGIN:VEVENT", f"DTSTART;VALUE=DATE:{YEAR}1224", f"DTEND;VALUE=DATE:{YEAR}1226",
+              "SUMMARY:Year end", " closure", "END:VEVENT", "END:VCALENDAR"]
+    return "\r\n".join(lines).encode('utf-8')
+
+
+def entity_csv(entities):
+    # Each entity takes its own Wednesday off in March; one broken row
+    rows = ["holiday_date,description,entity_id"]
+    for index, entity_id in enumerate(entities):
+        rows.append(f"{date(YEAR, 3, 1) + timedelta(days=(2 - date(YEAR, 3, 1).weekday()) % 7 + 7 * (index % 4))},"
+                    f"Founders day,{entity_id}")
+    rows.append(f"{YEAR}-02-30,Not a day,{entities[0]}")
+    return "\n".join(rows).encode('utf-8')
+
+
+def seed(entities):
+    db.session.add(Category(category_id=1, category_type='Bench'))
+    db.session.add(RegulationMaster(regulation_id='R1', regulation_name='Rule', category_id=1))
+    db.session.add(ActivityMaster(regulation_id='R1', activity_id=1, activity_description='Do it'))
+    db.session.add_all(EntityMaster(entity_id=entity_id, entity_name=f"Entity {entity_id}", location='l',
+                                    contact_phno='1', description='d', country='IN') for entity_id in entities)
+    days = list(weekdays(YEAR))
+    db.session.execute(EntityRegulationTasks.__table__.insert(), [
+        {"entity_id": entity_id, "regulation_id": 'R1', "activity_id": 1, "due_on": day,
+         "status": 'Completed' if index % 5 == 0 else ('WIP' if index % 2 else 'Yet to Start'),
+         "end_date": day if index % 5 == 0 else None, "criticality": 'High', "internal_external": 'I',
+         "mandatory_optional": 'M'}
+        for entity_id in entities for index, day in enumerate(days)
+    ])
+    db.session.commit()
+    rebuild_summary()
+    return len(entities) * len(days)
+
+
+def upload(client, content, filename, status=200, **form):
+    with count_queries() as counter:
+        started = time.perf_counter()
+        response = client.post('/upload_holidays', data={"file": (io.BytesIO(content), filename), **form},
+                               content_type='multipart/form-data')
+        elapsed = time.perf_counter() - started
+    assert response.status_code == status, response.get_json()
+    return response.get_json(), counter.count, elapsed
+
+
+def failing_record_task_changes(**changes):
+    raise RuntimeError("simulated failure after the readjust")
+
+
+def summary_rows():
+    return sorted((row.entity_id, row.due_month, row.task_status, row.task_count)
+                  for row in DashboardTaskSummary.query.filter(DashboardTaskSummary.task_count != 0))
+
+
+def run(entities, failures):
+    handle, path = tempfile.mkstemp(suffix='.db', prefix='rcms_holidays_')
+    os.close(handle)
+    app = create_bench_app(f"sqlite:///{path}")
+    app.register_blueprint(holidays_bp)
+    client = app.test_client()
+    ids = [f"E{number:03d}" for number in range(entities)]
+    try:
+        with app.app_context():
+            holiday_calendar.invalidate()
+            tasks = seed(ids)
+            completed = EntityRegulationTasks.query.filter_by(status='Completed').count()
+
+            result, ics_statements, elapsed = upload(client, calendar_ics(), 'holidays.ics')
+            expected = len(ids) * (len(GLOBAL_HOLIDAYS) + 2)
+            print(f"{entities} entities, {tasks} tasks: ics {result['holidays']} holidays, "
+                  f"{result['tasks_moved']} tasks moved, {ics_statements} statements, {elapsed * 1000:.0f} ms")
+            if result['holidays'] != expected or HolidayMaster.query.count() != expected:
+                failures.append(f"ics upserted {result['holidays']} / {HolidayMaster.query.count()}, expected {expected}")
+
+            result, csv_statements, elapsed = upload(client, entity_csv(ids), 'founders.csv')
+            print(f"  csv {result['holidays']} holidays, {result['tasks_moved']} tasks moved, "
+                  f"{result['failed']} failed, {csv_statements} statements, {elapsed * 1000:.0f} ms")
+            if result['holidays'] != len(ids) or [e['row'] for e in result['errors']] != [len(ids) + 2]:
+                failures.append(f"csv upload report {result}")
+
+            result, _, _ = upload(client, calendar_ics(), 'holidays.ics')
+            if HolidayMaster.query.count() != expected + len(ids) or result['tasks_moved']:
+                failures.append("re-upload duplicated holidays or moved tasks again")
+            if db.session.get(HolidayMaster, (GLOBAL_HOLIDAYS[0], ids[0])).description != "Bank holiday, January":
+                failures.append("ics SUMMARY not unescaped")
+
+            on_holiday = db.session.query(EntityRegulationTasks).join(
+                HolidayMaster, (HolidayMaster.entity_id == EntityRegulationTasks.entity_id)
+                & (HolidayMaster.holiday_date == EntityRegulationTasks.due_on)
+            ).filter(EntityRegulationTasks.status != 'Completed').count()
+            weekend = [task for task in EntityRegulationTasks.query.filter(EntityRegulationTasks.status != 'Completed')
+                       if task.due_on.weekday() >= 5]
+            if on_holiday or weekend:
+                failures.append(f"{on_holiday} open tasks on a holiday, {len(weekend)} on a weekend")
+            completed_on_holiday = db.session.query(EntityRegulationTasks).join(
+                HolidayMaster, (HolidayMaster.entity_id == EntityRegulationTasks.entity_id)
+                & (HolidayMaster.holiday_date == EntityRegulationTasks.due_on)
+            ).filter(EntityRegulationTasks.status == 'Completed').count()
+            if EntityRegulationTasks.query.filter_by(status='Completed').count() != completed or not completed_on_holiday:
+                failures.append("completed tasks were moved")
+
+            incremental = summary_rows()
+            rebuild_summary()
+            if incremental != summary_rows():
+                failures.append("dashboard summary differs from a rebuild after the readjust")
+
+            response = client.get(f'/holidays?entity_id={ids[0]}&year={YEAR}')
+            listed = response.get_json()['holidays']
+            if len(listed) != len(GLOBAL_HOLIDAYS) + 3 or {h['entity_id'] for h in listed} != {ids[0]}:
+                failures.append(f"/holidays?entity_id&year returned {len(listed)} rows")
+            if client.get(f'/holidays?year_from={YEAR + 1}').get_json()['holidays']:
+                failures.append("/holidays?year_from did not filter")
+            if client.get('/holidays?year_from=2030&year_to=2029').status_code != 400:
+                failures.append("/holidays accepted year_from after year_to")
+
+            # A task due today on a new holiday stays put rather than becoming overdue
+            today = date.today()
+            db.session.add(EntityRegulationTasks(entity_id=ids[0], regulation_id='R1', activity_id=1, due_on=today,
+                                                 status='Yet to Start', criticality='High', internal_external='I',
+                                                 mandatory_optional='M'))
+            db.session.commit()
+            result, _, _ = upload(client, f"holiday_date,description,entity_id\n{today},Closure,{ids[0]}".encode(),
+                                  'today.csv')
+            if result['tasks_moved'] or EntityRegulationTasks.query.filter_by(due_on=today).count() != 1:
+                failures.append("a task due today was moved into the past")
+
+            # A failed upload must not leave its holidays in the shared calendar
+            failed_day = date(YEAR, 7, 15)
+            holiday_calendar.holidays(ids[0])
+            record = services.holiday_import.record_task_changes
+            services.holiday_import.record_task_changes = failing_record_task_changes
+            try:
+                upload(client, f"holiday_date,description,entity_id\n{failed_day},Rolled back,{ids[0]}".encode(),
+                       'failed.csv', status=500)
+            finally:
+                services.holiday_import.record_task_changes = record
+            if holiday_calendar.is_holiday(failed_day, ids[0]) or db.session.get(HolidayMaster, (failed_day, ids[0])):
+                failures.append("holidays of a rolled back upload are still visible")
+
+            db.drop_all()
+        return ics_statements, csv_statements
+    finally:
+        os.unlink(path)
+
+
+def main():
+    sizes = [int(sys.argv[1])] if len(sys.argv) > 1 else [5, 50]
+    failures = []
+    statements = [run(size, failures) for size in sizes]
+    if len(set(statements)) > 1:
+        failures.append(f"statement counts {statements} grow with the number of entities")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
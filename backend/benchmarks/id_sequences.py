@@ -0,0 +1,150 @@
+"""
+Concurrency check and timing of the ID sequence allocator.
+
+Fires add_regulation, add_activity and add_entity (with an admin user)
+requests from many threads at once, all competing for the same prefixes,
+and fails (exit status 1) on any failed request or duplicate regulation,
+activity, entity or user ID. Runs once reserving one value at a time and once
+with per-worker blocks, then times one allocation against the old
+LIKE/ORDER BY scan with many IDs already in use.
+
+Uses a temporary SQLite file (threads need a shared database) unless
+BENCH_DATABASE_URL is set.
+
+    python benchmarks/id_sequences.py [threads] [requests per endpoint]
+"""
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from _support import create_bench_app
+from sqlalchemy import insert
+
+from config import Config
+from models import db
+from models.models import ActivityMaster, Category, EntityMaster, RegulationMaster, Users
+from routes.activities import activities_bp
+from routes.entities import entities_bp
+from routes.regulations import regulations_bp
+from services.id_sequences import id_allocator, next_regulation_id
+
+EXISTING_REGULATIONS = 20000
+TIMED_ALLOCATIONS = 200
+
+
+def duplicates(values):
+    return sorted(value for value, count in Counter(values).items() if count > 1)
+
+
+def storm(app, threads, requests, label, run):
+    client = app.test_client()
+    regulation_id, admin = f"RUN{run}", f"Storm{run}"
+
+    def add_regulation(index):
+        response = client.post('/add_regulation', json={"regulation_name": f"Storm Act {label} {index}",
+                                                        "category_id": 1})
+        return response.status_code, response.get_json().get("regulation_id")
+
+    def add_activity(index):
+        response = client.post('/add_activity', json={"regulation_id": regulation_id, "activity": f"A{index}"})
+        return response.status_code, None
+
+    def add_entity(index):
+        response = client.post('/add_entity', json={
+            "entity_name": f"Storm {label} {index}", "location": 'l', "contact_phno": f"{run}{index:05d}",
+            "alternate_contact": '2', "description": 'd', "country": 'IN', "contact_name": admin,
+            "alternate_contact_name": 'a', "state": 's', "pincode": '1', "admin_email": f"admin{run}.{index}@x",
+            "admin_password": 'p',
+        })
+        return response.status_code, response.get_json().get("entity_id")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(lambda job: job[0](job[1]), [
+            (endpoint, index) for index in range(requests) for endpoint in (add_regulation, add_activity, add_entity)
+        ]))
+    elapsed = time.perf_counter() - started
+
+    failures = sum(status not in (200, 201) for status, _ in results)
+    with app.app_context():
+        activity_ids = [row[0] for row in db.session.query(ActivityMaster.activity_id)
+                        .filter(ActivityMaster.regulation_id == regulation_id)]
+        user_ids = [row[0] for row in db.session.query(Users.user_id).filter(Users.user_id.like(f"{admin}%"))]
+    regulation_ids = [value for status, value in results[0::3] if value]
+    entity_ids = [value for status, value in results[2::3] if value]
+
+    problems = failures
+    for kind, values, expected in (("regulation", regulation_ids, requests), ("activity", activity_ids, requests),
+                                   ("entity", entity_ids, requests), ("user", user_ids, requests)):
+        repeated = duplicates(values)
+        problems += len(repeated) + (len(values) != expected)
+        if repeated or len(values) != expected:
+            print(f"FAIL {label}: {len(values)} {kind} ids for {expected} requests, duplicated {repeated[:5]}")
+    print(f"{'ok  ' if not problems else 'FAIL'} {label:12} {requests * 3} requests on {threads} threads "
+          f"in {elapsed:.2f} s, {failures} failed{'' if problems else ', ids unique'}")
+    return problems
+
+
+def timing(app):
+    with app.app_context():
+        db.session.execute(insert(RegulationMaster), [{
+            "regulation_id": f"TIME{number:05d}", "regulation_name": 'Time', "category_id": 1,
+        } for number in range(1, EXISTING_REGULATIONS + 1)])
+        db.session.commit()
+
+        started = time.perf_counter()
+        for _ in range(TIMED_ALLOCATIONS):
+            last = RegulationMaster.query.filter(RegulationMaster.regulation_id.like("TIME%")) \
+                                         .order_by(RegulationMaster.regulation_id.desc()).first()
+            int(last.regulation_id[4:])
+        scan = (time.perf_counter() - started) / TIMED_ALLOCATIONS
+
+        for block_size in (1, 20):
+            id_allocator.block_size = block_size
+            id_allocator.reset()
+            next_regulation_id("Time")  # seeds the counter once
+            started = time.perf_counter()
+            for _ in range(TIMED_ALLOCATIONS):
+                next_regulation_id("Time")
+            sequence = (time.perf_counter() - started) / TIMED_ALLOCATIONS
+            print(f"next regulation id with {EXISTING_REGULATIONS} in use: scan {scan * 1e6:.0f} us, "
+                  f"sequence (block {block_size}) {sequence * 1e6:.0f} us")
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    Config.PASSWORD_BCRYPT_ROUNDS = 4
+
+    handle, path = tempfile.mkstemp(suffix='.db', prefix='rcms_ids_')
+    os.close(handle)
+    app = create_bench_app(os.environ.get('BENCH_DATABASE_URL') or f"sqlite:///{path}")
+    for blueprint in (regulations_bp, activities_bp, entities_bp):
+        app.register_blueprint(blueprint)
+    with app.app_context():
+        db.session.add(Category(category_id=1, category_type='Bench'))
+        for run in (1, 2):
+            db.session.add(RegulationMaster(regulation_id=f"RUN{run}", regulation_name='Base', category_id=1))
+        db.session.add(EntityMaster(entity_id='STOR001', entity_name='Storm seed', location='l',
+                                    contact_phno='1', description='d', country='IN'))
+        db.session.commit()
+
+    problems = 0
+    try:
+        for run, block_size, label in ((1, 1, 'one at a time'), (2, 10, 'blocks of 10')):
+            id_allocator.block_size = block_size
+            id_allocator.reset()
+            problems += storm(app, threads, requests, label, run)
+        timing(app)
+    finally:
+        with app.app_context():
+            db.drop_all()
+        os.unlink(path)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
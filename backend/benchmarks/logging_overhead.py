@@ -0,0 +1,57 @@
+"""
+Cost per call, in the request thread, of the old print() debugging against
+the queued logging set up by configure_logging(), for a typical payload (the
+entity regulation list get_entity_regulations used to print).
+
+stdout is pointed at a line-buffered file so print() pays for a write per
+line, as it does when a process manager captures it.
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from _support import BACKEND_DIR  # noqa: F401  puts the backend on sys.path
+
+from services.logging_setup import configure_logging, shutdown_logging
+
+CALLS = 20000
+PAYLOAD = [{"regulation_id": f"R{index}", "regulation_name": f"Regulation {index}", "category_type": 'Labour',
+            "internal_external": 'Internal', "mandatory_optional": 'Mandatory'} for index in range(20)]
+
+
+def timed(function):
+    started = time.perf_counter()
+    for _ in range(CALLS):
+        function()
+    return (time.perf_counter() - started) / CALLS * 1e6
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        stdout, stderr = sys.stdout, sys.stderr
+        sys.stdout = open(os.path.join(directory, 'stdout.log'), 'w', buffering=1)
+        sys.stderr = open(os.path.join(directory, 'stderr.log'), 'w', buffering=1)
+        try:
+            printed = timed(lambda: print(PAYLOAD))
+            configure_logging({'LOG_LEVEL': 'INFO', 'LOG_LEVELS': 'bench.sampled=DEBUG', 'LOG_DEBUG_SAMPLE_EVERY': 100})
+            logger = logging.getLogger('bench')
+            sampled = logging.getLogger('bench.sampled')
+            disabled = timed(lambda: logger.debug("Fetched regulations", extra={"regulations": PAYLOAD}))
+            sampled_debug = timed(lambda: sampled.debug("Fetched regulations", extra={"regulations": PAYLOAD}))
+            queued = timed(lambda: logger.info("Fetched %d regulations", len(PAYLOAD)))
+            shutdown_logging()
+        finally:
+            sys.stdout.close()
+            sys.stderr.close()
+            sys.stdout, sys.stderr = stdout, stderr
+
+    print(f"print(payload)                  {printed:7.2f} us per call")
+    print(f"logger.debug, level INFO        {disabled:7.2f} us per call")
+    print(f"logger.debug, sampled 1 in 100  {sampled_debug:7.2f} us per call")
+    print(f"logger.info, queued             {queued:7.2f} us per call")
+
+
+if __name__ == '__main__':
+    main()
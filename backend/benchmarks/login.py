@@ -0,0 +1,145 @@
+"""
+Login cost before and after the password module.
+
+1. Per-login time for every legacy scheme, with the old sequential checks
+   (plaintext, bcrypt, MD5, SHA-256, then a second query for the entity)
+   against check_user_password + one joined query, on the first login
+   (which rehashes to bcrypt) and on later logins.
+2. A login storm: STORM_THREADS threads logging in with bcrypt passwords
+   while another thread times a cheap endpoint, showing the hashing pool
+   keeps bcrypt from occupying every request thread.
+3. A login whose hash outlasts PASSWORD_HASH_TIMEOUT answers 503, as a
+   full hashing queue does, instead of failing with a 500.
+"""
+import hashlib
+import statistics
+import threading
+import time
+
+import bcrypt
+from _support import count_queries, create_bench_app
+
+from models import db
+from models.models import EntityMaster, Users
+from routes.auth import auth_bp
+from routes.categories import categories_bp
+from services.passwords import hashing_pool
+
+ROUNDS = 12
+STORM_THREADS = 16
+STORM_LOGINS = 2
+PASSWORD = 'S3cret-pass'
+
+LEGACY = {
+    'plain': lambda: PASSWORD,
+    'md5': lambda: hashlib.md5(PASSWORD.encode()).hexdigest(),
+    'sha256': lambda: hashlib.sha256(PASSWORD.encode()).hexdigest(),
+    'bcrypt-10': lambda: bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(10)).decode(),
+}
+
+
+def seed():
+    db.session.add(EntityMaster(entity_id='E1', entity_name='Bench', location='l', contact_phno='1',
+                                description='d', country='IN'))
+    users = [(name, make()) for name, make in LEGACY.items()]
+    users += [(f"storm{index}", bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(ROUNDS)).decode())
+              for index in range(STORM_THREADS)]
+    for index, (user_id, password) in enumerate(users):
+        db.session.add(Users(user_id=user_id, entity_id='E1', user_name=user_id, mobile_no=str(index),
+                             email_id=f"{user_id}@example.com", password=password, role='User'))
+    db.session.commit()
+
+
+def legacy_login(user_id):
+    """The checks auth.login made before the password module."""
+    user = Users.query.filter_by(user_id=user_id).first()
+    if user.password != PASSWORD:
+        if user.password.startswith('$2b$'):
+            assert bcrypt.checkpw(PASSWORD.encode('utf-8'), user.password.encode('utf-8'))
+        elif user.password != hashlib.md5(PASSWORD.encode()).hexdigest():
+            assert user.password == hashlib.sha256(PASSWORD.encode()).hexdigest()
+    db.session.get(EntityMaster, user.entity_id)
+    db.session.expire_all()
+
+
+def timed_login(client, user_id):
+    started = time.perf_counter()
+    response = client.post('/login', json={'user_id': user_id, 'password': PASSWORD})
+    assert response.status_code == 200, response.get_json()
+    return (time.perf_counter() - started) * 1000
+
+
+def storm(app):
+    client = app.test_client()
+    stop = threading.Event()
+    probe = []
+
+    def probe_loop():
+        while not stop.is_set():
+            started = time.perf_counter()
+            client.get('/categories')
+            probe.append((time.perf_counter() - started) * 1000)
+            time.sleep(0.005)
+
+    def login_loop(user_id):
+        own = app.test_client()
+        for _ in range(STORM_LOGINS):
+            status = own.post('/login', json={'user_id': user_id, 'password': PASSWORD}).status_code
+            statuses.append(status)
+
+    statuses = []
+    prober = threading.Thread(target=probe_loop)
+    prober.start()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=login_loop, args=(f"storm{index}",)) for index in range(STORM_THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    prober.join()
+    return statuses, elapsed, probe
+
+
+def main():
+    # A file database: the storm needs a connection per thread
+    app = create_bench_app('sqlite:////tmp/rcms_login_bench.db')
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(categories_bp)
+    client = app.test_client()
+    with app.app_context():
+        seed()
+        for name in LEGACY:
+            started = time.perf_counter()
+            legacy_login(name)
+            legacy = (time.perf_counter() - started) * 1000
+            with count_queries() as first_queries:
+                first = timed_login(client, name)
+            with count_queries() as later_queries:
+                later = timed_login(client, name)
+            user = db.session.get(Users, name)
+            db.session.refresh(user)
+            print(f"{name:10} old checks {legacy:7.1f} ms   first login {first:7.1f} ms ({first_queries.count} queries, "
+                  f"now {user.password_scheme} {user.password[:7]})   later logins {later:7.1f} ms ({later_queries.count} queries)")
+
+    try:
+        statuses, elapsed, probe = storm(app)
+        timeout, hashing_pool.timeout = hashing_pool.timeout, 0.001
+        try:
+            slow = client.post('/login', json={'user_id': 'storm0', 'password': PASSWORD}).status_code
+        finally:
+            hashing_pool.timeout = timeout
+    finally:
+        with app.app_context():
+            db.drop_all()
+    print(f"storm      {len(statuses)} bcrypt logins from {STORM_THREADS} threads in {elapsed:.2f} s, "
+          f"statuses {sorted(set(statuses))}; /categories p50 {statistics.median(probe):.1f} ms, "
+          f"max {max(probe):.1f} ms over {len(probe)} probes")
+    print(f"timeout    login answered {slow} when the hash outlasted the pool timeout")
+    print(f"pool       {hashing_pool.snapshot()}")
+    assert slow == 503, slow
+
+
+if __name__ == '__main__':
+    main()
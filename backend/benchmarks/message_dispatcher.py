@@ -0,0 +1,89 @@
+"""
+Compare the old message_queue loop (one sendMail POST and one commit per row)
+against the batched MessageDispatcher, both draining the same number of due
+reminders from the fake Graph server.
+
+The fake server answers after GRAPH_LATENCY seconds per HTTP call. A few
+recipients are invalid and must end up Failed; every other row must end up
+Sent with exactly one accepted delivery.
+"""
+import logging
+import time
+from datetime import date, timedelta
+
+import requests
+from _support import create_bench_app
+from fake_graph_server import start_fake_graph
+
+from models import db
+from models.models import MessageQueue
+from services.message_dispatcher import MessageDispatcher
+
+MESSAGES = 1000
+INVALID_EVERY = 100
+GRAPH_LATENCY = 0.02
+
+
+def seed(count):
+    db.session.query(MessageQueue).delete()
+    due = date.today() - timedelta(days=1)
+    db.session.add_all(
+        MessageQueue(
+            message_des=f"<p>Reminder {index}</p>",
+            date=due,
+            email_id='not-an-address' if index % INVALID_EVERY == 0 else f"user{index}@example.com",
+            status='Scheduled',
+        ) for index in range(count)
+    )
+    db.session.commit()
+
+
+def legacy_loop(server):
+    # What send_scheduled_emails_from_queue did before: POST and commit row by row
+    started = time.perf_counter()
+    with requests.Session() as http:
+        for message in MessageQueue.query.filter(MessageQueue.status.in_(['Scheduled', 'Added to Calendar'])).all():
+            if '@' not in message.email_id:
+                continue
+            http.post(f"{server.url}/users/sender@example.com/sendMail",
+                      json={"message": {"body": {"content": message.message_des}}},
+                      headers={'Authorization': 'Bearer bench', 'client-request-id': f"legacy-{message.s_no}"})
+            message.status = 'Sent'
+            db.session.commit()
+    return time.perf_counter() - started
+
+
+def main():
+    logging.basicConfig(level=logging.CRITICAL)
+    server = start_fake_graph(latency=GRAPH_LATENCY)
+    app = create_bench_app(
+        GRAPH_API_BASE_URL=server.url,
+        MESSAGE_DISPATCH_CONCURRENCY=4,
+        MESSAGE_QUEUE_SENDER='sender@example.com',
+    )
+    try:
+        with app.app_context():
+            seed(MESSAGES)
+            legacy = legacy_loop(server)
+            seed(MESSAGES)
+        print(f"row by row   {MESSAGES} messages in {legacy:6.2f} s  ({MESSAGES / legacy:6.0f} msg/s)")
+
+        stats = MessageDispatcher(app, token_source=lambda: 'bench-token').run()
+        print(f"dispatcher   {MESSAGES} messages in {stats['elapsed_seconds']:6.2f} s  "
+              f"({MESSAGES / stats['elapsed_seconds']:6.0f} msg/s, {stats['rounds']} rounds, "
+              f"{server.batches} $batch calls)")
+
+        with app.app_context():
+            counts = dict(db.session.query(MessageQueue.status, db.func.count()).group_by(MessageQueue.status).all())
+        expected_failed = len(range(0, MESSAGES, INVALID_EVERY))
+        dispatched = {key: count for key, count in server.duplicates().items() if key.startswith('message-queue-')}
+        assert counts == {'Sent': MESSAGES - expected_failed, 'Failed': expected_failed}, counts
+        assert stats['pending'] == 0, stats
+        assert not dispatched, dispatched
+        print(f"statuses     {counts}, no duplicate deliveries")
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Compare a write that sends its notification inline against one that commits
+it to the notification outbox, then drain the outbox against the fake Graph
+server.
+
+The fake server answers after GRAPH_LATENCY seconds and fails every message
+once with a 503 so each delivery exercises the retry path. The run checks
+that every message ends up Sent exactly once and that mail rejected by the
+recipient's mailbox goes out through the fallback mailbox.
+"""
+import logging
+import time
+
+import requests
+from _support import create_bench_app
+from fake_graph_server import start_fake_graph
+
+from models import db
+from models.models import NotificationOutbox
+from services.notification_outbox import OutboxWorker, enqueue_mail
+
+MESSAGES = 200
+GRAPH_LATENCY = 0.02
+
+
+def inline_send(server, count):
+    # What reassign_task did before the outbox: one blocking POST per write
+    started = time.perf_counter()
+    with requests.Session() as http:
+        for index in range(count):
+            http.post(f"{server.url}/users/user{index}@example.com/sendMail",
+                      json={"message": {}}, headers={'Authorization': 'Bearer bench', 'client-request-id': f"inline-{index}"})
+    return time.perf_counter() - started
+
+
+def outbox_enqueue(count):
+    started = time.perf_counter()
+    for index in range(count):
+        mailbox = 'rejected@example.com' if index % 50 == 0 else f"user{index}@example.com"
+        enqueue_mail(mailbox, f"user{index}@example.com", "Bench", "<p>Bench</p>",
+                     fallback_sender='noreply@example.com')
+        db.session.commit()
+    return time.perf_counter() - started
+
+
+def main():
+    # Every message is retried once on purpose; keep the retry warnings quiet
+    logging.basicConfig(level=logging.ERROR)
+    server = start_fake_graph(latency=GRAPH_LATENCY, transient_failures=1,
+                              rejected_mailboxes={'rejected@example.com'})
+    app = create_bench_app(
+        GRAPH_API_BASE_URL=server.url,
+        OUTBOX_WORKERS=8,
+        OUTBOX_BATCH_SIZE=50,
+        OUTBOX_RETRY_BASE_SECONDS=0.01,
+        OUTBOX_RETRY_MAX_SECONDS=0.05,
+    )
+    try:
+        inline = inline_send(server, MESSAGES)
+        with app.app_context():
+            queued = outbox_enqueue(MESSAGES)
+            print(f"inline send  {MESSAGES} writes  {inline / MESSAGES * 1000:8.2f} ms per write")
+            print(f"outbox       {MESSAGES} writes  {queued / MESSAGES * 1000:8.2f} ms per write")
+
+        worker = OutboxWorker(app, token_source=lambda: 'bench-token')
+        started = time.perf_counter()
+        while True:
+            processed = worker.run_once()
+            with app.app_context():
+                remaining = NotificationOutbox.query.filter(NotificationOutbox.status != 'Sent').count()
+            if not remaining:
+                break
+            if not processed:
+                time.sleep(0.01)
+        elapsed = time.perf_counter() - started
+
+        with app.app_context():
+            attempts = db.session.query(db.func.sum(NotificationOutbox.attempts)).scalar()
+        print(f"drained      {MESSAGES} messages in {elapsed:.2f} s  ({MESSAGES / elapsed:.0f} msg/s, {attempts} attempts)")
+
+        assert not server.duplicates(), f"duplicate deliveries: {server.duplicates()}"
+        fallbacks = sum(1 for request in server.requests if '/users/noreply@example.com/' in request['path'])
+        assert fallbacks, "rejected mailbox did not fall back to the shared mailbox"
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Microbenchmark: generate the due-date series of 10k activities with the
+relativedelta stepping loop the routes used before, and with the vectorised
+recurrence engine in utils/recurrence.py.
+"""
+import random
+import time
+from datetime import date, timedelta
+
+import _support  # noqa: F401  puts the backend on sys.path
+from dateutil.relativedelta import relativedelta
+
+from utils.recurrence import FREQUENCY_STEPS, business_day_calendar, occurrences, shift_to_business_days, to_dates
+
+ACTIVITIES = 10_000
+HORIZON = date(2027, 12, 31)
+HOLIDAYS = [date(2026, 1, 26), date(2026, 8, 15), date(2026, 10, 2), date(2027, 1, 26), date(2027, 8, 15)]
+
+LEGACY_STEPS = {
+    52: relativedelta(weeks=1),
+    26: relativedelta(weeks=2),
+    12: relativedelta(months=1),
+    6: relativedelta(months=2),
+    4: relativedelta(months=3),
+    3: relativedelta(months=4),
+    2: relativedelta(months=6),
+    1: relativedelta(years=1),
+}
+
+
+def legacy_series(anchor, frequency, holidays):
+    due_dates = [anchor]
+    temp_due_on = anchor
+    while True:
+        temp_due_on += LEGACY_STEPS[frequency]
+        if temp_due_on > HORIZON:
+            return due_dates
+        adjusted = temp_due_on
+        while adjusted.weekday() >= 5 or adjusted in holidays:
+            adjusted -= timedelta(days=1)
+        due_dates.append(adjusted)
+
+
+def engine_series(anchor, frequency, holidays):
+    series = occurrences(anchor, frequency, HORIZON)
+    return [anchor] + to_dates(shift_to_business_days(series[1:], holidays))
+
+
+def main():
+    rng = random.Random(42)
+    activities = [
+        (date(2026, 1, 1) + timedelta(days=rng.randint(0, 364)), rng.choice(list(FREQUENCY_STEPS)))
+        for _ in range(ACTIVITIES)
+    ]
+    holiday_set = set(HOLIDAYS)
+
+    results = {}
+    for label, generate, holidays in (
+        ('relativedelta loop', legacy_series, holiday_set),
+        ('recurrence engine', engine_series, business_day_calendar(HOLIDAYS)),
+    ):
+        started = time.perf_counter()
+        series = [generate(anchor, frequency, holidays) for anchor, frequency in activities]
+        elapsed = time.perf_counter() - started
+        total = sum(len(dates) for dates in series)
+        print(f"{label:<20} {ACTIVITIES} activities  {total} due dates  {elapsed * 1000:9.1f} ms")
+        results[label] = series
+
+    assert results['relativedelta loop'] == results['recurrence engine'], "engine output differs from the legacy loop"
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Overhead of the request instrumentation and a check of its N+1 detector.
+
+Serves two versions of a holiday lookup for ENTITIES entities: one query per
+entity (the loop the detector should flag) and one set-based query. Each is
+requested REQUESTS times with and without init_request_metrics /
+instrument_queries, then the recorded totals and /metrics output are checked.
+"""
+import logging
+import time
+from datetime import date
+
+from _support import create_bench_app
+from flask import jsonify
+
+from models import db
+from models.models import EntityMaster, HolidayMaster
+from routes.monitoring import monitoring_bp
+from services.request_metrics import init_request_metrics, instrument_queries, request_metrics
+
+ENTITIES = 25
+REQUESTS = 200
+
+
+def build_app(instrumented):
+    app = create_bench_app(N_PLUS_ONE_THRESHOLD=10)
+
+    @app.route('/holidays-loop')
+    def holidays_loop():
+        return jsonify({entity.entity_id: [str(h.holiday_date) for h in HolidayMaster.query.filter_by(entity_id=entity.entity_id)]
+                        for entity in EntityMaster.query.all()})
+
+    @app.route('/holidays-set')
+    def holidays_set():
+        holidays = {}
+        for holiday in HolidayMaster.query.all():
+            holidays.setdefault(holiday.entity_id, []).append(str(holiday.holiday_date))
+        return jsonify(holidays)
+
+    if instrumented:
+        init_request_metrics(app)
+        app.register_blueprint(monitoring_bp)
+        with app.app_context():
+            instrument_queries(db.engine)
+
+    with app.app_context():
+        for index in range(ENTITIES):
+            db.session.add(EntityMaster(entity_id=f"E{index}", entity_name=f"Entity {index}", location='l',
+                                        contact_phno='1', description='d', country='IN'))
+            db.session.add(HolidayMaster(holiday_date=date(2026, 1, 26), description='Republic Day', entity_id=f"E{index}"))
+        db.session.commit()
+    return app
+
+
+def timed(client, path):
+    started = time.perf_counter()
+    for _ in range(REQUESTS):
+        assert client.get(path).status_code == 200
+    return (time.perf_counter() - started) / REQUESTS * 1000
+
+
+def main():
+    logging.getLogger('rcms.requests').setLevel(logging.ERROR)
+    plain, instrumented = build_app(False).test_client(), build_app(True).test_client()
+    for path in ('/holidays-loop', '/holidays-set'):
+        base, with_metrics = timed(plain, path), timed(instrumented, path)
+        print(f"{path:15} {base:6.2f} ms plain  {with_metrics:6.2f} ms instrumented  "
+              f"(+{(with_metrics - base) * 1000:5.0f} us per request)")
+
+    totals = request_metrics.snapshot()
+    loop, single = totals['holidays_loop'], totals['holidays_set']
+    print(f"holidays-loop   {loop['sql_statements_total'] / REQUESTS:.0f} statements per request, "
+          f"{loop['n_plus_one_requests']} of {loop['requests']} requests flagged as N+1")
+    print(f"holidays-set    {single['sql_statements_total'] / REQUESTS:.0f} statements per request, "
+          f"{single['n_plus_one_requests']} of {single['requests']} requests flagged as N+1")
+    assert loop['n_plus_one_requests'] == REQUESTS and single['n_plus_one_requests'] == 0, totals
+
+    exposition = instrumented.get('/metrics').get_data(as_text=True)
+    assert f'rcms_http_request_n_plus_one_total{{endpoint="holidays_loop"}} {REQUESTS}' in exposition
+    print(f"/metrics        {len(exposition.splitlines())} lines")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Start-up cost of the application: wall time of `import app` (which creates
+the app) and the import time of every module it loads, taken from
+`python -X importtime` in fresh interpreters.
+
+Heavy dependencies are meant to load on first use, not at start-up; the
+script fails (exit status 1) if any module in DEFERRED is imported while the
+app is created, and prints what each of them would have added.
+
+    python benchmarks/startup_time.py [runs]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from _support import BACKEND_DIR
+
+RUNS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+TOP_MODULES = 20
+DEFERRED = ('numpy', 'requests', 'msal', 'pandas', 'mysql.connector', 'openpyxl', 'pytz')
+APP_PACKAGES = ('app', 'config', 'commands', 'models', 'routes', 'services', 'utils')
+
+# A file database: the pool settings in Config do not apply to in-memory SQLite
+DATABASE_PATH = os.path.join(tempfile.gettempdir(), 'rcms_startup_bench.db')
+ENV = dict(os.environ, DATABASE_URL=f'sqlite:///{DATABASE_PATH}', NOTIFICATION_OUTBOX_WORKER='false', LOG_REGISTERED_ROUTES='false')
+
+
+def python(code, *flags):
+    return subprocess.run([sys.executable, *flags, '-c', code], cwd=BACKEND_DIR, env=ENV,
+                          capture_output=True, text=True, check=True)
+
+
+def wall_time():
+    code = "import time; started = time.perf_counter(); import app; print(time.perf_counter() - started)"
+    return float(python(code).stdout.strip().splitlines()[-1])
+
+
+def route_modules():
+    return sorted(f"routes.{name[:-3]}" for name in os.listdir(os.path.join(BACKEND_DIR, 'routes'))
+                  if name.endswith('.py') and name != '__init__.py')
+
+
+def import_times(code):
+    """Module name -> (self, cumulative) microseconds of one -X importtime run."""
+    times = {}
+    for line in python(code, '-X', 'importtime').stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times.setdefault(name.strip(), (int(self_us), int(cumulative_us)))
+    return times
+
+
+def main():
+    runs = sorted(wall_time() for _ in range(RUNS))
+    print(f"import app   median {statistics.median(runs) * 1000:6.0f} ms, best {runs[0] * 1000:6.0f} ms over {RUNS} runs")
+
+    # create_app() loads the route modules through importlib, which -X importtime
+    # does not report, so import them first to get one line per module
+    times = import_times(f"import {', '.join(route_modules())}; import app")
+    print(f"\n{len(times)} modules imported; top {TOP_MODULES} by self time:")
+    for name, (self_us, cumulative_us) in sorted(times.items(), key=lambda item: -item[1][0])[:TOP_MODULES]:
+        print(f"  {self_us / 1000:7.1f} ms self {cumulative_us / 1000:7.1f} ms cumulative  {name}")
+
+    print("\napplication modules:")
+    own = [(name, value) for name, value in times.items() if name.split('.')[0] in APP_PACKAGES]
+    for name, (self_us, cumulative_us) in sorted(own, key=lambda item: -item[1][0]):
+        print(f"  {self_us / 1000:7.1f} ms self {cumulative_us / 1000:7.1f} ms cumulative  {name}")
+
+    print("\ndeferred until first use:")
+    loaded = []
+    for name in DEFERRED:
+        if name in times:
+            loaded.append(name)
+            print(f"  LOADED AT START-UP  {name}")
+            continue
+        try:
+            cost = import_times(f"import {name}").get(name)
+        except subprocess.CalledProcessError:
+            print(f"  not installed       {name}")
+            continue
+        print(f"  {cost[1] / 1000:7.1f} ms saved      {name}")
+    sys.exit(1 if loaded else 0)
+
+
+if __name__ == '__main__':
+    main()
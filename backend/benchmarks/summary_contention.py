@@ -0,0 +1,160 @@
+"""
+Contention check of the dashboard summary bookkeeping on task writes.
+
+Every task write reads dashboard_summary_state with a shared lock and
+upserts its bucket deltas. This posts /update_task_status from many threads
+
+1. before the summary is built (no summary work at all),
+2. with the summary built,
+3. with the summary built while roll_forward() moves it a day ahead over
+   and over, taking the exclusive lock the writers wait on,
+
+and prints the write throughput of each run. Fails (exit status 1) on a
+failed request, if the incrementally kept summary differs from a rebuild
+after a run, or if checking whether the summary is current (what dashboard
+GETs do) writes anything.
+
+Shared row locks are only exercised on MySQL/PostgreSQL (set
+BENCH_DATABASE_URL). SQLite ignores FOR SHARE and every writer takes the
+database write lock anyway, so there the runs show the bookkeeping cost
+only and the summary is not checked after the roll forward run.
+
+    python benchmarks/summary_contention.py [threads] [writes per thread]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from _support import count_queries, create_bench_app
+
+from models import db
+from models.models import (
+    ActivityMaster, Category, DashboardSummaryState, DashboardTaskSummary, EntityMaster, EntityRegulationTasks,
+    RegulationMaster,
+)
+from routes.tasks import tasks_bp
+from services.dashboard_summary import STATE_ID, rebuild_summary, roll_forward, summary_is_current
+
+ENTITIES = 20
+TASKS = 2000
+STATUSES = ('In Progress', 'Completed', 'Yet to Start')
+
+
+def seed():
+    db.session.add(Category(category_id=1, category_type='Bench'))
+    db.session.add(RegulationMaster(regulation_id='R1', regulation_name='Rule', category_id=1))
+    db.session.add(ActivityMaster(regulation_id='R1', activity_id=1, activity_description='Do it'))
+    db.session.add_all(EntityMaster(entity_id=f"E{number:03d}", entity_name=f"Entity {number}", location='l',
+                                    contact_phno='1', description='d', country='IN') for number in range(ENTITIES))
+    today = date.today()
+    db.session.execute(EntityRegulationTasks.__table__.insert(), [
+        {"entity_id": f"E{index % ENTITIES:03d}", "regulation_id": 'R1', "activity_id": 1,
+         "due_on": today + timedelta(days=index % 60 - 30), "status": 'Yet to Start', "criticality": 'High',
+         "internal_external": 'I', "mandatory_optional": 'M'}
+        for index in range(TASKS)
+    ])
+    db.session.commit()
+
+
+def summary_rows():
+    return sorted((row.entity_id, row.due_month, row.task_status, row.task_count)
+                  for row in DashboardTaskSummary.query.filter(DashboardTaskSummary.task_count != 0))
+
+
+def write_storm(app, threads, writes, offset, roll=False):
+    client = app.test_client()
+    stop = threading.Event()
+    rolls = 0
+
+    def roller():
+        # Each run moves the summary one more day ahead of today
+        nonlocal rolls
+        with app.app_context():
+            while not stop.is_set():
+                rolls += 1
+                roll_forward(date.today() + timedelta(days=rolls))
+
+    def write(index):
+        task_id = (index * 7919 + offset) % TASKS + 1
+        response = client.post('/update_task_status', json={
+            "task_id": task_id, "status": STATUSES[(index + offset) % len(STATUSES)],
+        })
+        return response.status_code
+
+    background = threading.Thread(target=roller) if roll else None
+    if background:
+        background.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        codes = list(pool.map(write, range(threads * writes)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    if background:
+        background.join()
+    failed = sum(code != 200 for code in codes)
+    return len(codes) / elapsed, failed, rolls
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    writes = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    handle, path = tempfile.mkstemp(suffix='.db', prefix='rcms_summary_')
+    os.close(handle)
+    app = create_bench_app(os.environ.get('BENCH_DATABASE_URL') or f"sqlite:///{path}")
+    app.register_blueprint(tasks_bp)
+    failures = []
+
+    try:
+        with app.app_context():
+            seed()
+
+        runs = (("no summary", False, False), ("summary", True, False), ("summary + roll forward", True, True))
+        for number, (label, build, roll) in enumerate(runs):
+            if build:
+                with app.app_context():
+                    rebuild_summary()
+            rate, failed, rolls = write_storm(app, threads, writes, number, roll)
+            print(f"{label:24} {threads} threads: {rate:7.0f} writes/s, {failed} failed"
+                  + (f", {rolls} roll forwards" if roll else ""))
+            if failed:
+                failures.append(f"{failed} failed writes with {label}")
+            if not build:
+                continue
+            with app.app_context():
+                if roll and db.engine.dialect.name == 'sqlite':
+                    # SQLite ignores FOR SHARE, so a write can race the roll forward here
+                    print("  summary consistency not checked: SQLite has no row locks")
+                    continue
+                incremental = summary_rows()
+                rebuild_summary(db.session.get(DashboardSummaryState, STATE_ID).as_of)
+                if incremental != summary_rows():
+                    failures.append(f"summary kept by the writes differs from a rebuild after {label}")
+
+        with app.app_context():
+
+            state = db.session.get(DashboardSummaryState, STATE_ID)
+            state.as_of = date.today() - timedelta(days=1)
+            db.session.commit()
+            with count_queries() as counter:
+                current = summary_is_current()
+            db.session.rollback()
+            as_of = db.session.get(DashboardSummaryState, STATE_ID).as_of
+            print(f"stale summary check: current={current}, {counter.count} statements, as_of {as_of}")
+            if current or as_of != date.today() - timedelta(days=1):
+                failures.append("checking a stale summary rolled it forward")
+
+            db.drop_all()
+    finally:
+        os.unlink(path)
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
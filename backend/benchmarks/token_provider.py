@@ -0,0 +1,71 @@
+"""
+Count Graph token fetches when many threads ask for a token at once, before
+and after the shared token provider.
+
+The legacy path builds a client and fetches a token on every call; the
+provider fetches once, serves the cached token to every thread and refreshes
+it once in the background when it nears expiry. The token source is a fake
+with a fixed latency, so no network access is needed.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import _support  # noqa: F401  puts the backend on sys.path
+
+from services.token_provider import TokenProvider
+
+THREADS = 32
+CALLS = 2000
+FETCH_LATENCY = 0.05
+
+
+class FakeSource:
+    def __init__(self, expires_in=3600):
+        self.expires_in = expires_in
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        time.sleep(FETCH_LATENCY)
+        with self._lock:
+            self.calls += 1
+        return {"access_token": f"token-{self.calls}", "expires_in": self.expires_in}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def run(label, get_token, source):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        tokens = list(pool.map(lambda _: get_token(), range(CALLS)))
+    elapsed = time.perf_counter() - started
+    assert all(tokens), "a caller got no token"
+    print(f"{label:<8} {CALLS} calls on {THREADS} threads  {source.calls:>5} fetches  {elapsed * 1000:9.1f} ms")
+
+
+def main():
+    legacy_source = FakeSource()
+    run('before', legacy_source, legacy_source)
+
+    clock = FakeClock()
+    source = FakeSource(expires_in=3600)
+    provider = TokenProvider(source=source, refresh_margin=300, clock=clock)
+    run('after', provider.get_token, source)
+
+    # Inside the refresh margin callers keep the cached token while one background refresh runs
+    clock.now = 3400
+    first = provider.get_token()
+    time.sleep(FETCH_LATENCY * 3)
+    assert first == 'token-1' and provider.get_token() == 'token-2', provider.snapshot()
+    print(f"refresh  {provider.snapshot()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+import click
+from flask.cli import with_appcontext
+
+
+@click.command('refresh-dashboard-summary')
+@click.option('--rebuild', is_flag=True, help='Recompute every bucket instead of rolling the dates forward.')
+@with_appcontext
+def refresh_dashboard_summary(rebuild):
+    """Nightly job: re-bucket tasks whose "with Delay" status flipped since the last run."""
+    from services.dashboard_summary import rebuild_summary, roll_forward
+
+    if rebuild:
+        click.echo(f"Dashboard summary rebuilt from {rebuild_summary()} tasks")
+    else:
+        click.echo(f"Dashboard summary rolled forward, {roll_forward()} tasks re-bucketed")
+
+
+@click.command('outbox-worker')
+@click.option('--once', is_flag=True, help='Deliver one batch and exit.')
+@with_appcontext
+def outbox_worker(once):
+    """Deliver queued notification_outbox rows (runs until interrupted)."""
+    from flask import current_app
+    from services.notification_outbox import start_outbox_worker, OutboxWorker
+
+    app = current_app._get_current_object()
+    if once:
+        click.echo(f"Processed {OutboxWorker(app).run_once()} outbox messages")
+        return
+
+    worker = start_outbox_worker(app)
+    try:
+        worker.join()
+    except KeyboardInterrupt:
+        worker.stop()
+
+
+@click.command('dispatch-messages')
+@with_appcontext
+def dispatch_messages():
+    """Send every due message_queue reminder (run from cron or several workers in parallel)."""
+    from services.message_dispatcher import dispatch_due_messages
+
+    stats = dispatch_due_messages()
+    click.echo(
+        f"Sent {stats['sent']}, failed {stats['failed']}, deferred {stats['deferred']} "
+        f"in {stats['elapsed_seconds']} s ({stats['messages_per_second']} msg/s); "
+        f"{stats['pending']} pending, lag {stats['lag_seconds']:.0f} s"
+    )
+
+
+@click.command('sync-calendar')
+@with_appcontext
+def sync_calendar():
+    """Put pending reminders and assigned tasks on the users' Outlook calendars."""
+    from services.calendar_sync import sync_calendars
+
+    stats = sync_calendars()
+    click.echo(
+        f"{stats['reminders']} reminders in {stats['reminder_events']} day events, "
+        f"{stats['task_events']} task events; {stats['requests']} Graph requests in {stats['batches']} batches: "
+        f"{stats['created']} created, {stats['updated']} updated, {stats['failed']} failed, "
+        f"{stats['deferred']} deferred in {stats['elapsed_seconds']} s"
+    )
+
+
+@click.command('reconcile-activity-counts')
+@with_appcontext
+def reconcile_activity_counts():
+    """Recount entity_regulation's mandatory/optional activity counters and fix any that drifted."""
+    from services.entity_regulations import reconcile_activity_counts as reconcile
+
+    checked, corrected = reconcile()
+    click.echo(f"Checked {checked} entity regulations, corrected {corrected}")
+
+
+@click.command('bulk-import')
+@click.argument('kind', type=click.Choice(['regulations', 'activities']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--dry-run', is_flag=True, help='Validate every row without writing anything.')
+@click.option('--chunk-size', type=int, default=None, help='Rows per transaction (IMPORT_CHUNK_SIZE by default).')
+@click.option('--report', 'report_path', type=click.Path(dir_okay=False), default=None,
+              help='Write the row errors (and created regulation IDs) to this CSV file.')
+@with_appcontext
+def bulk_import(kind, path, dry_run, chunk_size, report_path):
+    """Import regulations or activities from a .csv or .xlsx file."""
+    import csv
+    from services.bulk_import import BulkImportError, REGULATIONS, import_file
+    from utils.response_cache import response_cache
+
+    try:
+        with open(path, 'rb') as stream:
+            report = import_file(kind, stream, path, dry_run=dry_run, chunk_size=chunk_size)
+    except BulkImportError as e:
+        raise click.ClickException(str(e))
+    if kind == REGULATIONS and report.imported and not dry_run:
+        response_cache.invalidate('regulations')
+
+    if report_path:
+        with open(report_path, 'w', newline='', encoding='utf-8') as handle:
+            writer = csv.writer(handle)
+            writer.writerow(['row', 'result'])
+            writer.writerows(sorted(report.errors + [(row, f"created {regulation_id}")
+                                                     for row, regulation_id in report.created]))
+    click.echo(
+        f"{'Validated' if dry_run else 'Imported'} {report.imported} of {report.rows} {kind} rows "
+        f"in {report.chunks} chunks, {report.failed} failed; "
+        f"{report.elapsed:.2f} s ({report.rows_per_second} rows/s)"
+    )
+    for row, message in report.errors[:20]:
+        click.echo(f"  row {row}: {message}")
+    if len(report.errors) > 20:
+        click.echo(f"  ... {len(report.errors) - 20} more errors" + (f" in {report_path}" if report_path else ""))
+
+
+@click.command('import-holidays')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--entity', 'entity_id', default=None,
+              help='Entity of the .ics events or of CSV rows without one (every entity by default).')
+@click.option('--no-readjust', is_flag=True, help='Leave task due dates that fall on the new holidays alone.')
+@with_appcontext
+def import_holidays(path, entity_id, no_readjust):
+    """Upsert a .csv or .ics holiday calendar and move open tasks off the new holidays."""
+    from models import db
+    from services.holiday_calendar import holiday_calendar
+    from services.holiday_import import HolidayUploadError, import_holidays as upsert, parse_holidays, readjust_due_dates
+    from utils.response_cache import response_cache
+
+    try:
+        with open(path, 'rb') as stream:
+            result = upsert(parse_holidays(stream, path, entity_id))
+    except HolidayUploadError as e:
+        db.session.rollback()
+        raise click.ClickException(str(e))
+    moved = 0
+    if result['holidays'] and not no_readjust:
+        moved = readjust_due_dates(date_from=result['date_from'], date_to=result['date_to'])
+    db.session.commit()
+    holiday_calendar.invalidate()
+    response_cache.invalidate('holidays')
+    response_cache.invalidate('tasks')
+
+    click.echo(f"Upserted {result['holidays']} holidays, moved {moved} tasks, {len(result['errors'])} rows failed")
+    for error in result['errors'][:20]:
+        click.echo(f"  row {error['row']}: {error['error']}")
+
+
+@click.command('readjust-due-dates')
+@click.option('--from', 'date_from', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='First due date to check (today by default).')
+@click.option('--to', 'date_to', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Last due date to check (no limit by default).')
+@with_appcontext
+def readjust_due_dates(date_from, date_to):
+    """Move open tasks due on a holiday of their entity to the previous business day."""
+    from models import db
+    from services.holiday_import import readjust_due_dates as readjust
+    from utils.response_cache import response_cache
+
+    moved = readjust(date_from=date_from.date() if date_from else None, date_to=date_to.date() if date_to else None)
+    db.session.commit()
+    response_cache.invalidate('tasks')
+    click.echo(f"Moved {moved} tasks off holidays")
+
+
+@click.command('db-upgrade')
+@click.option('--target', default=None, help='Last migration version to apply (the latest by default).')
+@click.option('--stamp', is_flag=True, help='Record the pending migrations as applied without running them.')
+@with_appcontext
+def db_upgrade(target, stamp):
+    """Apply the pending schema migrations in migrations/."""
+    from services.schema_migrations import upgrade
+
+    handled = upgrade(target=target, stamp_only=stamp)
+    for version, name, action in handled:
+        click.echo(f"{version}_{name}: {action}")
+    click.echo(f"Schema up to date, {len(handled)} migrations handled")
+
+
+@click.command('db-status')
+@with_appcontext
+def db_status():
+    """List the schema migrations and whether each one is applied."""
+    from services.schema_migrations import status
+
+    for migration in status():
+        state = 'applied' if migration['applied'] else 'pending'
+        if migration['modified']:
+            state += ' (file changed since)'
+        click.echo(f"{migration['version']}_{migration['name']}: {state}")
+
+
+def register_commands(app):
+    """Attach the maintenance commands to the app's `flask` CLI."""
+    app.cli.add_command(refresh_dashboard_summary)
+    app.cli.add_command(outbox_worker)
+    app.cli.add_command(dispatch_messages)
+    app.cli.add_command(sync_calendar)
+    app.cli.add_command(db_upgrade)
+    app.cli.add_command(db_status)
+    app.cli.add_command(reconcile_activity_counts)
+    app.cli.add_command(bulk_import)
+    app.cli.add_command(import_holidays)
+    app.cli.add_command(readjust_due_dates)
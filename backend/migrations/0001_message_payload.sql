@@ -0,0 +1,15 @@
+-- Template-based message_queue rows (MySQL).
+-- Applied by `flask db-upgrade`.
+
+CREATE TABLE IF NOT EXISTS message_payload (
+    payload_hash VARCHAR(64) NOT NULL,
+    template_id VARCHAR(50) NOT NULL,
+    params TEXT NOT NULL,
+    created_at DATETIME NOT NULL,
+    PRIMARY KEY (payload_hash)
+);
+
+ALTER TABLE message_queue
+    ADD COLUMN payload_hash VARCHAR(64) NULL,
+    ADD CONSTRAINT fk_message_queue_payload
+        FOREIGN KEY (payload_hash) REFERENCES message_payload (payload_hash);
@@ -0,0 +1,13 @@
+-- Graph events created by the calendar sync (MySQL).
+-- Applied by `flask db-upgrade`.
+
+CREATE TABLE IF NOT EXISTS calendar_event_link (
+    link_key VARCHAR(64) NOT NULL,
+    kind VARCHAR(20) NOT NULL,
+    mailbox VARCHAR(100) NOT NULL,
+    event_id VARCHAR(255) NOT NULL,
+    series_end DATE NULL,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NULL,
+    PRIMARY KEY (link_key)
+);
@@ -0,0 +1,5 @@
+-- Due date indexes for the dashboard and task list filters (MySQL).
+-- Applied by `flask db-upgrade`.
+
+CREATE INDEX ix_ert_entity_due_on ON entity_regulation_tasks (entity_id, due_on);
+CREATE INDEX ix_ert_due_on_status ON entity_regulation_tasks (due_on, status);
@@ -0,0 +1,38 @@
+-- Tables of the dashboard summary and the notification outbox (MySQL).
+-- Databases that ran the app since these were added already have them from db.create_all().
+
+CREATE TABLE IF NOT EXISTS dashboard_task_summary (
+    entity_id VARCHAR(15) NOT NULL,
+    category_id INTEGER NOT NULL,
+    criticality VARCHAR(45) NOT NULL,
+    internal_external VARCHAR(1) NOT NULL,
+    mandatory_optional VARCHAR(1) NOT NULL,
+    due_month DATE NOT NULL,
+    task_status VARCHAR(30) NOT NULL,
+    task_count INTEGER NOT NULL,
+    PRIMARY KEY (entity_id, category_id, criticality, internal_external, mandatory_optional, due_month, task_status)
+);
+
+CREATE TABLE IF NOT EXISTS dashboard_summary_state (
+    id INTEGER NOT NULL AUTO_INCREMENT,
+    as_of DATE NOT NULL,
+    PRIMARY KEY (id)
+);
+
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id INTEGER NOT NULL AUTO_INCREMENT,
+    idempotency_key VARCHAR(64) NOT NULL,
+    kind VARCHAR(20) NOT NULL,
+    graph_path VARCHAR(255) NOT NULL,
+    fallback_path VARCHAR(255) NULL,
+    payload TEXT NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    attempts INTEGER NOT NULL,
+    next_attempt_at DATETIME NOT NULL,
+    last_error VARCHAR(500) NULL,
+    created_at DATETIME NOT NULL,
+    sent_at DATETIME NULL,
+    PRIMARY KEY (id),
+    UNIQUE (idempotency_key),
+    INDEX ix_notification_outbox_next_attempt_at (next_attempt_at)
+);
@@ -0,0 +1,20 @@
+"""
+Reviewer status and last-update audit columns on entity_regulation_tasks.
+
+update_task used to add review_status with a runtime ALTER TABLE, so some
+databases already have it: only the missing columns are added.
+"""
+from sqlalchemy import inspect, text
+
+COLUMNS = (
+    ("review_status", "VARCHAR(20) NULL"),
+    ("last_updated_by", "VARCHAR(45) NULL"),
+    ("last_updated_on", "DATETIME NULL"),
+)
+
+
+def upgrade(connection):
+    existing = {column['name'] for column in inspect(connection).get_columns('entity_regulation_tasks')}
+    for name, definition in COLUMNS:
+        if name not in existing:
+            connection.execute(text(f"ALTER TABLE entity_regulation_tasks ADD COLUMN {name} {definition}"))
@@ -0,0 +1,3 @@
+-- Due reminder lookups of the message dispatcher and the calendar sync (MySQL).
+
+CREATE INDEX ix_message_queue_status_date ON message_queue (status, date);
@@ -0,0 +1,5 @@
+-- Scheme tag of users.password, so a login checks one scheme and legacy hashes are rehashed (MySQL).
+-- Applied by `flask db-upgrade`. Untagged rows are detected from the stored value on their next login.
+
+ALTER TABLE users ADD COLUMN password_scheme VARCHAR(20) NULL;
+UPDATE users SET password_scheme = 'bcrypt' WHERE password LIKE '$2_$%';
@@ -0,0 +1,8 @@
+-- Per-prefix ID counters used to allocate regulation, entity, admin user and activity IDs (MySQL).
+-- Applied by `flask db-upgrade`. Rows are created on first use, seeded from the highest existing ID.
+
+CREATE TABLE IF NOT EXISTS id_sequences (
+    name VARCHAR(100) NOT NULL,
+    next_value INTEGER NOT NULL,
+    PRIMARY KEY (name)
+);
@@ -0,0 +1,5 @@
+-- Per-entity holiday lookups: /holidays?entity_id=&year= and the due date
+-- readjust join of entity_regulation_tasks to holiday_master (MySQL).
+-- Applied by `flask db-upgrade`.
+
+CREATE INDEX ix_holiday_master_entity_date ON holiday_master (entity_id, holiday_date);
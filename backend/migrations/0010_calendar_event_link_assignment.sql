@@ -0,0 +1,8 @@
+-- Assignment (entity, activity, preparer, reviewer) and dates each calendar
+-- event covers, so the calendar sync updates an assignment's event in place
+-- and deletes per-task events for due dates that moved or closed (MySQL).
+-- Applied by `flask db-upgrade`. Existing links are moved on the next sync.
+
+ALTER TABLE calendar_event_link ADD COLUMN assignment_key VARCHAR(64) NULL;
+ALTER TABLE calendar_event_link ADD COLUMN series_start DATE NULL;
+CREATE INDEX ix_calendar_event_link_assignment_key ON calendar_event_link (assignment_key);
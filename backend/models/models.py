@@ -114,6 +114,15 @@ class EntityRegulationTasks(db.Model):
     criticality = db.Column(db.String(45), nullable=True)
     internal_external = db.Column(db.String(1), nullable=True)
     documentupload_yes_no = db.Column(db.String(1), nullable=True)
+    review_status = db.Column(db.String(20), nullable=True)
+    last_updated_by = db.Column(db.String(45), nullable=True)
+    last_updated_on = db.Column(db.DateTime, nullable=True)
+
+    # Due date windows of the dashboard and task lists, per entity and across entities
+    __table_args__ = (
+        db.Index("ix_ert_entity_due_on", "entity_id", "due_on"),
+        db.Index("ix_ert_due_on_status", "due_on", "status"),
+    )
 
     def __repr__(self):
         return f"<EntityRegulationTasks ID: {self.id}, Entity: {self.entity_id}, Regulation: {self.regulation_id}, Activity: {self.activity_id}>"
@@ -127,6 +136,10 @@ class HolidayMaster(db.Model):
     entity_id = db.Column(db.String(15), db.ForeignKey("entity_master.entity_id"), primary_key=True)
     obsolete_current = db.Column(db.String(1), nullable=True)
 
+    __table_args__ = (
+        db.Index("ix_holiday_master_entity_date", "entity_id", "holiday_date"),
+    )
+
     def __repr__(self):
         return f"<HolidayMaster Date: {self.holiday_date}, Entity: {self.entity_id}, Description: {self.description}>"
 
@@ -154,10 +167,29 @@ class MessageQueue(db.Model):
     time = db.Column(db.Time, nullable=True)
     email_id = db.Column(db.String(100), nullable=True)
     status = db.Column(db.String(50), nullable=True)
+    # Rendered body lives in message_payload; message_des then only holds the title
+    payload_hash = db.Column(db.String(64), db.ForeignKey("message_payload.payload_hash"), nullable=True)
+
+    # Due message lookups of the dispatcher and calendar sync
+    __table_args__ = (
+        db.Index("ix_message_queue_status_date", "status", "date"),
+    )
 
     def __repr__(self):
         return f"<MessageQueue S.No: {self.s_no}, Email: {self.email_id}, Status: {self.status}>"
 
+# Message Payload Table (template parameters shared by every queued message with the same body)
+class MessagePayload(db.Model):
+    __tablename__ = "message_payload"
+
+    payload_hash = db.Column(db.String(64), primary_key=True)  # sha256 of template_id + params
+    template_id = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.Text, nullable=False)  # canonical JSON
+    created_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<MessagePayload Hash: {self.payload_hash}, Template: {self.template_id}>"
+
 # Regulation Master Table
 class RegulationMaster(db.Model):
     __tablename__ = "regulation_master"
@@ -187,8 +219,83 @@ class Users(db.Model):
     mobile_no = db.Column(db.String(10), nullable=False, unique=True)
     email_id = db.Column(db.String(45), nullable=False, unique=True)
     password = db.Column(db.String(256), nullable=False)
+    # Hash scheme of password (see services.passwords); NULL for rows not yet tagged
+    password_scheme = db.Column(db.String(20), nullable=True)
     role = db.Column(db.String(45), nullable=False)
     obsolete_current = db.Column(db.String(1), nullable=True)
 
     def __repr__(self):
-        return f"<Users ID: {self.user_id}, Name: {self.user_name}, Role: {self.role}>"
\ No newline at end of file
+        return f"<Users ID: {self.user_id}, Name: {self.user_name}, Role: {self.role}>"
+
+# Dashboard Task Summary Table (precomputed task counts per dashboard bucket)
+class DashboardTaskSummary(db.Model):
+    __tablename__ = "dashboard_task_summary"
+
+    entity_id = db.Column(db.String(15), primary_key=True)
+    category_id = db.Column(db.Integer, primary_key=True)
+    criticality = db.Column(db.String(45), primary_key=True)
+    internal_external = db.Column(db.String(1), primary_key=True)
+    mandatory_optional = db.Column(db.String(1), primary_key=True)
+    due_month = db.Column(db.Date, primary_key=True)
+    task_status = db.Column(db.String(30), primary_key=True)
+    task_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DashboardTaskSummary Entity: {self.entity_id}, Month: {self.due_month}, Status: {self.task_status}, Count: {self.task_count}>"
+
+# Dashboard Summary State Table (date the summary statuses were computed for)
+class DashboardSummaryState(db.Model):
+    __tablename__ = "dashboard_summary_state"
+
+    id = db.Column(db.Integer, primary_key=True)
+    as_of = db.Column(db.Date, nullable=False)
+
+    def __repr__(self):
+        return f"<DashboardSummaryState As of: {self.as_of}>"
+
+# Notification Outbox Table (Graph calls committed with the write and delivered by a background worker)
+class NotificationOutbox(db.Model):
+    __tablename__ = "notification_outbox"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    idempotency_key = db.Column(db.String(64), nullable=False, unique=True)
+    kind = db.Column(db.String(20), nullable=False)  # mail / event
+    graph_path = db.Column(db.String(255), nullable=False)
+    fallback_path = db.Column(db.String(255), nullable=True)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="Pending")  # Pending / Sending / Sent / Failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, index=True)
+    last_error = db.Column(db.String(500), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<NotificationOutbox ID: {self.id}, Kind: {self.kind}, Status: {self.status}, Attempts: {self.attempts}>"
+
+# Calendar Event Link Table (Graph events created by the calendar sync, so re-runs don't create duplicates)
+class CalendarEventLink(db.Model):
+    __tablename__ = "calendar_event_link"
+
+    link_key = db.Column(db.String(64), primary_key=True)  # sha256 of what the event covers
+    kind = db.Column(db.String(20), nullable=False)  # reminders / series (one per assignment) / task
+    mailbox = db.Column(db.String(100), nullable=False)
+    event_id = db.Column(db.String(255), nullable=False)
+    assignment_key = db.Column(db.String(64), nullable=True, index=True)  # link_key of the assignment's own event
+    series_start = db.Column(db.Date, nullable=True)  # first due date the event covers
+    series_end = db.Column(db.Date, nullable=True)  # last due date the event covers
+    created_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<CalendarEventLink Kind: {self.kind}, Mailbox: {self.mailbox}, Event: {self.event_id}>"
+
+# ID Sequence Table (next value of each per-prefix ID counter, see services/id_sequences.py)
+class IdSequence(db.Model):
+    __tablename__ = "id_sequences"
+
+    name = db.Column(db.String(100), primary_key=True)  # e.g. regulation:GSTA, activity:GSTA001
+    next_value = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<IdSequence Name: {self.name}, Next: {self.next_value}>"
@@ -1,2 +1 @@
-# Import all route modules to make them available when importing the routes package
-from routes import auth, entities, users, regulations, activities, categories, holidays, tasks 
\ No newline at end of file
+# Route modules are imported by create_app() when their blueprints are registered
@@ -1,14 +1,18 @@
 from flask import Blueprint, jsonify, request
 from models import db
-from models.models import ActivityMaster,RegulationMaster,EntityRegulationTasks,HolidayMaster, EntityRegulation, Users
-from sqlalchemy import func
-import traceback
-from dateutil.relativedelta import relativedelta
-from datetime import datetime
+from models.models import ActivityMaster,RegulationMaster,EntityRegulationTasks, EntityRegulation, Users
+from datetime import datetime, timedelta
 import logging
 from services.email_services import send_activity_assignment_emails
+from services.dashboard_summary import record_task_changes, snapshot_task
+from services.entity_regulations import activity_state, apply_activity_change
+from services.id_sequences import next_activity_id
+from utils.response_cache import response_cache
+from utils.helpers import adjust_due_date_for_holidays
+from utils.recurrence import next_occurrence
 
 activities_bp = Blueprint('activities', __name__)
+logger = logging.getLogger(__name__)
 
 @activities_bp.route("/activities", methods=["GET"])
 def get_activities():
@@ -81,15 +85,8 @@ def add_activity():
         if not regulation_id:
             return jsonify({"error": "Missing regulation_id"}), 400
 
-        #  Find the last used activity_id for the given regulation_id
-        last_activity_id = (
-            db.session.query(func.max(ActivityMaster.activity_id))
-            .filter(ActivityMaster.regulation_id == regulation_id)
-            .scalar()
-        )
-
-        #  If no previous activity exists, start from 1, else increment last ID
-        new_activity_id = 1 if last_activity_id is None else last_activity_id + 1
+        #  Next activity_id of the regulation from its ID sequence
+        new_activity_id = next_activity_id(regulation_id)
 
         new_activity = ActivityMaster(
             regulation_id=regulation_id,
@@ -106,12 +103,15 @@ def add_activity():
         )
 
         db.session.add(new_activity)
+        apply_activity_change(regulation_id, None, activity_state(new_activity))
         db.session.commit()
+        # The entity_regulation activity counters changed with the activity
+        response_cache.invalidate('regulations', 'entities')
 
         return jsonify({"message": "Activity added successfully"}), 201
 
     except Exception as e:
-        print("Error:", str(e))
+        logger.exception("Error: %s", e)
         return jsonify({"error": str(e)}), 500
     
 @activities_bp.route("/update_activity/<string:regulation_id>/<int:activity_id>", methods=["POST", "OPTIONS"])
@@ -125,41 +125,51 @@ def update_activity(regulation_id, activity_id):
 
         data = request.get_json()
 
-        activity = ActivityMaster.query.filter_by(regulation_id=regulation_id, activity_id=activity_id).first()
+        # Locked so concurrent edits apply their counter deltas one after the other
+        activity = ActivityMaster.query.filter_by(regulation_id=regulation_id, activity_id=activity_id) \
+                                       .with_for_update().first()
 
         if not activity:
             return jsonify({"error": "Activity not found"}), 404
 
+        before = activity_state(activity)
+
         # Update all fields except `regulation_id` and `activity_id`
         for key, value in data.items():
             if key not in ["regulation_id", "activity_id"]:  # Prevent updating these fields
                 setattr(activity, key, value if value is not None else getattr(activity, key))
 
+        apply_activity_change(regulation_id, before, activity_state(activity))
         db.session.commit()
+        response_cache.invalidate('regulations', 'entities')
 
         return jsonify({"message": "Activity updated successfully"}), 200
 
     except Exception as e:
-        print("Error:", str(e))
+        logger.exception("Error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
 @activities_bp.route("/delete_activity/<string:regulation_id>/<int:activity_id>", methods=["DELETE"])
 def delete_activity(regulation_id, activity_id):
     try:
-        activity = ActivityMaster.query.filter_by(regulation_id=regulation_id, activity_id=activity_id).first()
+        activity = ActivityMaster.query.filter_by(regulation_id=regulation_id, activity_id=activity_id) \
+                                       .with_for_update().first()
 
         if not activity:
             return jsonify({"error": "Activity not found"}), 404
 
         #  Instead of deleting, mark activity as obsolete
+        before = activity_state(activity)
         activity.obsolete_current = "O"
+        apply_activity_change(regulation_id, before, activity_state(activity))
         db.session.commit()
+        response_cache.invalidate('regulations', 'entities')
 
         return jsonify({"message": "Activity marked as obsolete successfully"}), 200
 
     except Exception as e:
-        print("Error:", str(e))
+        logger.exception("Error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @activities_bp.route('/activity_details/<string:regulation_id>/<string:activity_id>', methods=['GET'])
@@ -191,17 +201,12 @@ def get_activity_details(regulation_id, activity_id):
         return jsonify({"activity": activity_data}), 200
     
     except Exception as e:
-        print("Error:", str(e))
-        print(traceback.format_exc())  # Print full traceback for debugging
+        logger.exception("Error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @activities_bp.route('/calculate_due_date/<string:regulation_id>/<string:activity_id>', methods=['GET'])
 def calculate_due_date(regulation_id, activity_id):
     try:
-        from datetime import datetime
-        from dateutil.relativedelta import relativedelta
-        from models.models import HolidayMaster
-        
         # Query to get the frequency and timeline information
         activity = ActivityMaster.query.filter_by(
             regulation_id=regulation_id, 
@@ -218,54 +223,17 @@ def calculate_due_date(regulation_id, activity_id):
         current_date = datetime.now().date()
         if frequency_timeline >= current_date:
             due_on = frequency_timeline
-            print(f"Future frequency timeline, first due date: {due_on}")
         else:
             # If frequency_timeline is in the past, calculate the next due date based on the frequency
-            due_on = frequency_timeline
-            while due_on < current_date:
-                # Increment due_on based on the frequency
-                if frequency == 52:  # Weekly
-                    due_on += relativedelta(weeks=1)
-                elif frequency == 26:  # fortnightly
-                    due_on += relativedelta(weeks=2)
-                elif frequency == 12:  # Monthly
-                    due_on += relativedelta(months=1)
-                elif frequency == 3:  # Every 4 months
-                    due_on += relativedelta(months=4)
-                elif frequency == 4:  # Quarterly
-                    due_on += relativedelta(months=3)
-                elif frequency == 2:  # Half-yearly
-                    due_on += relativedelta(months=6)
-                elif frequency == 6:  # Every 2 months
-                    due_on += relativedelta(months=2)
-                elif frequency == 1:  # Annually
-                    due_on += relativedelta(years=1)
-                elif frequency == 0:  # One-time
-                    break
-                else:
-                    # Default fallback if no valid frequency is set
-                    break
+            due_on = next_occurrence(frequency_timeline, frequency, current_date)
         
         # Adjust the due_on date if it falls on a weekend or holiday
-        while True:
-            # Check if due_on falls on a weekend (Saturday or Sunday)
-            if due_on.weekday() == 5:  # Saturday
-                due_on -= relativedelta(days=1)  # Move to Friday
-            elif due_on.weekday() == 6:  # Sunday
-                due_on -= relativedelta(days=2)  # Move to Friday
-            else:
-                # Check if due_on is a holiday
-                holiday = HolidayMaster.query.filter_by(holiday_date=due_on).first()
-                if holiday:
-                    due_on -= relativedelta(days=1)  # Move to the previous day if it's a holiday
-                else:
-                    break  # If it's not a holiday or weekend, exit the loop
+        due_on = adjust_due_date_for_holidays(due_on)
         
         return jsonify({"due_on": due_on.strftime('%Y-%m-%d')}), 200
     
     except Exception as e:
-        print("Error:", str(e))
-        print(traceback.format_exc())  # Print full traceback for debugging
+        logger.exception("Error: %s", e)
         return jsonify({"error": str(e)}), 500 
     
 @activities_bp.route('/regulation_details/<string:regulation_id>', methods=['GET'])
@@ -292,8 +260,7 @@ def get_regulation_details(regulation_id):
         return jsonify({"regulation": regulation_data}), 200
     
     except Exception as e:
-        print("Error:", str(e))
-        print(traceback.format_exc())  # Print full traceback for debugging
+        logger.exception("Error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @activities_bp.route('/check_task_exists/<string:entity_id>/<string:regulation_id>/<string:activity_id>', methods=['GET'])
@@ -309,15 +276,14 @@ def check_task_exists(entity_id, regulation_id, activity_id):
         return jsonify({"exists": task_count > 0}), 200
     
     except Exception as e:
-        print("Error:", str(e))
-        print(traceback.format_exc())  # Print full traceback for debugging
+        logger.exception("Error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @activities_bp.route('/assign_task', methods=['POST'])
 def assign_task():
     try:
         data = request.get_json()
-        logging.info(f"Received task assignment data: {data}")
+        logger.debug("Received task assignment data", extra={"data": data})
        
         # Extract required fields
         entity_id = data.get('entity_id')
@@ -328,7 +294,7 @@ def assign_task():
         due_on = data.get('due_on')
        
         if not all([entity_id, regulation_id, activity_id, preparation_responsibility, review_responsibility, due_on]):
-            logging.error("Missing required fields in request")
+            logger.error("Missing required fields in request")
             return jsonify({'error': 'Missing required fields'}), 400
            
         # Check if task already exists
@@ -339,7 +305,7 @@ def assign_task():
         ).first()
        
         if existing_task:
-            logging.info(f"Task already exists for entity {entity_id}, regulation {regulation_id}, activity {activity_id}")
+            logger.info("Task already exists for entity %s, regulation %s, activity %s", entity_id, regulation_id, activity_id)
             return jsonify({
                 'error': 'This activity has already been assigned',
                 'existing_task': {
@@ -362,38 +328,25 @@ def assign_task():
         ).first()
        
         if not activity or not regulation:
-            logging.error(f"Activity or regulation not found. Activity: {activity}, Regulation: {regulation}")
+            logger.error("Activity or regulation not found. Activity: %s, Regulation: %s", activity, regulation)
             return jsonify({'error': 'Activity or regulation not found'}), 404
            
         # Convert due_on to datetime
         try:
             due_date = datetime.strptime(due_on, '%Y-%m-%d').date()
         except ValueError as e:
-            logging.error(f"Invalid date format: {due_on}")
+            logger.error("Invalid date format: %s", due_on)
             return jsonify({'error': 'Invalid date format'}), 400
        
-        # Calculate next due date based on frequency
-        try:
-            if activity.frequency == 12:  # Monthly
-                next_due_date = due_date + relativedelta(months=1)
-            elif activity.frequency == 4:  # Quarterly
-                next_due_date = due_date + relativedelta(months=3)
-            elif activity.frequency == 2:  # Half Yearly
-                next_due_date = due_date + relativedelta(months=6)
-            elif activity.frequency == 1:  # Yearly
-                next_due_date = due_date + relativedelta(years=1)
-            else:
-                next_due_date = due_date
-        except Exception as e:
-            logging.error(f"Error calculating next due date: {str(e)}")
-            next_due_date = due_date
+        # Next due date of the activity's series after this one
+        next_due_date = next_occurrence(due_date, activity.frequency, due_date + timedelta(days=1))
            
         # Get user details first
         prep_user = Users.query.get(preparation_responsibility)
         review_user = Users.query.get(review_responsibility)
        
         if not prep_user or not review_user:
-            logging.error(f"User details not found. Prep user: {prep_user}, Review user: {review_user}")
+            logger.error("User details not found. Prep user: %s, Review user: %s", prep_user, review_user)
             return jsonify({'error': 'User details not found'}), 404
            
         # Create task record
@@ -413,20 +366,26 @@ def assign_task():
         )
        
         db.session.add(task)
-        db.session.commit()
+        record_task_changes(after=[snapshot_task(task)])
        
-        # Send emails and create calendar events
+        # Queue emails and calendar events in the notification outbox so they
+        # commit with the task; the savepoint keeps a bad notification row
+        # from failing the assignment itself
         try:
-            send_activity_assignment_emails(
-                activity_details=activity,
-                regulation_details=regulation,
-                preparation_user=preparation_responsibility,
-                review_user=review_responsibility,
-                due_date=due_date
-            )
+            with db.session.begin_nested():
+                send_activity_assignment_emails(
+                    activity_details=activity,
+                    regulation_details=regulation,
+                    preparation_user=preparation_responsibility,
+                    review_user=review_responsibility,
+                    due_date=due_date
+                )
         except Exception as e:
-            logging.error(f"Error sending emails: {str(e)}")
-            # Continue with the response even if email sending fails
+            logger.exception("Error queueing emails: %s", e)
+            # Continue with the response even if email queueing fails
+       
+        db.session.commit()
+        response_cache.invalidate('tasks')
        
         return jsonify({
             'message': 'Task assigned successfully',
@@ -446,38 +405,15 @@ def assign_task():
         }), 201
    
     except Exception as e:
-        logging.error(f"Error assigning task: {str(e)}")
-        logging.error(traceback.format_exc())
+        logger.exception("Error assigning task: %s", e)
         db.session.rollback()
         return jsonify({'error': f'Failed to assign task: {str(e)}'}), 500
    
     
 
-# Helper function to adjust due date for holidays and weekends
-def adjust_due_date_for_holidays(due_date):
-    while True:
-        # Check if due_date falls on a weekend (Saturday or Sunday)
-        if due_date.weekday() == 5:  # Saturday
-            due_date -= relativedelta(days=1)  # Move to Friday
-        elif due_date.weekday() == 6:  # Sunday
-            due_date -= relativedelta(days=2)  # Move to Friday
-        else:
-            # Check if due_date is a holiday
-            holiday = HolidayMaster.query.filter_by(holiday_date=due_date).first()
-            if holiday:
-                due_date -= relativedelta(days=1)  # Move to the previous day if it's a holiday
-            else:
-                break  # If it's not a holiday or weekend, exit the loop
-    
-    return due_date
-
-
-
 @activities_bp.route('/activities/entity/<string:entity_id>', methods=['GET'])
 def get_entity_activities(entity_id):
     try:
-        print(f"Fetching activities for entity: {entity_id}")  # Debug log
-        
         # Query activities associated with the entity's regulations
         activities = db.session.query(ActivityMaster).join(
             EntityRegulation,
@@ -496,10 +432,10 @@ def get_entity_activities(entity_id):
             "frequency": activity.frequency
         } for activity in activities]
         
-        print(f"Found {len(activities_list)} activities")  # Debug log
+        logger.debug("Found %d activities for entity %s", len(activities_list), entity_id)
         
         return jsonify({"activities": activities_list}), 200
 
     except Exception as e:
-        print(f"Error fetching activities: {str(e)}")  # Debug log
+        logger.exception("Error fetching activities: %s", e)
         return jsonify({"error": str(e)}), 500
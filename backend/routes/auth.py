@@ -1,11 +1,13 @@
 from flask import Blueprint, jsonify, request, session
 from models import db
 from models.models import Users, EntityMaster
-import traceback
-import bcrypt
+from services.passwords import HashingBusy, check_user_password
+import logging
 
 auth_bp = Blueprint('auth', __name__)
 
+logger = logging.getLogger(__name__)
+
 @auth_bp.route('/login', methods=['POST', 'OPTIONS'])
 def login():
     if request.method == 'OPTIONS':
@@ -24,66 +26,47 @@ def login():
         if not user_id or not password:
             return jsonify({"error": "User ID and password are required"}), 400
 
-        # Find the user
-        user = Users.query.filter_by(user_id=user_id).first()
+        # Find the user and the entity name in one query
+        row = db.session.query(Users, EntityMaster.entity_name)\
+            .outerjoin(EntityMaster, Users.entity_id == EntityMaster.entity_id)\
+            .filter(Users.user_id == user_id)\
+            .first()
 
-        if not user:
+        if not row:
             return jsonify({"error": "Invalid credentials"}), 401
+        user, entity_name = row
 
         # Check if user is obsolete
         if user.obsolete_current == 'O':
             return jsonify({"error": "This user account is inactive"}), 401
 
-        # For testing purposes - print the stored password
-        print(f"Stored password: {user.password}")
-        print(f"Provided password: {password}")
-        
-        # Check if the password is stored in plain text (for backward compatibility)
-        if user.password == password:
-            # Password matches directly - this is for backward compatibility
-            pass
-        else:
-            # Check if it's a bcrypt hash (starts with $2b$)
+        # One check against the stored scheme; legacy plaintext, MD5 and SHA-256
+        # passwords are rehashed to bcrypt on the way through
+        try:
+            password_match = check_user_password(user, password)
+        except HashingBusy:
+            return jsonify({"error": "Too many login attempts, please retry shortly"}), 503
+        except ValueError as e:
+            logger.warning("Error checking password for user %s: %s", user_id, e)
             password_match = False
-            
-            try:
-                if user.password.startswith('$2b$'):
-                    # It's a bcrypt hash
-                    password_match = bcrypt.checkpw(password.encode('utf-8'), user.password.encode('utf-8'))
-                else:
-                    # Try other hashing methods
-                    import hashlib
-                    # Method 1: Check if it's a simple MD5 hash
-                    md5_hash = hashlib.md5(password.encode()).hexdigest()
-                    if user.password == md5_hash:
-                        password_match = True
-                    else:
-                        # Method 2: Check if it's a SHA-256 hash
-                        sha256_hash = hashlib.sha256(password.encode()).hexdigest()
-                        if user.password == sha256_hash:
-                            password_match = True
-            except Exception as e:
-                print(f"Error checking password: {str(e)}")
-                password_match = False
-                
-            if not password_match:
-                return jsonify({"error": "Invalid credentials"}), 401
 
-        # Get entity name
-        entity = EntityMaster.query.get(user.entity_id)
-        entity_name = entity.entity_name if entity else "Unknown Entity"
+        if not password_match:
+            return jsonify({"error": "Invalid credentials"}), 401
 
         # Return user data
-        return jsonify({
+        response = jsonify({
             "user_id": user.user_id,
             "entity_id": user.entity_id,
-            "entity_name": entity_name,
+            "entity_name": entity_name or "Unknown Entity",
             "user_name": user.user_name,
             "role": user.role,
             "message": "Login successful"
-        }), 200
+        })
+        # Save a rehashed password or a newly detected scheme tag
+        if db.session.is_modified(user):
+            db.session.commit()
+        return response, 200
 
     except Exception as e:
-        print("Login error:", str(e))
-        print(traceback.format_exc())  # Print full traceback for debugging
+        logger.exception("Login error: %s", e)
         return jsonify({"error": "An error occurred during login"}), 500 
\ No newline at end of file
@@ -2,10 +2,12 @@ from flask import Blueprint, jsonify, request
 from models import db
 from models.models import Category
 import traceback
+from utils.response_cache import cached_response, response_cache
 
 categories_bp = Blueprint('categories', __name__)
 
 @categories_bp.route('/categories', methods=['GET'])
+@cached_response('categories')
 def get_categories():
     try:
         categories = Category.query.filter(
@@ -46,6 +48,7 @@ def add_category():
         # Add to the database
         db.session.add(new_category)
         db.session.commit()
+        response_cache.invalidate('categories')
 
         return jsonify({"message": "Category added successfully"}), 201
 
@@ -66,6 +69,7 @@ def delete_category(category_id):
         # Instead of deleting, mark as obsolete
         category.obsolete_current = "O"
         db.session.commit()
+        response_cache.invalidate('categories')
 
         return jsonify({"message": "Category deleted successfully"}), 200
 
@@ -1,12 +1,16 @@
 from flask import Blueprint, jsonify, request
 from models import db
-from models.models import EntityMaster, Users,CountryCodes,EntityRegulation,RegulationMaster,ActivityMaster
+from models.models import EntityMaster, Users,CountryCodes
 import traceback
-import bcrypt
+from utils.response_cache import cached_response, response_cache
+from services.passwords import HashingBusy, hash_password
+from services.entity_regulations import add_regulations_to_entity
+from services.id_sequences import next_entity_id, next_user_id
 
 entities_bp = Blueprint('entities', __name__)
 
 @entities_bp.route('/entities', methods=['GET'])
+@cached_response('entities')
 def get_entities():
     try:
         # Ensure filtering out entities where obsolete_current = 'O'
@@ -37,7 +41,6 @@ def get_entities():
 def add_entity():
     try:
         data = request.json
-        print("Received Data:", data)  # Debugging
 
         # Remove `obsolete_current` if it's being sent
         data.pop("obsolete_current", None)  # Ensure it's removed
@@ -60,44 +63,29 @@ def add_entity():
             if field not in data:
                 return jsonify({"error": f"Missing field: {field}"}), 400
 
-        # Generate Entity ID
-        entity_prefix = data["entity_name"][:4].upper()  # First 4 letters in uppercase
-        last_entity = EntityMaster.query.filter(EntityMaster.entity_id.like(f"{entity_prefix}%")) \
-                                        .order_by(EntityMaster.entity_id.desc()) \
-                                        .first()
+        # Create a new entity object (rejects unknown fields)
+        new_entity = EntityMaster(**data)
 
-        if last_entity:
-            last_number = int(last_entity.entity_id[4:])  # Extract number part
-            new_number = last_number + 1
-        else:
-            new_number = 1
+        if admin_email and admin_password:
+            # Hash the password with bcrypt
+            hashed_password, password_scheme = hash_password(admin_password)
 
-        new_entity_id = f"{entity_prefix}{str(new_number).zfill(3)}"  # Format as 3-digit number
-        data["entity_id"] = new_entity_id  # Assign generated ID
+        # IDs are allocated only once the request is known to be valid, as a
+        # reserved ID is not handed out again. Entity ID: first 4 letters of
+        # the name and the prefix's next number
+        new_entity_id = next_entity_id(data["entity_name"])
+        new_entity.entity_id = new_entity_id  # Assign generated ID
 
-        # Create a new entity object
-        new_entity = EntityMaster(**data)
+        # Admin user_id from contact_name (with a number appended if taken), allocated
+        # before anything is added so its sequence lookup never waits on this transaction
+        if admin_email and admin_password:
+            user_id = next_user_id(data["contact_name"].replace(" ", "")[:8])
 
         # Add to the database
         db.session.add(new_entity)
         
         # Create admin user for this entity
         if admin_email and admin_password:
-            # Generate user_id from contact_name
-            user_id = data["contact_name"].replace(" ", "")[:8]
-            
-            # Check if user_id already exists
-            existing_user = Users.query.filter_by(user_id=user_id).first()
-            if existing_user:
-                # Append a number to make it unique
-                count = 1
-                while Users.query.filter_by(user_id=f"{user_id}{count}").first():
-                    count += 1
-                user_id = f"{user_id}{count}"
-            
-            # Hash the password with bcrypt
-            hashed_password = bcrypt.hashpw(admin_password.encode('utf-8'), bcrypt.gensalt())
-            
             # Create new admin user
             new_admin = Users(
                 user_id=user_id,
@@ -106,46 +94,27 @@ def add_entity():
                 address=data.get("location", ""),
                 mobile_no=data["contact_phno"],  # This now includes country code
                 email_id=admin_email,
-                password=hashed_password.decode('utf-8'),  # Store the hashed password
+                password=hashed_password,  # Store the hashed password
+                password_scheme=password_scheme,
                 role="Admin",
                 obsolete_current=None
             )
             
             db.session.add(new_admin)
         
-        # Add selected regulations to entity_regulation table
-        for regulation_id in selected_regulations:
-            # Get regulation details to determine mandatory/optional activities
-            regulation = RegulationMaster.query.get(regulation_id)
-            if regulation:
-                # Count mandatory and optional activities where obsolete_current is NOT 'O' or is NULL
-                mandatory_count = ActivityMaster.query.filter(
-                    ActivityMaster.regulation_id == regulation_id,
-                    ActivityMaster.mandatory_optional == "M",
-                    (ActivityMaster.obsolete_current != "O") | (ActivityMaster.obsolete_current.is_(None))
-                ).count()
-                
-                optional_count = ActivityMaster.query.filter(
-                    ActivityMaster.regulation_id == regulation_id,
-                    ActivityMaster.mandatory_optional == "O",
-                    (ActivityMaster.obsolete_current != "O") | (ActivityMaster.obsolete_current.is_(None))
-                ).count()
-
-                # Create entity_regulation record with obsolete_current as NULL
-                entity_regulation = EntityRegulation(
-                    entity_id=new_entity_id,
-                    regulation_id=regulation_id,
-                    mandatory_activities=mandatory_count,
-                    optional_activities=optional_count,
-                    obsolete_current=None  # Keeping NULL instead of 'C'
-                )
-                db.session.add(entity_regulation)
+        # Add selected regulations to entity_regulation table, counting their
+        # mandatory/optional activities in one grouped query
+        add_regulations_to_entity(new_entity_id, selected_regulations)
 
         # Commit the session after adding all records
         db.session.commit()
+        response_cache.invalidate('entities')
 
         return jsonify({"message": "Entity added successfully", "entity_id": new_entity_id}), 201
 
+    except HashingBusy:
+        db.session.rollback()
+        return jsonify({"error": "Password hashing is busy, please retry shortly"}), 503
     except Exception as e:
         db.session.rollback()
         print("Error:", traceback.format_exc())  # Debugging
@@ -174,6 +143,7 @@ def update_entity(entity_id):
         entity.pincode = data["pincode"]
 
         db.session.commit()
+        response_cache.invalidate('entities')
         return jsonify({"message": "Entity updated successfully"}), 200
 
     except Exception as e:
@@ -190,6 +160,7 @@ def delete_entity(entity_id):
         # Set obsolete_current to 'O' instead of deleting
         entity.obsolete_current = "O"
         db.session.commit()
+        response_cache.invalidate('entities')
 
         return jsonify({"message": "Entity marked as obsolete"}), 200
 
@@ -198,6 +169,7 @@ def delete_entity(entity_id):
         return jsonify({"error": str(e)}), 500 
     
 @entities_bp.route('/country_codes', methods=['GET'])
+@cached_response('country_codes')
 def get_country_codes():
     try:
         # Fetch all country codes
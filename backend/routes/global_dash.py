@@ -1,182 +1,310 @@
-from flask import Flask, jsonify, render_template_string,send_file,request
-import numpy as np
-import mysql.connector
-import pandas as pd
-from datetime import datetime, timedelta
+import csv
+import io
+import logging
+import tempfile
+from flask import Flask, jsonify, render_template_string,send_file,request,current_app,Response,stream_with_context
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from services.db_pool import checkout_connection
+from services.dashboard_summary import fetch_summary_breakdowns, summary_is_current
+from utils.response_cache import cached_response, uncached
+from datetime import date, datetime, timedelta
 from flask_cors import CORS
-from datetime import datetime, timedelta
 from flask import Blueprint
 
 analysis_global_dash = Blueprint('analysis_global_dash', __name__, url_prefix='/api')
 
+logger = logging.getLogger(__name__)
+
 # Database Connection Function
 def connect_to_database():
+    """Check out a connection from the application's shared SQLAlchemy pool."""
     try:
-        # conn = mysql.connector.connect(
-        #     host="202.53.78.150",
-        #     user="Praharshitha",
-        #     password="vardaa@123",
-        #     database="pil_group",
-        #     port=3306
-        # )
-        conn = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="root",
-            database="rcms",
-            port=3306
-        )
-        cursor = conn.cursor(dictionary=True)
-        return conn, cursor
-    except mysql.connector.Error as err:
-        print(f"Error connecting to MySQL: {err}")
-        return None, None
+        return checkout_connection()
+    except SQLAlchemyError as err:
+        logger.error("Error connecting to database: %s", err)
+        return None
     
 #--------------------------------------------------------------Database ------------------------------------------------------------------------------
 
-def apply_time_filter(df, time_period):
+def time_period_bounds(time_period, current_date=None):
     """
-    Apply time-based filtering to the DataFrame
+    Translate a dashboard time period into an inclusive due date window
     
     Parameters:
-    - df: Input DataFrame with task data
     - time_period: String indicating the time filter
+    - current_date: Date the window is relative to (defaults to today)
     
     Returns:
-    - Filtered DataFrame
+    - (start, end) dates, or (None, None) when no time filter applies
     """
-    print(f"Applying time filter: {time_period}")
-    
-    # Handle empty dataframe
-    if df.empty:
-        return df
-        
-    # Ensure date columns are properly formatted
-    df['duedate'] = pd.to_datetime(df['duedate'], errors='coerce').dt.date
-    
-    current_date = pd.Timestamp.today().date()
+    current_date = current_date or date.today()
+    first_day_of_current_month = current_date.replace(day=1)
     
     if time_period == 'Current Month':
-        # Current month's range
-        first_day_of_month = current_date.replace(day=1)
-        last_day_of_month = (pd.Timestamp(first_day_of_month) + pd.offsets.MonthEnd(0)).date()
-        
-        print(f"Filtering for Current Month: {first_day_of_month} to {last_day_of_month}")
-        
-        filtered_df = df[
-            (df['duedate'] >= first_day_of_month) & 
-            (df['duedate'] <= last_day_of_month)
-        ]
+        next_month = (first_day_of_current_month + timedelta(days=32)).replace(day=1)
+        return first_day_of_current_month, next_month - timedelta(days=1)
     
     elif time_period == 'Previous Month':
-        # Previous full calendar month
-        first_day_of_current_month = current_date.replace(day=1)
         last_day_of_previous_month = first_day_of_current_month - timedelta(days=1)
-        first_day_of_previous_month = last_day_of_previous_month.replace(day=1)
-        
-        print(f"Filtering for Previous Month: {first_day_of_previous_month} to {last_day_of_previous_month}")
-        
-        filtered_df = df[
-            (df['duedate'] >= first_day_of_previous_month) & 
-            (df['duedate'] <= last_day_of_previous_month)
-        ]
+        return last_day_of_previous_month.replace(day=1), last_day_of_previous_month
     
     elif time_period == 'Next Month':
-        # Next full calendar month
-        first_day_of_current_month = current_date.replace(day=1)
-        first_day_of_next_month = (pd.Timestamp(first_day_of_current_month) + pd.offsets.MonthEnd(0) + timedelta(days=1)).date()
-        last_day_of_next_month = (pd.Timestamp(first_day_of_next_month) + pd.offsets.MonthEnd(0)).date()
-        
-        print(f"Filtering for Next Month: {first_day_of_next_month} to {last_day_of_next_month}")
-        
-        filtered_df = df[
-            (df['duedate'] >= first_day_of_next_month) & 
-            (df['duedate'] <= last_day_of_next_month)
-        ]
+        first_day_of_next_month = (first_day_of_current_month + timedelta(days=32)).replace(day=1)
+        last_day_of_next_month = (first_day_of_next_month + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        return first_day_of_next_month, last_day_of_next_month
     
     elif time_period == 'Previous 3 Months':
-        # Previous 3 months from current date
-        three_months_ago = current_date - timedelta(days=90)
-        
-        print(f"Filtering for Previous 3 Months: {three_months_ago} to {current_date}")
-        
-        filtered_df = df[
-            (df['duedate'] >= three_months_ago) & 
-            (df['duedate'] <= current_date)
-        ]
+        return current_date - timedelta(days=90), current_date
     
-    else:
-        # Default: return entire DataFrame
-        print("No time filter applied, returning all data")
-        filtered_df = df
+    return None, None
+
+def parse_date_range(args):
+    """
+    Read the optional custom due date window from the `from` and `to` query parameters
     
-    print(f"After time filter: {len(filtered_df)} of {len(df)} records remain")
-    return filtered_df
+    Returns:
+    - (date_from, date_to), either of which may be None
+    
+    Raises:
+    - ValueError if a date is not YYYY-MM-DD or the window is reversed
+    """
+    date_from, date_to = (
+        datetime.strptime(args[name], '%Y-%m-%d').date() if args.get(name) else None
+        for name in ('from', 'to')
+    )
+    if date_from and date_to and date_from > date_to:
+        raise ValueError("'from' must not be after 'to'")
+    return date_from, date_to
 
 #---------------------------------------------------------------------time filtering--------------------------------------------------------------
 
-def apply_internal_external_filter(df, internal_external):
+def build_task_filters(time_period, internal_external, mandatory_optional, entity_id, current_date,
+                       date_from=None, date_to=None):
     """
-    Filter DataFrame based on the specified type in the 'internal_external' column.
+    Build the WHERE clause shared by the dashboard queries
     
-    Parameters:
-    -----------
-    df : pandas.DataFrame
-        Input DataFrame to be filtered
-    type : str
-        The type to filter by (e.g., 'internal' or 'external')
+    A custom date_from/date_to window takes precedence over time_period.
+    Every window becomes a range predicate on ert.due_on so the
+    (entity_id, due_on) and (due_on, status) indexes can be used.
     
     Returns:
-    --------
-    pandas.DataFrame
-        Filtered DataFrame containing only rows matching the specified type
+    - (sql, params) where sql starts with WHERE and params is a dict of bind parameters
     """
-    if internal_external == 'External':
-        df = df[df['internal_external'] == "E"]
-        return df
-    elif internal_external == 'Internal':
-        df = df[df['internal_external'] == "I"]
-        return df
+    conditions = ["(em.obsolete_current IS NULL OR em.obsolete_current != 'O')"]
+    params = {"today": current_date}
+    
+    # Add entity filter if not global admin view
+    if entity_id != 'PILGC01':
+        conditions.append("ert.entity_id = :entity_id")
+        params["entity_id"] = entity_id
+    
+    # Add time window on due date
+    if date_from is not None or date_to is not None:
+        start, end = date_from, date_to
     else:
-        return df
+        start, end = time_period_bounds(time_period, current_date)
+    if start is not None and end is not None:
+        conditions.append("ert.due_on BETWEEN :due_from AND :due_to")
+        params["due_from"] = start
+        params["due_to"] = end
+    elif start is not None:
+        conditions.append("ert.due_on >= :due_from")
+        params["due_from"] = start
+    elif end is not None:
+        conditions.append("ert.due_on <= :due_to")
+        params["due_to"] = end
+    
+    # Add internal/external filter if specified
+    if internal_external == 'Internal':
+        conditions.append("ert.internal_external = 'I'")
+    elif internal_external == 'External':
+        conditions.append("ert.internal_external = 'E'")
     
-#-------------------------------------------------------------------I/E-----------------------------------------------------------------------------------
+    # Add mandatory/optional filter if specified
+    if mandatory_optional == 'Mandatory':
+        conditions.append("ert.mandatory_optional = 'M'")
+    elif mandatory_optional == 'Optional':
+        conditions.append("ert.mandatory_optional = 'O'")
+    
+    return "WHERE " + "\n            AND ".join(conditions), params
+
+# Six-way status classification evaluated by the database
+TASK_STATUS_SQL = """
+    CASE
+        WHEN ert.status = 'WIP' AND ert.due_on >= :today THEN 'Ongoing'
+        WHEN ert.status = 'WIP' AND ert.due_on < :today THEN 'Ongoing with Delay'
+        WHEN ert.status = 'Completed' AND ert.end_date <= ert.due_on THEN 'Completed'
+        WHEN ert.status = 'Completed' AND ert.end_date > ert.due_on THEN 'Completed with Delay'
+        WHEN ert.status = 'Yet to Start' AND ert.due_on >= :today THEN 'Due'
+        WHEN ert.status = 'Yet to Start' AND ert.due_on < :today THEN 'Due with Delay'
+        ELSE 'Unknown'
+    END
+"""
 
-def apply_mandatory_optional_filter(df, mandatory_optional):
+TASK_JOINS_SQL = """
+    FROM entity_regulation_tasks ert
+    LEFT JOIN entity_master em ON ert.entity_id = em.entity_id
+    LEFT JOIN regulation_master rm ON ert.regulation_id = rm.regulation_id
+    LEFT JOIN category c ON rm.category_id = c.category_id
+"""
+
+def status_breakdowns_sql(where_sql):
+    """SQL of fetch_status_breakdowns() for a WHERE clause from build_task_filters()."""
+    return f"""
+    WITH classified AS (
+        SELECT
+            em.entity_name,
+            c.category_type AS category,
+            COALESCE(ert.criticality, 'Not Specified') AS criticality,
+            {TASK_STATUS_SQL} AS task_status
+        {TASK_JOINS_SQL}
+        {where_sql}
+    )
+    (
+        SELECT 'entity' AS dimension, entity_name AS dimension_value, task_status, COUNT(*) AS task_count,
+               GROUPING(task_status) AS all_statuses, GROUPING(entity_name) AS all_values
+        FROM classified
+        GROUP BY task_status, entity_name WITH ROLLUP
+    )
+    UNION ALL
+    (
+        SELECT 'category', category, task_status, COUNT(*), 0, 0
+        FROM classified
+        GROUP BY category, task_status
+    )
+    UNION ALL
+    (
+        SELECT 'criticality', criticality, task_status, COUNT(*), 0, 0
+        FROM classified
+        GROUP BY criticality, task_status
+    )
     """
-    Filter DataFrame based on the specified type in the 'mandatory_optional' column.
+
+def fetch_status_breakdowns(conn, where_sql, params):
+    """
+    Count tasks per status for each dashboard dimension in a single round trip.
     
-    Parameters:
-    -----------
-    df : pandas.DataFrame
-        Input DataFrame to be filtered
-    type : str
-        The type to filter by (e.g., 'mandatory' or 'optional')
+    The entity breakdown is rolled up so the same result also carries the
+    per-status totals and the grand total.
     
     Returns:
-    --------
-    pandas.DataFrame
-        Filtered DataFrame containing only rows matching the specified type
+    - Rows with dimension, dimension_value, task_status, task_count and the
+      GROUPING() flags of the entity rollup
     """
-    if mandatory_optional == 'Mandatory':
-        df = df[df['mandatory_optional'] == "M"]
-        return df
-    elif mandatory_optional == 'Optional':
-        df = df[df['mandatory_optional'] == "O"]
-        return df
-    else:
-        return df
+    query = status_breakdowns_sql(where_sql)
+    return conn.execute(text(query), params).mappings().all()
+
+DETAIL_JOINS_SQL = TASK_JOINS_SQL + """
+    LEFT JOIN activity_master a ON ert.regulation_id = a.regulation_id AND ert.activity_id = a.activity_id
+"""
+
+def detailed_rows_sql(where_sql):
+    """SQL of fetch_detailed_rows() for a WHERE clause from build_task_filters()."""
+    return f"""
+    SELECT
+        em.entity_name AS Entity,
+        COALESCE(ert.criticality, 'Not Specified') AS Criticality,
+        a.activity AS Task,
+        {TASK_STATUS_SQL} AS calculated_status,
+        c.category_type AS Category,
+        rm.regulation_name AS Regulation
+    {DETAIL_JOINS_SQL}
+    {where_sql}
+    ORDER BY ert.due_on, ert.id
+    LIMIT :limit OFFSET :offset
+    """
+
+def fetch_detailed_rows(conn, where_sql, params, page, page_size):
+    """Fetch one page of per-task rows for the dashboard table."""
+    query = detailed_rows_sql(where_sql)
+    rows = conn.execute(text(query), dict(params, limit=page_size, offset=(page - 1) * page_size))
+    return [dict(row) for row in rows.mappings()]
+
+def add_detail_filters(where_sql, params, status=None, category=None, criticality=None):
+    """
+    Narrow a WHERE clause from build_task_filters() to one chart drill-down
+    
+    Status, category and criticality match the labels of the summary
+    breakdowns, so a bar or slice picked on the dashboard selects the same
+    tasks it counted.
+    
+    Returns:
+    - (sql, params) with the extra conditions added
+    """
+    conditions, params = [], dict(params)
+    if status:
+        conditions.append(f"({TASK_STATUS_SQL}) = :detail_status")
+        params["detail_status"] = status
+    if category:
+        conditions.append("c.category_type = :detail_category")
+        params["detail_category"] = category
+    if criticality:
+        conditions.append("COALESCE(ert.criticality, 'Not Specified') = :detail_criticality")
+        params["detail_criticality"] = criticality
+    if not conditions:
+        return where_sql, params
+    return where_sql + "\n            AND " + "\n            AND ".join(conditions), params
+
+def detail_count_sql(where_sql):
+    """SQL of count_detailed_rows() for a WHERE clause from build_task_filters()."""
+    return f"SELECT COUNT(*) {TASK_JOINS_SQL} {where_sql}"
+
+def count_detailed_rows(conn, where_sql, params):
+    """Number of per-task rows fetch_detailed_rows() pages through."""
+    query = detail_count_sql(where_sql)
+    return conn.execute(text(query), params).scalar()
+
+# Time periods made of whole months can be answered from dashboard_task_summary
+SUMMARY_TIME_PERIODS = ('All', 'Current Month', 'Previous Month', 'Next Month')
+
+def fetch_breakdowns_from_summary(conn, time_period, internal_external, mandatory_optional, entity_id, current_date):
+    """
+    Read the status breakdowns from the precomputed summary table when the
+    filters line up with its monthly buckets.
     
-#------------------------------------------------------M/O---------------------------------------------------------------------------------------------------
+    Returns:
+    - Rows shaped like fetch_status_breakdowns(), or None to fall back to the live query
+    """
+    if not current_app.config.get('DASHBOARD_SUMMARY_ENABLED', True):
+        return None
+    if time_period not in SUMMARY_TIME_PERIODS or not summary_is_current(current_date):
+        return None
+    
+    due_from, due_to = time_period_bounds(time_period, current_date)
+    return fetch_summary_breakdowns(
+        conn,
+        entity_id=None if entity_id == 'PILGC01' else entity_id,
+        due_from=due_from,
+        due_to=due_to,
+        internal_external={'Internal': 'I', 'External': 'E'}.get(internal_external),
+        mandatory_optional={'Mandatory': 'M', 'Optional': 'O'}.get(mandatory_optional)
+    )
+
+def empty_summary():
+    return {
+        "total_tasks": 0,
+        "completed": 0,
+        "completed_with_delay": 0,
+        "ongoing": 0,
+        "ongoing_with_delay": 0,
+        "due": 0,
+        "due_with_delay": 0,
+        "entity_wise_data": {},
+        "category_data": {},
+        "criticality_data": {},
+        "detailed_data": []
+    }
 
 # API to Fetch Task Summary Data for Global Admin
 @analysis_global_dash.route('/global-task-summary', methods=['GET'])
+@cached_response('tasks', 'entities', 'categories', 'regulations')
 def get_global_task_summary():
     """Fetch categorized task counts for all entities if the user is a global admin."""
-    conn, cursor = connect_to_database()
-    if not conn or not cursor:
+    conn = connect_to_database()
+    if not conn:
         # Return mock data for testing frontend
-        print("Database connection failed, returning mock data")
+        logger.warning("Database connection failed, returning mock data")
         # Generate mock data based on filter parameters
         mock_data = {
             "total_tasks": 70,
@@ -231,7 +359,7 @@ def get_global_task_summary():
                 mock_data["due"] = 10
             # ... etc for other filters
 
-        return jsonify(mock_data)
+        return uncached(jsonify(mock_data))
     
     try:
         # Get time period from query parameters
@@ -239,261 +367,271 @@ def get_global_task_summary():
         internal_external = request.args.get('internal_external', 'All')
         mandatory_optional = request.args.get('mandatory_optional', 'All')
         entity_id = request.args.get('entity_id', 'JORABARU')  # Default to global admin if not specified
+        include_details = request.args.get('include_details', 'false').lower() == 'true'
+        page = max(request.args.get('page', 1, type=int) or 1, 1)
+        page_size = min(max(request.args.get('page_size', 100, type=int) or 100, 1), 1000)
         
-        print(f"Received request with params: time_period={time_period}, internal_external={internal_external}, mandatory_optional={mandatory_optional}, entity_id={entity_id}")
+        try:
+            date_from, date_to = parse_date_range(request.args)
+        except ValueError as e:
+            return jsonify({"error": f"Invalid date range: {str(e)}"}), 400
         
-        # Base query to fetch all tasks
-        base_query = """
-        SELECT DISTINCT
-            ert.id, 
-            ert.entity_id, 
-            em.entity_name,
-            ert.status, 
-            ert.due_on AS duedate, 
-            ert.end_date AS actual_date,
-            ert.regulation_id, 
-            ert.activity_id, 
-            rm.category_id, 
-            c.category_type AS category,
-            rm.regulation_name,
-            ert.criticality, 
-            ert.internal_external,
-            ert.mandatory_optional,
-            a.activity,
-            ert.preparation_responsibility
-        FROM 
-            entity_regulation_tasks ert
-        LEFT JOIN 
-            entity_master em ON ert.entity_id = em.entity_id
-        LEFT JOIN 
-            regulation_master rm ON ert.regulation_id = rm.regulation_id
-        LEFT JOIN 
-            category c ON rm.category_id = c.category_id
-        LEFT JOIN 
-            activity_master a ON ert.activity_id = a.activity_id
-        WHERE 
-            (em.obsolete_current IS NULL OR em.obsolete_current != 'O')
-        """
+        logger.debug("Global task summary request", extra={"time_period": time_period, "internal_external": internal_external,
+                     "mandatory_optional": mandatory_optional, "entity_id": entity_id,
+                     "date_from": date_from, "date_to": date_to})
         
-        # Add entity filter if not global admin view
-        params = []
-        if entity_id != 'PILGC01':
-            base_query += " AND ert.entity_id = %s"
-            params.append(entity_id)
-            
-        # Add internal/external filter if specified
-        if internal_external == 'Internal':
-            base_query += " AND ert.internal_external = 'I'"
-        elif internal_external == 'External':
-            base_query += " AND ert.internal_external = 'E'"
-            
-        # Add mandatory/optional filter if specified
-        if mandatory_optional == 'Mandatory':
-            base_query += " AND ert.mandatory_optional = 'M'"
-        elif mandatory_optional == 'Optional':
-            base_query += " AND ert.mandatory_optional = 'O'"
-            
-        print(f"Executing query: {base_query}")
-        print(f"With params: {params}")
+        current_date = date.today()
+        where_sql, params = build_task_filters(time_period, internal_external, mandatory_optional, entity_id, current_date,
+                                               date_from, date_to)
         
-        if params:
-            cursor.execute(base_query, params)
-        else:
-            cursor.execute(base_query)
-            
-        records = cursor.fetchall()
-        print(f"Fetched {len(records)} records from database")  # Debug print
-
-        if not records:
-            print("No records found in the database")
-            return jsonify({
-                "total_tasks": 0,
-                "completed": 0,
-                "completed_with_delay": 0,
-                "ongoing": 0,
-                "ongoing_with_delay": 0,
-                "due": 0,
-                "due_with_delay": 0,
-                "entity_wise_data": {},
-                "category_data": {},
-                "criticality_data": {},
-                "detailed_data": []
-            })
-
-        # Convert to DataFrame
-        df = pd.DataFrame(records)
-        print(f"Created DataFrame with {len(df)} rows")  # Debug print
+        # Only aggregate rows come back from the database, from the summary
+        # table when possible and from entity_regulation_tasks otherwise
+        rows = None
+        if date_from is None and date_to is None:
+            rows = fetch_breakdowns_from_summary(conn, time_period, internal_external, mandatory_optional, entity_id, current_date)
+        if rows is None:
+            rows = fetch_status_breakdowns(conn, where_sql, params)
+        logger.debug("Fetched %d aggregate rows from database", len(rows))
         
-        if len(df) > 0:  # Only process if we have data
-            df = df.drop_duplicates(subset=['id'])
-            print(f"After removing duplicates: {len(df)} rows")
-            
-            # Ensure date conversion
-            current_date = pd.Timestamp.today().date()
-            df['duedate'] = pd.to_datetime(df['duedate'], errors='coerce').dt.date
-            df['actual_date'] = pd.to_datetime(df['actual_date'], errors='coerce').dt.date
-            
-            # Apply time filter if specified
-            if time_period != 'All':
-                print(f"Applying time filter: {time_period}")
-                df = apply_time_filter(df, time_period)
-                print(f"After time filter: {len(df)} rows")
-            
-            # Apply internal/external filter if specified
-            if internal_external != 'All':
-                print(f"Applying internal/external filter: {internal_external}")
-                df = apply_internal_external_filter(df, internal_external)
-                print(f"After internal/external filter: {len(df)} rows")
-            
-            # Apply mandatory/optional filter if specified
-            if mandatory_optional != 'All':
-                print(f"Applying mandatory/optional filter: {mandatory_optional}")
-                df = apply_mandatory_optional_filter(df, mandatory_optional)
-                print(f"After mandatory/optional filter: {len(df)} rows")
-            
-            print(f"After applying all filters: {len(df)} rows")
-
-            # Categorizing task status
-            df['task_status'] = np.select(
-                [
-                    (df['status'] == 'WIP') & (df['duedate'] >= current_date),
-                    (df['status'] == 'WIP') & (df['duedate'] < current_date),
-                    (df['status'] == 'Completed') & (df['actual_date'] <= df['duedate']),
-                    (df['status'] == 'Completed') & (df['actual_date'] > df['duedate']),
-                    (df['status'] == 'Yet to Start') & (df['duedate'] >= current_date),
-                    (df['status'] == 'Yet to Start') & (df['duedate'] < current_date)
-                ],
-                ['Ongoing', 'Ongoing with Delay', 'Completed', 'Completed with Delay', 'Due', 'Due with Delay'],
-                default='Unknown'
-            )
-
-            # Calculate status counts
-            status_counts = df['task_status'].value_counts().to_dict()
-            print(f"Status counts: {status_counts}")  # Debug print
-
-            # Entity-wise task counts
-            entity_status_df = df.groupby(['entity_name', 'task_status']).size().reset_index(name='count')
-            entity_wise_data = {}
-            for _, row in entity_status_df.iterrows():
-                entity = row['entity_name']
-                status = row['task_status']
-                count = int(row['count'])
-                
-                if entity not in entity_wise_data:
-                    entity_wise_data[entity] = {}
-                
-                entity_wise_data[entity][status] = count
-            
-            # Category-wise data
-            category_status_df = df.groupby(['category', 'task_status']).size().reset_index(name='count')
-            category_data = {}
-            for _, row in category_status_df.iterrows():
-                category = row['category']
-                status = row['task_status']
-                count = int(row['count'])
-                
-                if category not in category_data:
-                    category_data[category] = {}
-                
-                category_data[category][status] = count
-            
-            # Criticality data
-            df['criticality'] = df['criticality'].fillna('Not Specified')
-            criticality_counts = df.groupby(['criticality', 'task_status']).size().reset_index(name='count')
-            criticality_data = {}
-            for _, row in criticality_counts.iterrows():
-                criticality = row['criticality']
-                status = row['task_status']
-                count = int(row['count'])
-                
-                if criticality not in criticality_data:
-                    criticality_data[criticality] = {}
-                
-                criticality_data[criticality][status] = count
-
-            # Prepare detailed data
-            detailed_data = df[['entity_name', 'criticality', 'activity', 'task_status', 'category', 'regulation_name']].rename(columns={
-                'entity_name': 'Entity',
-                'criticality': 'Criticality',
-                'activity': 'Task',
-                'task_status': 'calculated_status',
-                'category': 'Category',
-                'regulation_name': 'Regulation'
-            }).to_dict('records')
-
-            print(f"Prepared {len(detailed_data)} detailed records")  # Debug print
-
-            # Ensure all required fields are present in the response
-            response_data = {
-                "total_tasks": len(df),
-                "completed": status_counts.get("Completed", 0),
-                "completed_with_delay": status_counts.get("Completed with Delay", 0),
-                "ongoing": status_counts.get("Ongoing", 0),
-                "ongoing_with_delay": status_counts.get("Ongoing with Delay", 0),
-                "due": status_counts.get("Due", 0),
-                "due_with_delay": status_counts.get("Due with Delay", 0),
-                "entity_wise_data": entity_wise_data,
-                "category_data": category_data,
-                "criticality_data": criticality_data,
-                "detailed_data": detailed_data
-            }
-            
-            print("Response data structure:", {
-                "total_tasks": response_data["total_tasks"],
-                "detailed_data_length": len(response_data["detailed_data"]),
-                "entity_wise_data_keys": list(response_data["entity_wise_data"].keys()),
-                "category_data_keys": list(response_data["category_data"].keys()),
-                "criticality_data_keys": list(response_data["criticality_data"].keys())
-            })
-            
-            return jsonify(response_data)
-        else:
-            print("No data after DataFrame conversion")
-            return jsonify({
-                "total_tasks": 0,
-                "completed": 0,
-                "completed_with_delay": 0,
-                "ongoing": 0,
-                "ongoing_with_delay": 0,
-                "due": 0,
-                "due_with_delay": 0,
-                "entity_wise_data": {},
-                "category_data": {},
-                "criticality_data": {},
-                "detailed_data": []
-            })
+        response_data = empty_summary()
+        status_counts = {}
+        breakdowns = {
+            "entity": response_data["entity_wise_data"],
+            "category": response_data["category_data"],
+            "criticality": response_data["criticality_data"]
+        }
+        
+        for row in rows:
+            count = int(row['task_count'])
+            if row['dimension'] == 'entity' and row['all_statuses']:
+                # Grand total row of the rollup
+                response_data["total_tasks"] = count
+            elif row['dimension'] == 'entity' and row['all_values']:
+                # Per-status subtotal row of the rollup
+                status_counts[row['task_status']] = count
+            elif row['dimension_value'] is not None:
+                breakdowns[row['dimension']].setdefault(row['dimension_value'], {})[row['task_status']] = count
+        
+        response_data.update({
+            "completed": status_counts.get("Completed", 0),
+            "completed_with_delay": status_counts.get("Completed with Delay", 0),
+            "ongoing": status_counts.get("Ongoing", 0),
+            "ongoing_with_delay": status_counts.get("Ongoing with Delay", 0),
+            "due": status_counts.get("Due", 0),
+            "due_with_delay": status_counts.get("Due with Delay", 0)
+        })
+        
+        # Detailed rows are opt-in and paginated
+        if include_details and response_data["total_tasks"]:
+            response_data["detailed_data"] = fetch_detailed_rows(conn, where_sql, params, page, page_size)
+            response_data["page"] = page
+            response_data["page_size"] = page_size
+        
+        logger.debug("Status counts", extra={"status_counts": status_counts})
+        return jsonify(response_data)
 
     except Exception as e:
-        print(f"Error in global task summary: {str(e)}")
-        import traceback
-        traceback.print_exc()  # Print full stack trace
+        logger.exception("Error in global task summary")
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
     
     finally:
-        if cursor:
-            cursor.close()
         if conn:
             conn.close()
 
+# API to page through the task rows behind the dashboard, optionally narrowed to a drill-down
+@analysis_global_dash.route('/global-task-summary/details', methods=['GET'])
+@cached_response('tasks', 'entities', 'categories', 'regulations')
+def get_global_task_details():
+    """Fetch one page of the filtered task rows and the number of rows across all pages."""
+    conn = connect_to_database()
+    if not conn:
+        return jsonify({"error": "Database connection failed"}), 503
+    
+    try:
+        time_period = request.args.get('time_period', 'All')
+        internal_external = request.args.get('internal_external', 'All')
+        mandatory_optional = request.args.get('mandatory_optional', 'All')
+        entity_id = request.args.get('entity_id', 'JORABARU')
+        page = max(request.args.get('page', 1, type=int) or 1, 1)
+        page_size = min(max(request.args.get('page_size', 100, type=int) or 100, 1), 1000)
+        try:
+            date_from, date_to = parse_date_range(request.args)
+        except ValueError as e:
+            return jsonify({"error": f"Invalid date range: {str(e)}"}), 400
+        
+        where_sql, params = build_task_filters(time_period, internal_external, mandatory_optional, entity_id, date.today(),
+                                               date_from, date_to)
+        where_sql, params = add_detail_filters(where_sql, params,
+                                               status=request.args.get('status'),
+                                               category=request.args.get('category'),
+                                               criticality=request.args.get('criticality'))
+        total = count_detailed_rows(conn, where_sql, params)
+        detailed_data = fetch_detailed_rows(conn, where_sql, params, page, page_size) if total else []
+        
+        return jsonify({
+            "detailed_data": detailed_data,
+            "total": total,
+            "page": page,
+            "page_size": page_size
+        })
+    
+    except Exception as e:
+        logger.exception("Error in global task details: %s", e)
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+    
+    finally:
+        conn.close()
+
+#------------------------------------------------------Export-------------------------------------------------------------
+
+# Column headers of the exported detail rows, in SELECT order
+EXPORT_HEADERS = [
+    "Entity", "Category", "Regulation", "Task", "Criticality", "Due On",
+    "Status", "Internal/External", "Mandatory/Optional"
+]
+
+def export_rows_sql(where_sql):
+    """SQL of the exported detail rows for a WHERE clause from build_task_filters()."""
+    return f"""
+    SELECT
+        em.entity_name,
+        c.category_type,
+        rm.regulation_name,
+        a.activity,
+        COALESCE(ert.criticality, 'Not Specified'),
+        ert.due_on,
+        {TASK_STATUS_SQL},
+        ert.internal_external,
+        ert.mandatory_optional
+    {DETAIL_JOINS_SQL}
+    {where_sql}
+    ORDER BY ert.due_on, ert.id
+    """
+
+def iter_detail_chunks(conn, where_sql, params, chunk_size):
+    """
+    Yield every filtered per-task row in lists of chunk_size rows.
+    
+    The query runs on a server-side cursor (stream_results), so only one
+    chunk is held in memory at a time whatever the number of tasks.
+    """
+    query = export_rows_sql(where_sql)
+    result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(text(query), params)
+    for rows in result.partitions():
+        yield rows
+
+def generate_csv_export(conn, chunks):
+    """Stream the rows as CSV, one encoded block per chunk. Closes conn when done."""
+    try:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_HEADERS)
+        for rows in chunks:
+            writer.writerows(rows)
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+        yield buffer.getvalue().encode('utf-8')
+    finally:
+        conn.close()
+
+def generate_xlsx_export(conn, chunks, openpyxl, block_size=64 * 1024):
+    """
+    Stream the rows as an XLSX workbook. Closes conn when done.
+    
+    A write-only workbook spools the rows to a temporary file instead of
+    keeping them in memory; the finished file is then streamed in blocks.
+    """
+    try:
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet("Tasks")
+        sheet.append(EXPORT_HEADERS)
+        for rows in chunks:
+            for row in rows:
+                sheet.append(list(row))
+        with tempfile.TemporaryFile() as spool:
+            workbook.save(spool)
+            spool.seek(0)
+            while True:
+                block = spool.read(block_size)
+                if not block:
+                    break
+                yield block
+    finally:
+        conn.close()
+
+@analysis_global_dash.route('/global-task-summary/export', methods=['GET'])
+def export_global_task_summary():
+    """Download the filtered dashboard detail rows as CSV (default) or XLSX."""
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in ('csv', 'xlsx'):
+        return jsonify({"error": "format must be csv or xlsx"}), 400
+    
+    openpyxl = None
+    if export_format == 'xlsx':
+        try:
+            import openpyxl
+        except ImportError:
+            return jsonify({"error": "XLSX export requires the openpyxl package"}), 501
+    
+    conn = connect_to_database()
+    if not conn:
+        return jsonify({"error": "Database connection failed"}), 503
+    
+    try:
+        time_period = request.args.get('time_period', 'All')
+        internal_external = request.args.get('internal_external', 'All')
+        mandatory_optional = request.args.get('mandatory_optional', 'All')
+        entity_id = request.args.get('entity_id', 'JORABARU')
+        chunk_size = current_app.config.get('EXPORT_CHUNK_SIZE', 1000)
+        try:
+            date_from, date_to = parse_date_range(request.args)
+        except ValueError as e:
+            conn.close()
+            return jsonify({"error": f"Invalid date range: {str(e)}"}), 400
+        
+        where_sql, params = build_task_filters(time_period, internal_external, mandatory_optional, entity_id, date.today(),
+                                               date_from, date_to)
+        chunks = iter_detail_chunks(conn, where_sql, params, chunk_size)
+        filename = f"global-task-summary-{date.today().isoformat()}.{export_format}"
+        
+        if export_format == 'xlsx':
+            body = generate_xlsx_export(conn, chunks, openpyxl)
+            mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        else:
+            body = generate_csv_export(conn, chunks)
+            mimetype = 'text/csv'
+        
+        # The generator owns the connection from here on and closes it when the download ends
+        return Response(
+            stream_with_context(body),
+            mimetype=mimetype,
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        )
+    
+    except Exception as e:
+        conn.close()
+        logger.exception("Error in global task summary export")
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
 #------------------------------------------------------Task Details-------------------------------------------------------------
 
 @analysis_global_dash.route('/entities', methods=['GET'])
+@cached_response('tasks', 'entities')
 def get_entities():
-    print("==== GET ENTITIES FUNCTION CALLED ====")
-    
     try:
         # Establish database connection
-        conn, cursor = connect_to_database()
-        if not conn or not cursor:
-            print("Database connection failed")
+        conn = connect_to_database()
+        if not conn:
+            logger.warning("Database connection failed")
             # Return test data if connection fails
             test_entities = [
                 {"id": "GLOBAL", "name": "Global Admin"},
                 {"id": "ENT001", "name": "Test Entity 1"},
                 {"id": "ENT002", "name": "Test Entity 2"}
             ]
-            print("Returning test entities due to DB connection failure")
-            return jsonify(test_entities)
+            logger.warning("Returning test entities due to DB connection failure")
+            return uncached(jsonify(test_entities))
 
         # Query to fetch active entities that have tasks
         query = """
@@ -505,11 +643,10 @@ def get_entities():
         """
         
         try:
-            print(f"Executing query: {query}")
-            cursor.execute(query)
+            rows = conn.execute(text(query)).mappings()
             
-            entities = [{"id": row["entity_id"], "name": row["entity_name"]} for row in cursor.fetchall()]
-            print(f"Fetched {len(entities)} entities: {entities}")
+            entities = [{"id": row["entity_id"], "name": row["entity_name"]} for row in rows]
+            logger.debug("Fetched %d entities", len(entities))
             
             if not entities:
                 # Return test data if no entities found
@@ -518,37 +655,33 @@ def get_entities():
                     {"id": "ENT001", "name": "Test Entity 1"},
                     {"id": "ENT002", "name": "Test Entity 2"}
                 ]
-                print("No entities found, returning test data")
-                return jsonify(test_entities)
+                logger.warning("No entities found, returning test data")
+                return uncached(jsonify(test_entities))
             
             return jsonify(entities)
         except Exception as e:
-            print(f"Error executing query: {str(e)}")
+            logger.exception("Error executing entities query: %s", e)
             # Return test data if query fails
             test_entities = [
                 {"id": "GLOBAL", "name": "Global Admin"},
                 {"id": "ENT001", "name": "Test Entity 1"},
                 {"id": "ENT002", "name": "Test Entity 2"}
             ]
-            print("Returning test entities due to query error")
-            return jsonify(test_entities)
+            logger.warning("Returning test entities due to query error")
+            return uncached(jsonify(test_entities))
     
     except Exception as e:
-        print(f"Error fetching entities: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error fetching entities: %s", e)
         # Return test data if function fails
         test_entities = [
             {"id": "GLOBAL", "name": "Global Admin"},
             {"id": "ENT001", "name": "Test Entity 1"},
             {"id": "ENT002", "name": "Test Entity 2"}
         ]
-        print("Returning test entities due to general error")
-        return jsonify(test_entities)
+        logger.warning("Returning test entities due to general error")
+        return uncached(jsonify(test_entities))
     
     finally:
-        if cursor:
-            cursor.close()
         if conn:
             conn.close()
 
@@ -598,7 +731,6 @@ def serve_dashboard():
 
 @analysis_global_dash.route('/ping', methods=['GET'])
 def ping():
-    print("Ping endpoint called")
     return jsonify({"status": "success", "message": "API is working"}), 200
 
 
@@ -1,16 +1,52 @@
+import logging
+from datetime import date, datetime
 from flask import Blueprint, jsonify, request
 from models import db
 from models.models import HolidayMaster
-import traceback
+from services.holiday_calendar import holiday_calendar
+from services.holiday_import import HolidayUploadError, import_holidays, parse_holidays, readjust_due_dates
+from utils.response_cache import cached_response, response_cache
 
 holidays_bp = Blueprint('holidays', __name__)
+logger = logging.getLogger(__name__)
+
+def _year_range(args):
+    # ?year=2026 or ?year_from=2026&year_to=2027 as a holiday_date range
+    year = args.get('year', type=int)
+    year_from = args.get('year_from', type=int, default=year)
+    year_to = args.get('year_to', type=int, default=year)
+    for value in (year_from, year_to):
+        if value is not None and not 1 <= value <= 9999:
+            raise ValueError(f"Invalid year: {value}")
+    if year_from is not None and year_to is not None and year_from > year_to:
+        raise ValueError("year_from is after year_to")
+    return (date(year_from, 1, 1) if year_from else None,
+            date(year_to, 12, 31) if year_to else None)
 
 @holidays_bp.route("/holidays", methods=["GET"])
+@cached_response('holidays')
 def get_holidays():
+    """
+    Active holidays by date, optionally of one entity (`entity_id`) and
+    within `year` or `year_from`..`year_to`.
+    """
     try:
-        holidays = HolidayMaster.query.filter(
+        try:
+            date_from, date_to = _year_range(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        query = HolidayMaster.query.filter(
             (HolidayMaster.obsolete_current != 'O') | (HolidayMaster.obsolete_current.is_(None))
-        ).all()
+        )
+        entity_id = request.args.get('entity_id')
+        if entity_id:
+            query = query.filter(HolidayMaster.entity_id == entity_id)
+        if date_from:
+            query = query.filter(HolidayMaster.holiday_date >= date_from)
+        if date_to:
+            query = query.filter(HolidayMaster.holiday_date <= date_to)
+        holidays = query.order_by(HolidayMaster.holiday_date, HolidayMaster.entity_id).all()
 
         holidays_list = [
             {
@@ -24,7 +60,7 @@ def get_holidays():
         return jsonify({"holidays": holidays_list}), 200
 
     except Exception as e:
-        print("Error:", str(e))
+        logger.exception("Error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @holidays_bp.route("/add_holiday", methods=["POST"])
@@ -36,20 +72,32 @@ def add_holiday():
         if not data.get("holiday_date") or not data.get("description") or not data.get("entity_id"):
             return jsonify({"error": "Missing required fields"}), 400
 
+        try:
+            holiday_date = datetime.strptime(str(data["holiday_date"]), '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({"error": "holiday_date must be YYYY-MM-DD"}), 400
+
         new_holiday = HolidayMaster(
-            holiday_date=data["holiday_date"],
+            holiday_date=holiday_date,
             description=data["description"],
             entity_id=data["entity_id"],
             obsolete_current="C",  # Mark as current by default
         )
 
         db.session.add(new_holiday)
+        db.session.flush()
+        moved = readjust_due_dates(date_from=holiday_date, date_to=holiday_date, entity_ids=[data["entity_id"]])
         db.session.commit()
+        holiday_calendar.invalidate()
+        response_cache.invalidate('holidays')
+        if moved:
+            response_cache.invalidate('tasks')
 
-        return jsonify({"message": "Holiday added successfully"}), 201
+        return jsonify({"message": "Holiday added successfully", "tasks_moved": moved}), 201
 
     except Exception as e:
-        print("Error:", str(e))
+        db.session.rollback()
+        logger.exception("Error: %s", e)
         return jsonify({"error": str(e)}), 500
     
 @holidays_bp.route("/delete_holiday/<string:holiday_date>/<string:entity_id>", methods=["DELETE"])
@@ -63,9 +111,52 @@ def delete_holiday(holiday_date, entity_id):
         # Instead of deleting, mark as obsolete
         holiday.obsolete_current = "O"
         db.session.commit()
+        holiday_calendar.invalidate()
+        response_cache.invalidate('holidays')
 
         return jsonify({"message": "Holiday deleted successfully"}), 200
 
     except Exception as e:
-        print("Error:", str(e))
-        return jsonify({"error": str(e)}), 500 
\ No newline at end of file
+        logger.exception("Error: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@holidays_bp.route("/upload_holidays", methods=["POST"])
+def upload_holidays():
+    """
+    Upsert a year calendar sent as the multipart field `file`: a .csv with
+    holiday_date, description and optional entity_id columns, or an .ics
+    whose all-day events apply to the form field `entity_id`. Rows without
+    an entity (or with ALL) become holidays of every current entity. Open
+    tasks now due on an uploaded holiday are moved to the previous business
+    day unless `readjust=false`.
+    """
+    try:
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            return jsonify({"error": "A .csv or .ics file is required"}), 400
+        readjust = request.form.get('readjust', 'true').lower() != 'false'
+
+        result = import_holidays(parse_holidays(upload.stream, upload.filename, request.form.get('entity_id')))
+        moved = 0
+        if readjust and result["holidays"]:
+            moved = readjust_due_dates(date_from=result["date_from"], date_to=result["date_to"])
+        db.session.commit()
+        holiday_calendar.invalidate()
+        response_cache.invalidate('holidays')
+        if moved:
+            response_cache.invalidate('tasks')
+
+        return jsonify({
+            "holidays": result["holidays"],
+            "tasks_moved": moved,
+            "failed": len(result["errors"]),
+            "errors": result["errors"],
+        }), 200
+
+    except HolidayUploadError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Error: %s", e)
+        return jsonify({"error": str(e)}), 500
@@ -0,0 +1,35 @@
+from flask import Blueprint, jsonify, request
+import logging
+from utils.response_cache import response_cache
+from services.bulk_import import BulkImportError, REGULATIONS, import_file
+
+imports_bp = Blueprint('imports', __name__)
+
+logger = logging.getLogger(__name__)
+
+# Row errors listed in the response; the CLI writes the full report
+ERROR_REPORT_LIMIT = 1000
+
+@imports_bp.route('/import/<string:kind>', methods=['POST'])
+def bulk_import(kind):
+    """
+    Import a CSV or XLSX file of regulations or activities, sent as the
+    multipart field `file`. `dry_run=true` validates without writing.
+    """
+    try:
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            return jsonify({"error": "A .csv or .xlsx file is required"}), 400
+        dry_run = request.form.get('dry_run', request.args.get('dry_run', 'false')).lower() == 'true'
+
+        report = import_file(kind, upload.stream, upload.filename, dry_run=dry_run)
+        if kind == REGULATIONS and report.imported and not dry_run:
+            response_cache.invalidate('regulations')
+
+        return jsonify(report.as_dict(error_limit=ERROR_REPORT_LIMIT)), 200
+
+    except BulkImportError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.exception("Error: %s", e)
+        return jsonify({"error": str(e)}), 500
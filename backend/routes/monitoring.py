@@ -0,0 +1,68 @@
+import logging
+
+from flask import Blueprint, Response, jsonify
+from models import db
+from services.db_pool import pool_metrics
+from utils.response_cache import response_cache
+from services.notification_outbox import outbox_metrics, outbox_status_counts
+from services.token_provider import token_provider
+from services.message_dispatcher import dispatch_metrics, queue_lag
+from services.message_templates import render_payload
+from services.request_metrics import request_metrics
+from services.passwords import hashing_pool
+
+monitoring_bp = Blueprint('monitoring', __name__)
+logger = logging.getLogger(__name__)
+
+@monitoring_bp.route('/metrics', methods=['GET'])
+def get_request_metrics():
+    """Per-endpoint request counts, durations, SQL statements, DB time, rows and response bytes for Prometheus."""
+    return Response(request_metrics.prometheus(), mimetype='text/plain; version=0.0.4')
+
+@monitoring_bp.route('/metrics/requests', methods=['GET'])
+def get_request_metrics_summary():
+    """The same per-endpoint request totals as JSON."""
+    return jsonify(request_metrics.snapshot()), 200
+
+@monitoring_bp.route('/metrics/pool', methods=['GET'])
+def get_pool_metrics():
+    """Connection pool checkout wait times and connection-open counts."""
+    return jsonify(pool_metrics.snapshot(db.engine)), 200
+
+@monitoring_bp.route('/metrics/cache', methods=['GET'])
+def get_cache_metrics():
+    """Response cache hit, miss, 304 and eviction counters."""
+    return jsonify(response_cache.snapshot()), 200
+
+@monitoring_bp.route('/metrics/outbox', methods=['GET'])
+def get_outbox_metrics():
+    """Notification outbox delivery counters and queue depth per status."""
+    try:
+        return jsonify(dict(outbox_metrics.snapshot(), queue=outbox_status_counts())), 200
+    except Exception as e:
+        logger.exception("Error: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@monitoring_bp.route('/metrics/token', methods=['GET'])
+def get_token_metrics():
+    """Graph token fetches, cache hits and background refreshes."""
+    return jsonify(token_provider.snapshot()), 200
+
+@monitoring_bp.route('/metrics/passwords', methods=['GET'])
+def get_password_metrics():
+    """Password hashes run on the bounded pool, rejected when it was full, and legacy passwords rehashed."""
+    return jsonify(hashing_pool.snapshot()), 200
+
+@monitoring_bp.route('/metrics/message-queue', methods=['GET'])
+def get_message_queue_metrics():
+    """Reminder dispatcher throughput, the age of the oldest due message and template render cache use."""
+    try:
+        render_cache = render_payload.cache_info()
+        return jsonify(dict(
+            dispatch_metrics.snapshot(),
+            render_cache={"hits": render_cache.hits, "misses": render_cache.misses, "entries": render_cache.currsize},
+            **queue_lag()
+        )), 200
+    except Exception as e:
+        logger.exception("Error: %s", e)
+        return jsonify({"error": str(e)}), 500
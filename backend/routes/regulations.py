@@ -1,13 +1,19 @@
 from flask import Blueprint, jsonify, request
 from models import db
-from models.models import RegulationMaster, EntityRegulation, Category,ActivityMaster
-import traceback
+from models.models import RegulationMaster, EntityRegulation, Category
+import logging
+from utils.response_cache import cached_response, response_cache
 from sqlalchemy.orm import aliased
+from services.entity_regulations import add_regulations_to_entity, retire_entity_regulations
+from services.id_sequences import next_regulation_id
 
 
 regulations_bp = Blueprint('regulations', __name__)
 
+logger = logging.getLogger(__name__)
+
 @regulations_bp.route('/regulations', methods=['GET'])
+@cached_response('regulations')
 def get_regulations():
     try:
         regulations = RegulationMaster.query.filter(RegulationMaster.obsolete_current != 'O').all()
@@ -29,14 +35,14 @@ def get_regulations():
         return jsonify({"regulations": regulations_list}), 200
 
     except Exception as e:
-        print("Error:", str(e))
+        logger.exception("Error: %s", e)
         return jsonify({"error": str(e)}), 500
     
 @regulations_bp.route('/add_regulation', methods=['POST'])
 def add_regulation():
     try:
         data = request.json
-        print("Received Data:", data)  # Debugging
+        logger.debug("Received regulation data", extra={"data": data})
 
         # Ensure required fields exist
         required_fields = ["regulation_name", "category_id"]
@@ -44,22 +50,8 @@ def add_regulation():
             if field not in data:
                 return jsonify({"error": f"Missing field: {field}"}), 400
 
-        # Extract first 4 letters of regulation name
-        regulation_prefix = data["regulation_name"][:4].upper()
-
-        # Find the highest existing regulation ID with the same prefix
-        last_regulation = RegulationMaster.query.filter(
-            RegulationMaster.regulation_id.like(f"{regulation_prefix}%")
-        ).order_by(RegulationMaster.regulation_id.desc()).first()
-
-        if last_regulation:
-            last_number = int(last_regulation.regulation_id[4:])  # Extract number part
-            new_number = last_number + 1
-        else:
-            new_number = 1
-
-        # Generate new regulation_id
-        regulation_id = f"{regulation_prefix}{new_number:03d}"  # Ensure 3-digit format
+        # Generate new regulation_id: first 4 letters of the name and the prefix's next number
+        regulation_id = next_regulation_id(data["regulation_name"])
 
         # Create a new regulation object
         new_regulation = RegulationMaster(
@@ -77,11 +69,12 @@ def add_regulation():
         # Add to the database
         db.session.add(new_regulation)
         db.session.commit()
+        response_cache.invalidate('regulations')
 
         return jsonify({"message": "Regulation added successfully", "regulation_id": regulation_id}), 201
 
     except Exception as e:
-        print("Error:", str(e))
+        logger.exception("Error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @regulations_bp.route('/edit_regulation/<string:regulation_id>', methods=['PUT'])
@@ -101,6 +94,7 @@ def edit_regulation(regulation_id):
         regulation.mandatory_optional = data["mandatory_optional"]
 
         db.session.commit()
+        response_cache.invalidate('regulations')
         return jsonify({"message": "Regulation updated successfully"}), 200
 
     except Exception as e:
@@ -132,8 +126,7 @@ def get_regulation_details(regulation_id):
         return jsonify({"regulation": regulation_data}), 200
     
     except Exception as e:
-        print("Error:", str(e))
-        print(traceback.format_exc())  # Print full traceback for debugging
+        logger.exception("Error: %s", e)
         return jsonify({"error": str(e)}), 500 
     
 
@@ -157,7 +150,9 @@ def get_entity_regulations(entity_id):
                 CategoryAlias.category_type,
                 RegulationMasterAlias.internal_external,  # Fetch internal/external
                 RegulationMasterAlias.national_international,  # Fetch national/international
-                RegulationMasterAlias.mandatory_optional  # Fetch mandatory/optional
+                RegulationMasterAlias.mandatory_optional,  # Fetch mandatory/optional
+                EntityRegulationAlias.mandatory_activities,  # Kept current as activities change
+                EntityRegulationAlias.optional_activities
             )\
             .join(EntityRegulationAlias, RegulationMasterAlias.regulation_id == EntityRegulationAlias.regulation_id)\
             .join(CategoryAlias, RegulationMasterAlias.category_id == CategoryAlias.category_id)\
@@ -166,8 +161,6 @@ def get_entity_regulations(entity_id):
                 (EntityRegulationAlias.obsolete_current != 'O') | (EntityRegulationAlias.obsolete_current.is_(None))
             )\
             .all()
-
-        print(entity_regulations)
         
         # Mapping the abbreviations to full text
         def map_values(value, mapping):
@@ -184,15 +177,18 @@ def get_entity_regulations(entity_id):
             "category_type": category_type,
             "internal_external": map_values(internal_external, internal_external_map),  # Convert abbreviation
             "national_international": map_values(national_international, national_international_map),  # Convert abbreviation
-            "mandatory_optional": map_values(mandatory_optional, mandatory_optional_map)  # Convert abbreviation
-        } for reg_id, reg_name, regulatory_body, category_type, internal_external, national_international, mandatory_optional in entity_regulations]
+            "mandatory_optional": map_values(mandatory_optional, mandatory_optional_map),  # Convert abbreviation
+            "mandatory_activities": mandatory_activities or 0,
+            "optional_activities": optional_activities or 0
+        } for reg_id, reg_name, regulatory_body, category_type, internal_external, national_international, mandatory_optional,
+              mandatory_activities, optional_activities in entity_regulations]
 
-        print(regulations_list)
+        logger.debug("Fetched %d regulations for entity %s", len(regulations_list), entity_id)
         
         return jsonify({"entity_regulations": regulations_list}), 200
         
     except Exception as e:
-        print(f"Error fetching entity regulations: {str(e)}")
+        logger.exception("Error fetching entity regulations: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @regulations_bp.route('/delete_regulation/<string:regulation_id>', methods=['DELETE'])
@@ -205,11 +201,12 @@ def delete_regulation(regulation_id):
         # Instead of deleting, mark as obsolete
         regulation.obsolete_current = "O"
         db.session.commit()
+        response_cache.invalidate('regulations')
 
         return jsonify({"message": "Regulation deleted successfully"}), 200
 
     except Exception as e:
-        print("Error:", str(e))
+        logger.exception("Error: %s", e)
         return jsonify({"error": str(e)}), 500
     
 @regulations_bp.route('/add_entity_regulations', methods=['POST', 'OPTIONS'])
@@ -241,51 +238,21 @@ def add_entity_regulations():
         regulations_to_add = [reg_id for reg_id in regulation_ids if reg_id not in existing_regulation_ids]
         regulations_to_remove = [reg_id for reg_id in existing_regulation_ids if reg_id not in regulation_ids]
         
-        # Add new regulations
-        for regulation_id in regulations_to_add:
-            # Count mandatory and optional activities
-            mandatory_count = ActivityMaster.query.filter(
-                ActivityMaster.regulation_id == regulation_id,
-                ActivityMaster.mandatory_optional == "M",
-                (ActivityMaster.obsolete_current != "O") | (ActivityMaster.obsolete_current.is_(None))
-            ).count()
-            
-            optional_count = ActivityMaster.query.filter(
-                ActivityMaster.regulation_id == regulation_id,
-                ActivityMaster.mandatory_optional == "O",
-                (ActivityMaster.obsolete_current != "O") | (ActivityMaster.obsolete_current.is_(None))
-            ).count()
-            
-            # Create new entity regulation
-            new_entity_regulation = EntityRegulation(
-                entity_id=entity_id,
-                regulation_id=regulation_id,
-                mandatory_activities=mandatory_count,
-                optional_activities=optional_count,
-                obsolete_current=None
-            )
-            db.session.add(new_entity_regulation)
-        
+        # Add new regulations, counting their activities in one grouped query
+        added = add_regulations_to_entity(entity_id, regulations_to_add)
+
         # Mark removed regulations as obsolete
-        for regulation_id in regulations_to_remove:
-            entity_regulation = EntityRegulation.query.filter_by(
-                entity_id=entity_id,
-                regulation_id=regulation_id
-            ).first()
-            
-            if entity_regulation:
-                entity_regulation.obsolete_current = 'O'
+        retire_entity_regulations(entity_id, regulations_to_remove)
         
         db.session.commit()
         
         return jsonify({
             "message": "Entity regulations updated successfully",
-            "added": len(regulations_to_add),
+            "added": len(added),
             "removed": len(regulations_to_remove)
         }), 200
         
     except Exception as e:
         db.session.rollback()
-        print("Error:", str(e))
-        print(traceback.format_exc())
+        logger.exception("Error: %s", e)
         return jsonify({"error": str(e)}), 500
\ No newline at end of file
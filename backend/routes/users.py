@@ -2,6 +2,7 @@ from flask import Blueprint, jsonify, request
 from models import db
 from models.models import Users, EntityMaster,CountryCodes
 from sqlalchemy import or_
+from services.passwords import HashingBusy, hash_password
 import traceback
 
 users_bp = Blueprint('users', __name__)
@@ -45,7 +46,6 @@ def get_users():
 def add_user():
     try:
         data = request.json
-        print("Received Data:", data)  # Debugging
 
         # Ensure all required fields exist, including user_id
         required_fields = ["user_id", "entity_id", "user_name", "mobile_no", "email_id", "password", "role"]
@@ -59,6 +59,9 @@ def add_user():
         if existing_user:
             return jsonify({"error": "User ID already exists"}), 409  # Conflict error
 
+        # Store the password hashed, never as typed
+        data["password"], data["password_scheme"] = hash_password(data["password"])
+
         # Create a new user object
         new_user = Users(**data)
 
@@ -68,6 +71,8 @@ def add_user():
 
         return jsonify({"message": "User added successfully"}), 201
 
+    except HashingBusy:
+        return jsonify({"error": "Password hashing is busy, please retry shortly"}), 503
     except Exception as e:
         print("Error:", traceback.format_exc())  # Debugging
         return jsonify({"error": str(e)}), 500
@@ -80,6 +85,11 @@ def update_user(user_id):
             return jsonify({"error": "User not found"}), 404
 
         data = request.json
+        data.pop("password_scheme", None)
+        if data.get("password"):
+            data["password"], data["password_scheme"] = hash_password(data["password"])
+        else:
+            data.pop("password", None)
 
         # Update only provided fields
         for key, value in data.items():
@@ -88,6 +98,8 @@ def update_user(user_id):
         db.session.commit()
         return jsonify({"message": "User updated successfully"}), 200
 
+    except HashingBusy:
+        return jsonify({"error": "Password hashing is busy, please retry shortly"}), 503
     except Exception as e:
         print("Error:", traceback.format_exc())
         return jsonify({"error": str(e)}), 500
@@ -0,0 +1,400 @@
+import csv
+import io
+import logging
+import time
+from collections import defaultdict
+from datetime import date, datetime
+from itertools import islice
+
+from sqlalchemy import Date, Integer, String, insert, or_, select
+
+from config import Config
+from models import db
+from models.models import ActivityMaster, Category, RegulationMaster
+from services.entity_regulations import apply_activity_deltas, counter_deltas
+from services.id_sequences import activity_ids_for, regulation_ids_for
+
+logger = logging.getLogger(__name__)
+
+REGULATIONS = 'regulations'
+ACTIVITIES = 'activities'
+
+_MANDATORY_OPTIONAL = {"M": "Mandatory", "O": "Optional"}
+
+# Importable columns of each kind: defaults (as /add_regulation and
+# /add_activity apply them) and allowed codes with the labels also accepted.
+# Types, lengths and NOT NULL come from the model columns.
+REGULATION_FIELDS = {
+    "regulation_name": {},
+    "category_id": {},
+    "regulatory_body": {},
+    "internal_external": {"default": "I", "choices": {"I": "Internal", "E": "External"}},
+    "national_international": {"default": "N", "choices": {"N": "National", "I": "International"}},
+    "mandatory_optional": {"default": "M", "choices": _MANDATORY_OPTIONAL},
+    "effective_from": {},
+}
+
+ACTIVITY_FIELDS = {
+    "activity": {"default": "Unnamed Activity"},
+    "activity_description": {"default": "No Description"},
+    "mandatory_optional": {"default": "M", "choices": _MANDATORY_OPTIONAL},
+    "documentupload_yes_no": {"default": "N"},
+    "frequency": {"default": 12},
+    "frequency_timeline": {},
+    "criticality": {"default": "Medium"},
+    "ews": {"default": 1},
+    "approver_required": {"choices": {"Y": "Yes", "N": "No"}},
+    "reviewer_required": {"choices": {"Y": "Yes", "N": "No"}},
+}
+
+# Activities name their regulation by ID or by its exact name (handy right
+# after importing the regulations themselves)
+ACTIVITY_REFERENCES = ("regulation_id", "regulation_name")
+
+KINDS = {
+    REGULATIONS: (RegulationMaster, REGULATION_FIELDS, ("regulation_name", "category_id")),
+    ACTIVITIES: (ActivityMaster, ACTIVITY_FIELDS, ()),
+}
+
+
+class BulkImportError(Exception):
+    """The file as a whole cannot be imported (format, headers)."""
+
+
+class ImportReport:
+    """Outcome of one import: counts, per-row errors, created IDs and throughput."""
+
+    def __init__(self, kind, dry_run=False):
+        self.kind = kind
+        self.dry_run = dry_run
+        self.rows = 0
+        self.imported = 0
+        self.chunks = 0
+        self.errors = []  # (row number, message)
+        self.created = []  # (row number, regulation_id), regulation imports only
+        self.ignored_columns = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def error(self, row, message):
+        self.errors.append((row, message))
+
+    @property
+    def failed(self):
+        return len({row for row, _ in self.errors})
+
+    @property
+    def rows_per_second(self):
+        return round(self.rows / self.elapsed, 1) if self.elapsed else 0.0
+
+    def as_dict(self, error_limit=None):
+        errors = self.errors if error_limit is None else self.errors[:error_limit]
+        return {
+            "kind": self.kind,
+            "dry_run": self.dry_run,
+            "rows": self.rows,
+            "imported": self.imported,
+            "failed": self.failed,
+            "chunks": self.chunks,
+            "elapsed_seconds": round(self.elapsed, 3),
+            "rows_per_second": self.rows_per_second,
+            "ignored_columns": self.ignored_columns,
+            "errors": [{"row": row, "error": message} for row, message in errors],
+            "errors_truncated": len(errors) < len(self.errors),
+            "created": [{"row": row, "regulation_id": regulation_id} for row, regulation_id in self.created],
+        }
+
+
+# ------------------------------------------------------------ readers --
+
+def _header(value):
+    return str(value or '').strip().lower().replace(' ', '_')
+
+
+def read_csv(stream):
+    """Header names and an iterator of row tuples of a CSV byte stream, read as it goes."""
+    reader = csv.reader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    try:
+        headers = next(reader)
+    except StopIteration:
+        raise BulkImportError("The file is empty")
+    return [_header(name) for name in headers], reader
+
+
+def read_xlsx(stream):
+    """Header names and an iterator of row tuples of the first sheet of an XLSX file."""
+    try:
+        import openpyxl
+    except ImportError:
+        raise BulkImportError("XLSX import requires the openpyxl package")
+    try:
+        # Read-only mode parses the sheet row by row instead of loading it
+        workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    except Exception as e:
+        raise BulkImportError(f"Not a readable XLSX file: {e}")
+    rows = workbook.worksheets[0].iter_rows(values_only=True)
+    try:
+        headers = next(rows)
+    except StopIteration:
+        raise BulkImportError("The sheet is empty")
+    return [_header(name) for name in headers], rows
+
+
+def open_rows(stream, filename):
+    """Pick the reader from the file extension (.csv or .xlsx)."""
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension == 'csv':
+        return read_csv(stream)
+    if extension == 'xlsx':
+        return read_xlsx(stream)
+    raise BulkImportError("Only .csv and .xlsx files can be imported")
+
+
+# --------------------------------------------------------- validation --
+
+def _coerce(column, value):
+    # Cell value -> value of the column's type; raises ValueError with the reason
+    if isinstance(value, str):
+        value = value.strip()
+    if value is None or value == '':
+        return None
+    if isinstance(column.type, Integer):
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        try:
+            return int(str(value))
+        except ValueError:
+            raise ValueError("must be a whole number")
+    if isinstance(column.type, Date):
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        try:
+            return date.fromisoformat(str(value))
+        except ValueError:
+            raise ValueError("must be a date (YYYY-MM-DD)")
+    value = str(value)
+    if isinstance(column.type, String) and column.type.length and len(value) > column.type.length:
+        raise ValueError(f"is longer than {column.type.length} characters")
+    return value
+
+
+def validate_row(model, fields, values):
+    """
+    Check one row's values against the model's column constraints.
+
+    Args:
+        model: RegulationMaster or ActivityMaster
+        fields: REGULATION_FIELDS or ACTIVITY_FIELDS
+        values: Dict of column name -> cell value
+
+    Returns:
+        (column values with defaults applied, list of error messages)
+    """
+    row, errors = {}, []
+    for name, spec in fields.items():
+        column = model.__table__.c[name]
+        value = values.get(name)
+        choices = spec.get("choices")
+        if choices and value not in (None, ''):
+            # Codes or their labels ("E" or "External"), any case
+            code = str(value).strip().upper()
+            code = {label.upper(): key for key, label in choices.items()}.get(code, code)
+            if code not in choices:
+                errors.append(f"{name} must be one of {', '.join(choices)}")
+                continue
+            value = code
+        try:
+            value = _coerce(column, value)
+        except ValueError as e:
+            errors.append(f"{name} {e}")
+            continue
+        if value is None:
+            value = spec.get("default")
+        if value is None and not column.nullable:
+            errors.append(f"{name} is required")
+            continue
+        row[name] = value
+    return row, errors
+
+
+# ------------------------------------------------------------ import --
+
+def import_rows(kind, headers, rows, dry_run=False, chunk_size=None):
+    """
+    Validate and insert regulation or activity rows chunk by chunk.
+
+    Each chunk is one transaction: the rows that pass validation get their
+    IDs reserved in bulk (one reservation per regulation prefix, or per
+    regulation for activities) and are written with one executemany insert;
+    invalid rows are skipped and reported. A chunk that fails to insert is
+    rolled back and all of its rows are reported as failed.
+
+    Args:
+        kind: REGULATIONS or ACTIVITIES
+        headers: Column names of the file (normalised)
+        rows: Iterator of row tuples
+        dry_run: Validate only
+        chunk_size: Rows per transaction (IMPORT_CHUNK_SIZE by default)
+
+    Returns:
+        ImportReport
+    """
+    model, fields, required_headers = KINDS[kind]
+    report = ImportReport(kind, dry_run)
+    known = set(fields) | (set(ACTIVITY_REFERENCES) if kind == ACTIVITIES else set())
+    report.ignored_columns = [name for name in headers if name and name not in known]
+
+    missing = [name for name in required_headers if name not in headers]
+    if kind == ACTIVITIES and not set(ACTIVITY_REFERENCES) & set(headers):
+        missing.append("regulation_id or regulation_name")
+    if missing:
+        raise BulkImportError(f"Missing columns: {', '.join(missing)}")
+
+    chunk_size = chunk_size or Config.IMPORT_CHUNK_SIZE
+    categories = set(db.session.execute(select(Category.category_id)).scalars()) if kind == REGULATIONS else None
+    numbered = enumerate(rows, start=2)  # spreadsheet row numbers, the header is row 1
+    while True:
+        raw = list(islice(numbered, chunk_size))
+        if not raw:
+            break
+        chunk = [(number, dict(zip(headers, values))) for number, values in raw
+                 if any(value not in (None, '') for value in values)]
+        if not chunk:
+            continue
+        report.rows += len(chunk)
+        report.chunks += 1
+        if kind == REGULATIONS:
+            _import_regulations(chunk, categories, report)
+        else:
+            _import_activities(chunk, report)
+
+    report.elapsed = time.perf_counter() - report.started
+    logger.info("Imported %s %s of %s rows", report.imported, kind, report.rows, extra={
+        "event": "bulk_import", "kind": kind, "dry_run": dry_run, "rows": report.rows,
+        "imported": report.imported, "failed": report.failed, "rows_per_second": report.rows_per_second,
+    })
+    return report
+
+
+def import_file(kind, stream, filename, dry_run=False, chunk_size=None):
+    """
+    Import a CSV or XLSX file of regulations or activities (see import_rows()).
+
+    Args:
+        kind: REGULATIONS or ACTIVITIES
+        stream: Binary file object, read as the import goes
+        filename: Name of the file, its extension picks the format
+
+    Raises:
+        BulkImportError: Unknown kind, unsupported or unreadable file, missing columns
+    """
+    if kind not in KINDS:
+        raise BulkImportError(f"Unknown import kind {kind!r}, expected {' or '.join(KINDS)}")
+    headers, rows = open_rows(stream, filename)
+    return import_rows(kind, headers, rows, dry_run=dry_run, chunk_size=chunk_size)
+
+
+def _validated(chunk, model, fields, report):
+    valid = []
+    for number, values in chunk:
+        row, errors = validate_row(model, fields, values)
+        for message in errors:
+            report.error(number, message)
+        if not errors:
+            valid.append((number, row))
+    return valid
+
+
+def _write_chunk(statement, rows, numbers, report, before_commit=None):
+    # One transaction per chunk; a failed insert fails every row of the chunk
+    if report.dry_run:
+        report.imported += len(rows)
+        return True
+    try:
+        db.session.execute(statement, rows)
+        if before_commit:
+            before_commit()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.exception("Import chunk failed: %s", e)
+        for number in numbers:
+            report.error(number, f"not imported, the chunk failed: {e}")
+        return False
+    report.imported += len(rows)
+    return True
+
+
+def _import_regulations(chunk, categories, report):
+    valid = []
+    for number, row in _validated(chunk, RegulationMaster, REGULATION_FIELDS, report):
+        if row["category_id"] not in categories:
+            report.error(number, f"category_id {row['category_id']} does not exist")
+        else:
+            valid.append((number, row))
+    if not valid:
+        return
+
+    ids = regulation_ids_for([row["regulation_name"] for _, row in valid]) if not report.dry_run else [None] * len(valid)
+    rows = [dict(row, regulation_id=regulation_id, obsolete_current="C") for (_, row), regulation_id in zip(valid, ids)]
+    numbers = [number for number, _ in valid]
+    if _write_chunk(insert(RegulationMaster), rows, numbers, report) and not report.dry_run:
+        report.created.extend(zip(numbers, ids))
+
+
+def _resolve_regulations(chunk):
+    # regulation_id / regulation_name of the chunk's rows -> current regulation_id, one query
+    ids = {str(values.get("regulation_id") or '').strip() for _, values in chunk} - {''}
+    names = {str(values.get("regulation_name") or '').strip() for _, values in chunk} - {''}
+    found = db.session.execute(
+        select(RegulationMaster.regulation_id, RegulationMaster.regulation_name)
+        .where(or_(RegulationMaster.regulation_id.in_(ids), RegulationMaster.regulation_name.in_(names)))
+        .where(or_(RegulationMaster.obsolete_current != 'O', RegulationMaster.obsolete_current.is_(None)))
+    ).all()
+    by_name = defaultdict(list)
+    for regulation_id, regulation_name in found:
+        by_name[regulation_name].append(regulation_id)
+    return {regulation_id for regulation_id, _ in found}, by_name
+
+
+def _import_activities(chunk, report):
+    existing_ids, by_name = _resolve_regulations(chunk)
+    cells = dict(chunk)
+    by_regulation = defaultdict(list)
+    for number, row in _validated(chunk, ActivityMaster, ACTIVITY_FIELDS, report):
+        regulation_id = str(cells[number].get("regulation_id") or '').strip()
+        regulation_name = str(cells[number].get("regulation_name") or '').strip()
+        if regulation_id:
+            if regulation_id not in existing_ids:
+                report.error(number, f"regulation_id {regulation_id} does not exist")
+                continue
+        elif regulation_name:
+            matches = by_name.get(regulation_name, [])
+            if len(matches) != 1:
+                report.error(number, f"regulation_name {regulation_name!r} matches {len(matches)} regulations, "
+                                     "give the regulation_id")
+                continue
+            regulation_id = matches[0]
+        else:
+            report.error(number, "regulation_id or regulation_name is required")
+            continue
+        by_regulation[regulation_id].append((number, row))
+    if not by_regulation:
+        return
+
+    rows, numbers, deltas = [], [], {}
+    for regulation_id, entries in by_regulation.items():
+        ids = activity_ids_for(regulation_id, len(entries)) if not report.dry_run else [None] * len(entries)
+        mandatory = optional = 0
+        for (number, row), activity_id in zip(entries, ids):
+            rows.append(dict(row, regulation_id=regulation_id, activity_id=activity_id, obsolete_current="C"))
+            numbers.append(number)
+            row_mandatory, row_optional = counter_deltas((row["mandatory_optional"], "C"))
+            mandatory += row_mandatory
+            optional += row_optional
+        deltas[regulation_id] = (mandatory, optional)
+
+    # Entity counters move in the same transaction as the chunk's activities
+    _write_chunk(insert(ActivityMaster), rows, numbers, report, before_commit=lambda: apply_activity_deltas(deltas))
@@ -0,0 +1,501 @@
+import calendar
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import requests
+from flask import current_app
+from markupsafe import escape
+from sqlalchemy import and_, delete, select, update
+from sqlalchemy.orm import aliased
+from models import db
+from models.models import ActivityMaster, CalendarEventLink, EntityRegulationTasks, MessageQueue, RegulationMaster, Users
+from services.token_provider import token_provider
+from utils.recurrence import FREQUENCY_STEPS
+
+logger = logging.getLogger(__name__)
+
+# Graph accepts at most 20 requests in one JSON $batch call
+GRAPH_BATCH_LIMIT = 20
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+
+def link_key(*parts):
+    """Stable key of what an event covers, also sent to Graph as the event's transactionId."""
+    return hashlib.sha256('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def recurrence_pattern(frequency, anchor, start, end):
+    """
+    Graph recurrence for an activity frequency, from the first to the last due date.
+
+    The weekday or day of month comes from the anchor, the activity's own
+    schedule date, not from a due date that may have been moved off a
+    weekend or holiday.
+
+    Returns:
+        The patternedRecurrence dict, or None for one-time and unknown frequencies
+    """
+    step = FREQUENCY_STEPS.get(frequency)
+    if step is None:
+        return None
+    unit, size = step
+    if unit == 'W':
+        pattern = {"type": "weekly", "interval": size, "daysOfWeek": [WEEKDAYS[anchor.weekday()]],
+                   "firstDayOfWeek": "monday"}
+    else:
+        pattern = {"type": "absoluteMonthly", "interval": size, "dayOfMonth": anchor.day}
+    return {
+        "pattern": pattern,
+        "range": {"type": "endDate", "startDate": start.isoformat(), "endDate": end.isoformat()},
+    }
+
+
+def recurrence_dates(recurrence):
+    """
+    Dates Outlook shows for a recurrence_pattern() series.
+
+    Months without the dayOfMonth are skipped, so a series only matches
+    tasks whose dates Outlook cannot place differently.
+    """
+    pattern, span = recurrence['pattern'], recurrence['range']
+    start, end = date.fromisoformat(span['startDate']), date.fromisoformat(span['endDate'])
+    interval = pattern['interval']
+    dates = []
+    if pattern['type'] == 'weekly':
+        day = start + timedelta(days=(WEEKDAYS.index(pattern['daysOfWeek'][0]) - start.weekday()) % 7)
+        while day <= end:
+            dates.append(day)
+            day += timedelta(weeks=interval)
+        return dates
+
+    month = start.year * 12 + start.month - 1
+    while True:
+        year, index = divmod(month, 12)
+        if date(year, index + 1, 1) > end:
+            return dates
+        if pattern['dayOfMonth'] <= calendar.monthrange(year, index + 1)[1]:
+            day = date(year, index + 1, pattern['dayOfMonth'])
+            if start <= day <= end:
+                dates.append(day)
+        month += interval
+
+
+def _event(subject, day, attendees, description, transaction_id=None, recurrence=None):
+    event = {
+        "subject": subject,
+        "start": {
+            "dateTime": day.strftime('%Y-%m-%dT09:00:00'),
+            "timeZone": "UTC"
+        },
+        "end": {
+            "dateTime": day.strftime('%Y-%m-%dT10:00:00'),
+            "timeZone": "UTC"
+        },
+        "attendees": [
+            {
+                "emailAddress": {
+                    "address": email
+                },
+                "type": "required"
+            } for email in attendees
+        ],
+        "body": {
+            "contentType": "HTML",
+            "content": description
+        }
+    }
+    if transaction_id:
+        event["transactionId"] = transaction_id
+    if recurrence:
+        event["recurrence"] = recurrence
+    return event
+
+
+def _valid_email(email):
+    return bool(email) and '@' in email
+
+
+class CalendarSync:
+    """
+    Puts pending reminders and assigned tasks on the users' Outlook calendars.
+
+    Work is coalesced before anything is sent:
+
+    - due message_queue reminders become one event per attendee and day,
+      however many reminders fall on that day
+    - open tasks of a recurring activity assigned to the same preparer and
+      reviewer become one recurring event (pattern derived from the
+      activity frequency and schedule date) instead of one event per due
+      date, as long as no due date was moved off the pattern; otherwise,
+      and for one-time activities, each task gets its own event
+
+    The resulting creates, updates and deletes go out as Graph JSON $batch
+    calls of up to 20 requests on a bounded pool. Every created event is
+    recorded in calendar_event_link under a key of what it covers, so a
+    re-run skips it; the key is also the event's transactionId, which lets
+    Graph drop a duplicate create if a run dies between the call and the
+    commit. An assignment's event is updated in place when its series is
+    extended, shrinks to one task or turns back into a series.
+    """
+
+    def __init__(self, app, token_source=None):
+        config = app.config
+        self.app = app
+        self.base_url = config.get('GRAPH_API_BASE_URL', 'https://graph.microsoft.com/v1.0').rstrip('/')
+        self.timeout = config.get('GRAPH_REQUEST_TIMEOUT', 10)
+        self.concurrency = config.get('CALENDAR_SYNC_CONCURRENCY', 4)
+        self._token_source = token_source or token_provider.get_token
+        self._local = threading.local()
+
+    def _http(self):
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    # ------------------------------------------------------------ planning --
+
+    def plan_reminders(self, today):
+        """
+        Claim the reminders not yet on a calendar and coalesce them per attendee and day.
+
+        Rows are locked with FOR UPDATE SKIP LOCKED until the run commits, so
+        concurrent runs coalesce disjoint sets of reminders.
+        """
+        rows = db.session.execute(
+            select(MessageQueue.s_no, MessageQueue.message_des, MessageQueue.email_id, MessageQueue.date)
+            .where(MessageQueue.status == 'Scheduled', MessageQueue.date >= today)
+            .order_by(MessageQueue.email_id, MessageQueue.date, MessageQueue.s_no)
+            .with_for_update(skip_locked=True)
+        ).all()
+
+        groups = defaultdict(list)
+        for row in rows:
+            if not _valid_email(row.email_id):
+                logger.error("Invalid or empty email address for message %s: %s", row.s_no, row.email_id)
+                continue
+            groups[(row.email_id, row.date)].append(row)
+
+        operations = []
+        for (email, day), reminders in groups.items():
+            titles = [reminder.message_des for reminder in reminders]
+            if len(titles) == 1:
+                subject = titles[0]
+                description = escape(titles[0])
+            else:
+                subject = f"RCMS reminders: {len(titles)} activities due"
+                description = "<ul>" + "".join(f"<li>{escape(title)}</li>" for title in titles) + "</ul>"
+            key = link_key('reminders', email, day, *(reminder.s_no for reminder in reminders))
+            operations.append({
+                "key": key,
+                "kind": "reminders",
+                "mailbox": email,
+                "message_ids": [reminder.s_no for reminder in reminders],
+                "event": _event(subject[:255], day, [email], str(description), transaction_id=key),
+            })
+        return operations
+
+    def plan_tasks(self, today):
+        """
+        Coalesce open tasks into one event per assignment, recurring where Outlook can show every due date.
+
+        Each assignment (entity, activity, preparer, reviewer) owns one event
+        keyed on the assignment alone, so it is updated in place whether it
+        covers a series or a single task. The series is used only if its
+        pattern, built from the activity's schedule date, gives exactly the
+        open due dates; once a due date was moved off a weekend or holiday
+        the assignment event covers the first task only and the others get
+        an event each.
+        """
+        ert = EntityRegulationTasks
+        preparer = aliased(Users)
+        reviewer = aliased(Users)
+        rows = db.session.execute(
+            select(
+                ert.entity_id, ert.regulation_id, ert.activity_id, ert.due_on,
+                ert.preparation_responsibility, ert.review_responsibility,
+                ActivityMaster.activity, ActivityMaster.frequency, ActivityMaster.frequency_timeline,
+                RegulationMaster.regulation_name,
+                preparer.email_id.label('preparer_email'), reviewer.email_id.label('reviewer_email'),
+            )
+            .join(ActivityMaster, and_(ActivityMaster.regulation_id == ert.regulation_id,
+                                       ActivityMaster.activity_id == ert.activity_id))
+            .join(RegulationMaster, RegulationMaster.regulation_id == ert.regulation_id)
+            .outerjoin(preparer, preparer.user_id == ert.preparation_responsibility)
+            .outerjoin(reviewer, reviewer.user_id == ert.review_responsibility)
+            .where(ert.status == 'Yet to Start', ert.due_on >= today)
+            .order_by(ert.due_on)
+        ).all()
+
+        series = defaultdict(list)
+        for row in rows:
+            if not _valid_email(row.preparer_email):
+                continue
+            series[(row.entity_id, row.regulation_id, row.activity_id,
+                    row.preparation_responsibility, row.review_responsibility)].append(row)
+
+        operations = []
+        for assignment, tasks in series.items():
+            first = tasks[0]
+            attendees = [email for email in (first.preparer_email, first.reviewer_email) if _valid_email(email)]
+            subject = (first.activity or f"Activity {assignment[2]}")[:255]
+            due_dates = sorted({task.due_on for task in tasks})
+            start, end = due_dates[0], due_dates[-1]
+
+            recurrence = None
+            if len(due_dates) > 1:
+                recurrence = recurrence_pattern(first.frequency, first.frequency_timeline or start, start, end)
+                if recurrence and recurrence_dates(recurrence) != due_dates:
+                    recurrence = None
+            covered = due_dates if recurrence else due_dates[:1]
+
+            if recurrence:
+                description = (f"Recurring task {escape(subject)} ({escape(first.regulation_name)}), "
+                               f"due {start.strftime('%Y-%m-%d')} to {end.strftime('%Y-%m-%d')}")
+            else:
+                description = f"Task {escape(subject)} is due on {start.strftime('%Y-%m-%d')}"
+            assignment_key = link_key('series', *assignment)
+            operations.append({
+                "key": assignment_key,
+                "kind": "series",
+                "assignment_key": assignment_key,
+                "mailbox": first.preparer_email,
+                "series_start": start,
+                "series_end": covered[-1],
+                # Per-date events of links made before assignment_key was recorded
+                "retire": [link_key('task', *assignment, day) for day in covered],
+                "event": _event(subject, start, attendees, description, transaction_id=assignment_key,
+                                recurrence=recurrence),
+            })
+
+            for due_on in due_dates[len(covered):]:
+                key = link_key('task', *assignment, due_on)
+                description = f"Task {escape(subject)} is due on {due_on.strftime('%Y-%m-%d')}"
+                operations.append({
+                    "key": key,
+                    "kind": "task",
+                    "assignment_key": assignment_key,
+                    "mailbox": first.preparer_email,
+                    "series_start": due_on,
+                    "series_end": due_on,
+                    "event": _event(subject, due_on, attendees, description, transaction_id=key),
+                })
+        return operations
+
+    @staticmethod
+    def _moved(operation, link):
+        # Whether an assignment event no longer covers what its link says it does
+        single = 'recurrence' not in operation['event']
+        was_single = link.series_start is not None and link.series_start == link.series_end
+        return (operation['series_end'] != link.series_end
+                or (single and operation['series_start'] != link.series_start)
+                or single != was_single)
+
+    def resolve(self, operations, today):
+        """
+        Drop operations whose event already exists, turn moved assignment
+        events into updates and delete the per-task events of planned
+        assignments that no longer match an open due date from today on.
+
+        Reminder operations that are already linked only need their rows marked.
+        """
+        links = {}
+        keys = [operation['key'] for operation in operations]
+        keys += [key for operation in operations for key in operation.get('retire', ())]
+        for start in range(0, len(keys), 500):
+            for link in db.session.execute(
+                select(CalendarEventLink).where(CalendarEventLink.link_key.in_(keys[start:start + 500]))
+            ).scalars():
+                links[link.link_key] = link
+
+        planned = {operation['key'] for operation in operations}
+        stale = {key: links[key] for operation in operations for key in operation.get('retire', ()) if key in links}
+        assignments = [operation['key'] for operation in operations if operation['kind'] == 'series']
+        for start in range(0, len(assignments), 500):
+            for link in db.session.execute(
+                select(CalendarEventLink).where(CalendarEventLink.assignment_key.in_(assignments[start:start + 500]),
+                                                CalendarEventLink.kind == 'task',
+                                                CalendarEventLink.series_start >= today)
+            ).scalars():
+                if link.link_key not in planned:
+                    stale[link.link_key] = link
+
+        pending = [{"key": key, "kind": "task", "mailbox": link.mailbox, "event": None, "method": 'DELETE',
+                    "url": f"/users/{link.mailbox}/events/{link.event_id}"} for key, link in stale.items()]
+        linked_messages = []
+        for operation in operations:
+            link = links.get(operation['key'])
+            if link is None:
+                operation['method'] = 'POST'
+                operation['url'] = f"/users/{operation['mailbox']}/events"
+                pending.append(operation)
+            elif operation['kind'] == 'reminders':
+                linked_messages.extend(operation['message_ids'])
+            elif operation['kind'] == 'series' and self._moved(operation, link):
+                operation['method'] = 'PATCH'
+                operation['url'] = f"/users/{link.mailbox}/events/{link.event_id}"
+                event = operation['event']
+                operation['event'] = {"start": event['start'], "end": event['end'], "body": event['body'],
+                                      "recurrence": event.get('recurrence')}
+                pending.append(operation)
+        return pending, linked_messages
+
+    # ------------------------------------------------------------- sending --
+
+    def send_batch(self, operations, access_token):
+        """
+        Send up to 20 event creates, updates and deletes in one Graph $batch call.
+
+        Returns:
+            Dict of operation key to ('done', event_id), ('failed', None) or ('retry', None)
+        """
+        outcomes = {operation['key']: ('retry', None) for operation in operations}
+        if not access_token:
+            return outcomes
+
+        by_id = {str(index): operation for index, operation in enumerate(operations)}
+        sub_requests = []
+        for request_id, operation in by_id.items():
+            sub_request = {"id": request_id, "method": operation['method'], "url": operation['url'],
+                           "headers": {"client-request-id": operation['key']}}
+            if operation['event'] is not None:
+                sub_request['headers']['Content-Type'] = 'application/json'
+                sub_request['body'] = operation['event']
+            sub_requests.append(sub_request)
+
+        try:
+            response = self._http().post(
+                f"{self.base_url}/$batch",
+                data=json.dumps({"requests": sub_requests}),
+                headers={'Authorization': f'Bearer {access_token}', 'Content-Type': 'application/json'},
+                timeout=self.timeout,
+            )
+        except requests.RequestException as e:
+            logger.error("Error sending calendar batch: %s", e)
+            return outcomes
+
+        if response.status_code != 200:
+            logger.error("Error sending calendar batch: %s, %s", response.status_code, response.text[:200])
+            return outcomes
+
+        try:
+            items = response.json().get('responses', [])
+        except (ValueError, AttributeError):
+            # e.g. an HTML error page from a proxy: retry the whole batch later
+            logger.error("Error sending calendar batch: unreadable reply, %s", response.text[:200])
+            return outcomes
+
+        for item in items:
+            operation = by_id.get(str(item.get('id')))
+            if operation is None:
+                continue
+            status = int(item.get('status', 0))
+            if status in (200, 201, 204) or (status == 404 and operation['method'] == 'DELETE'):
+                # A 404 on delete means the event is already gone
+                outcomes[operation['key']] = ('done', (item.get('body') or {}).get('id'))
+            elif status not in RETRYABLE_STATUS_CODES:
+                logger.error("Error creating calendar event for %s: %s, %s", operation['mailbox'], status, item.get('body'))
+                outcomes[operation['key']] = ('failed', None)
+        return outcomes
+
+    def record(self, operations, outcomes, linked_messages):
+        """Store the new links, move updated ones, drop deleted ones and mark the reminders that are on a calendar."""
+        now = datetime.now()
+        message_ids = list(linked_messages)
+        for operation in operations:
+            result, event_id = outcomes.get(operation['key'], ('retry', None))
+            if result != 'done':
+                continue
+            if operation['method'] == 'DELETE':
+                db.session.execute(delete(CalendarEventLink).where(CalendarEventLink.link_key == operation['key']))
+            elif operation['method'] == 'PATCH':
+                db.session.execute(
+                    update(CalendarEventLink)
+                    .where(CalendarEventLink.link_key == operation['key'])
+                    .values(assignment_key=operation['assignment_key'], series_start=operation['series_start'],
+                            series_end=operation['series_end'], updated_at=now)
+                )
+            else:
+                db.session.merge(CalendarEventLink(
+                    link_key=operation['key'],
+                    kind=operation['kind'],
+                    assignment_key=operation.get('assignment_key'),
+                    mailbox=operation['mailbox'],
+                    event_id=event_id or '',
+                    series_start=operation.get('series_start'),
+                    series_end=operation.get('series_end'),
+                    created_at=now,
+                ))
+            message_ids.extend(operation.get('message_ids', ()))
+
+        for start in range(0, len(message_ids), 500):
+            db.session.execute(
+                update(MessageQueue)
+                .where(MessageQueue.s_no.in_(message_ids[start:start + 500]))
+                .values(status='Added to Calendar'),
+                execution_options={"synchronize_session": False},
+            )
+
+    def run(self, today=None):
+        """
+        Plan, send and record one calendar sync.
+
+        Returns:
+            Run statistics: source rows, Graph requests and $batch calls made,
+            events created, updated and deleted, failures and elapsed time
+        """
+        started = time.perf_counter()
+        today = today or date.today()
+        with self.app.app_context():
+            try:
+                reminders = self.plan_reminders(today)
+                tasks = self.plan_tasks(today)
+                pending, linked_messages = self.resolve(reminders + tasks, today)
+
+                outcomes = {}
+                if pending:
+                    access_token = self._token_source()
+                    batches = [pending[i:i + GRAPH_BATCH_LIMIT] for i in range(0, len(pending), GRAPH_BATCH_LIMIT)]
+                    with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='calendar-sync') as pool:
+                        for batch_outcomes in pool.map(lambda batch: self.send_batch(batch, access_token), batches):
+                            outcomes.update(batch_outcomes)
+
+                self.record(pending, outcomes, linked_messages)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+        results = defaultdict(int)
+        for operation in pending:
+            result, _ = outcomes.get(operation['key'], ('retry', None))
+            if result == 'done':
+                results[{'PATCH': 'updated', 'DELETE': 'deleted'}.get(operation['method'], 'created')] += 1
+            else:
+                results[result] += 1
+        return {
+            "reminders": sum(len(operation['message_ids']) for operation in reminders),
+            "reminder_events": len(reminders),
+            "task_events": len(tasks),
+            "requests": len(pending),
+            "batches": -(-len(pending) // GRAPH_BATCH_LIMIT),
+            "created": results['created'],
+            "updated": results['updated'],
+            "deleted": results['deleted'],
+            "failed": results['failed'],
+            "deferred": results['retry'],
+            "elapsed_seconds": round(time.perf_counter() - started, 3),
+        }
+
+
+def sync_calendars(app=None, token_source=None, today=None):
+    """Run one calendar sync for the app and return its statistics."""
+    return CalendarSync(app or current_app._get_current_object(), token_source).run(today)
@@ -0,0 +1,333 @@
+from collections import Counter
+from datetime import date
+
+from sqlalchemy import delete, func, insert, select, update
+from models import db
+from models.models import (
+    Category,
+    DashboardSummaryState,
+    DashboardTaskSummary,
+    EntityMaster,
+    EntityRegulationTasks,
+    RegulationMaster,
+)
+
+# Columns of dashboard_task_summary that identify a bucket, in key order
+BUCKET_COLUMNS = (
+    'entity_id', 'category_id', 'criticality', 'internal_external',
+    'mandatory_optional', 'due_month', 'task_status',
+)
+
+# Task columns the bucket of a task is derived from
+TASK_COLUMNS = (
+    'entity_id', 'regulation_id', 'criticality', 'internal_external',
+    'mandatory_optional', 'due_on', 'status', 'end_date',
+)
+
+# Statuses whose classification depends on today's date
+OPEN_STATUSES = ('WIP', 'Yet to Start')
+
+STATE_ID = 1
+
+
+def classify_task_status(status, due_on, end_date, as_of):
+    """
+    Python twin of the dashboard's TASK_STATUS_SQL classification.
+
+    Args:
+        status: Raw task status (WIP, Completed, Yet to Start)
+        due_on: Due date of the task
+        end_date: Completion date, only used for completed tasks
+        as_of: Date the delay statuses are evaluated against
+
+    Returns:
+        One of the six dashboard statuses, or 'Unknown'
+    """
+    if status == 'WIP':
+        return 'Ongoing' if due_on >= as_of else 'Ongoing with Delay'
+    if status == 'Completed' and end_date is not None:
+        return 'Completed' if end_date <= due_on else 'Completed with Delay'
+    if status == 'Yet to Start':
+        return 'Due' if due_on >= as_of else 'Due with Delay'
+    return 'Unknown'
+
+
+def snapshot_task(task):
+    """Capture the bucket-relevant columns of a task (model instance or row dict)."""
+    if isinstance(task, dict):
+        return {column: task.get(column) for column in TASK_COLUMNS}
+    return {column: getattr(task, column) for column in TASK_COLUMNS}
+
+
+def _bucket_key(task, category_id, as_of):
+    return (
+        task['entity_id'],
+        category_id or 0,
+        task['criticality'] or 'Not Specified',
+        task['internal_external'] or '',
+        task['mandatory_optional'] or '',
+        task['due_on'].replace(day=1),
+        classify_task_status(task['status'], task['due_on'], task['end_date'], as_of),
+    )
+
+
+def _summary_as_of(lock=False):
+    query = select(DashboardSummaryState).where(DashboardSummaryState.id == STATE_ID)
+    if lock:
+        query = query.with_for_update()
+    else:
+        # Shared lock so a concurrent roll forward waits for this write to commit
+        query = query.with_for_update(read=True)
+    return db.session.execute(query).scalar_one_or_none()
+
+
+def _apply_counts(deltas):
+    """Add signed counts to their buckets with one upsert statement."""
+    rows = [
+        dict(zip(BUCKET_COLUMNS, key), task_count=count)
+        for key, count in deltas.items() if count
+    ]
+    if not rows:
+        return
+
+    table = DashboardTaskSummary.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        stmt = mysql_insert(table).values(rows)
+        stmt = stmt.on_duplicate_key_update(task_count=table.c.task_count + stmt.inserted.task_count)
+    elif dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c[column] for column in BUCKET_COLUMNS],
+            set_={'task_count': table.c.task_count + stmt.excluded.task_count},
+        )
+    else:
+        for row in rows:
+            bucket = [table.c[column] == row[column] for column in BUCKET_COLUMNS]
+            updated = db.session.execute(
+                update(table).where(*bucket).values(task_count=table.c.task_count + row['task_count'])
+            ).rowcount
+            if not updated:
+                db.session.execute(insert(table).values(row))
+        return
+    db.session.execute(stmt)
+
+
+def record_task_changes(before=(), after=()):
+    """
+    Move tasks between summary buckets in the caller's transaction.
+
+    Call this before committing a task write with snapshots (see snapshot_task)
+    of the affected tasks as they were before and as they are after the write.
+    New tasks only have an after snapshot and deleted tasks only a before one.
+    Nothing is recorded until the summary has been built once.
+
+    The state row is read with a shared lock (FOR SHARE), which task writers
+    hold together; it only makes them wait for the exclusive lock of a
+    roll_forward() or rebuild_summary() run, so that no write is classified
+    against a date the summary has already moved past. Writers that touch
+    the same bucket row still queue on that row's upsert, as they would on
+    any counter (see benchmarks/summary_contention.py).
+    """
+    before, after = list(before), list(after)
+    if not before and not after:
+        return
+
+    state = _summary_as_of()
+    if state is None:
+        return
+
+    regulation_ids = {task['regulation_id'] for task in before + after}
+    categories = dict(db.session.execute(
+        select(RegulationMaster.regulation_id, RegulationMaster.category_id)
+        .where(RegulationMaster.regulation_id.in_(regulation_ids))
+    ).all())
+
+    deltas = Counter()
+    for task in before:
+        deltas[_bucket_key(task, categories.get(task['regulation_id']), state.as_of)] -= 1
+    for task in after:
+        deltas[_bucket_key(task, categories.get(task['regulation_id']), state.as_of)] += 1
+    _apply_counts(deltas)
+
+
+def _grouped_tasks(*conditions):
+    """Task counts grouped by every column a bucket is derived from."""
+    ert = EntityRegulationTasks
+    on_time = (ert.end_date <= ert.due_on).label('on_time')
+    columns = (
+        ert.entity_id, RegulationMaster.category_id, ert.criticality, ert.internal_external,
+        ert.mandatory_optional, ert.due_on, ert.status, on_time,
+    )
+    query = (
+        select(*columns, func.count().label('task_count'))
+        .select_from(ert)
+        .outerjoin(RegulationMaster, ert.regulation_id == RegulationMaster.regulation_id)
+        .where(*conditions)
+        .group_by(*columns)
+    )
+    for row in db.session.execute(query):
+        task = dict(row._mapping)
+        # Any end date on the right side of due_on classifies the same way
+        task['end_date'] = None if task['on_time'] is None else (
+            task['due_on'] if task['on_time'] else date.max
+        )
+        yield task, row.category_id, row.task_count
+
+
+def roll_forward(today=None):
+    """
+    Re-bucket open tasks whose due date passed since the summary was last
+    evaluated, moving them to the matching "with Delay" status.
+
+    Only tasks due between the previous evaluation date and today are read,
+    so a daily run touches one day of tasks. Builds the summary from scratch
+    if it has never been built. Run by `flask refresh-dashboard-summary`;
+    task writes wait on its lock for the length of the run.
+
+    Returns:
+        Number of tasks moved between buckets
+    """
+    today = today or date.today()
+    state = _summary_as_of(lock=True)
+    if state is None:
+        return rebuild_summary(today)
+    if state.as_of >= today:
+        db.session.commit()
+        return 0
+
+    ert = EntityRegulationTasks
+    deltas = Counter()
+    moved = 0
+    for task, category_id, count in _grouped_tasks(
+        ert.status.in_(OPEN_STATUSES), ert.due_on >= state.as_of, ert.due_on < today
+    ):
+        deltas[_bucket_key(task, category_id, state.as_of)] -= count
+        deltas[_bucket_key(task, category_id, today)] += count
+        moved += count
+
+    _apply_counts(deltas)
+    db.session.execute(delete(DashboardTaskSummary).where(DashboardTaskSummary.task_count <= 0))
+    state.as_of = today
+    db.session.commit()
+    return moved
+
+
+def rebuild_summary(today=None):
+    """
+    Recompute every bucket from entity_regulation_tasks.
+
+    Used to build the summary the first time and to reconcile it after
+    changes that bypass the task routes (e.g. manual SQL or category moves).
+
+    Returns:
+        Number of tasks counted
+    """
+    today = today or date.today()
+    state = _summary_as_of(lock=True)
+
+    counts = Counter()
+    for task, category_id, count in _grouped_tasks():
+        counts[_bucket_key(task, category_id, today)] += count
+
+    db.session.execute(delete(DashboardTaskSummary))
+    _apply_counts(counts)
+    if state is None:
+        db.session.add(DashboardSummaryState(id=STATE_ID, as_of=today))
+    else:
+        state.as_of = today
+    db.session.commit()
+    return sum(counts.values())
+
+
+def summary_is_current(today=None):
+    """
+    Whether the summary has been built and rolled forward to today.
+
+    Read-only, so dashboard GETs never lock or write the summary: until
+    `flask refresh-dashboard-summary` has run for the day they fall back to
+    the live query.
+    """
+    state = db.session.get(DashboardSummaryState, STATE_ID)
+    return state is not None and state.as_of >= (today or date.today())
+
+
+def fetch_summary_breakdowns(conn, entity_id=None, due_from=None, due_to=None,
+                             internal_external=None, mandatory_optional=None):
+    """
+    Read the dashboard breakdowns from the summary table.
+
+    Buckets are monthly, so due_from/due_to must be month aligned. The result
+    has the same shape as the rolled-up rows of the live dashboard query.
+
+    Args:
+        conn: Connection to run the query on
+        entity_id: Entity to restrict to, or None for every entity
+        due_from, due_to: Inclusive due date window, or None for no window
+        internal_external: 'I', 'E' or None for both
+        mandatory_optional: 'M', 'O' or None for both
+
+    Returns:
+        List of dicts with dimension, dimension_value, task_status, task_count,
+        all_statuses and all_values
+    """
+    summary = DashboardTaskSummary
+    conditions = [
+        (EntityMaster.obsolete_current.is_(None)) | (EntityMaster.obsolete_current != 'O'),
+    ]
+    if entity_id is not None:
+        conditions.append(summary.entity_id == entity_id)
+    if due_from is not None:
+        conditions.append(summary.due_month.between(due_from.replace(day=1), due_to))
+    if internal_external is not None:
+        conditions.append(summary.internal_external == internal_external)
+    if mandatory_optional is not None:
+        conditions.append(summary.mandatory_optional == mandatory_optional)
+
+    query = (
+        select(
+            EntityMaster.entity_name,
+            Category.category_type,
+            summary.criticality,
+            summary.task_status,
+            func.sum(summary.task_count).label('task_count'),
+        )
+        .select_from(summary)
+        .outerjoin(EntityMaster, summary.entity_id == EntityMaster.entity_id)
+        .outerjoin(Category, summary.category_id == Category.category_id)
+        .where(*conditions)
+        .group_by(EntityMaster.entity_name, Category.category_type, summary.criticality, summary.task_status)
+    )
+
+    totals = Counter()
+    for row in conn.execute(query):
+        count = int(row.task_count or 0)
+        if count <= 0:
+            continue
+        totals[('entity', row.entity_name, row.task_status)] += count
+        totals[('category', row.category_type, row.task_status)] += count
+        totals[('criticality', row.criticality, row.task_status)] += count
+        totals[('status', None, row.task_status)] += count
+
+    rows = [{
+        'dimension': 'entity', 'dimension_value': None, 'task_status': None,
+        'task_count': sum(count for (dimension, _, _), count in totals.items() if dimension == 'status'),
+        'all_statuses': 1, 'all_values': 1,
+    }]
+    for (dimension, value, task_status), count in totals.items():
+        if dimension == 'status':
+            rows.append({
+                'dimension': 'entity', 'dimension_value': None, 'task_status': task_status,
+                'task_count': count, 'all_statuses': 0, 'all_values': 1,
+            })
+        else:
+            rows.append({
+                'dimension': dimension, 'dimension_value': value, 'task_status': task_status,
+                'task_count': count, 'all_statuses': 0, 'all_values': 0,
+            })
+    return rows
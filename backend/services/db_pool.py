@@ -0,0 +1,69 @@
+import threading
+import time
+
+from sqlalchemy import event
+from models import db
+
+
+class PoolMetrics:
+    """Counters for connections opened by and checked out of the SQLAlchemy pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+        self.checkouts = 0
+        self.checkout_wait_seconds_total = 0.0
+        self.checkout_wait_seconds_max = 0.0
+
+    def record_open(self):
+        with self._lock:
+            self.connections_opened += 1
+
+    def record_checkout(self, wait_seconds):
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_wait_seconds_total += wait_seconds
+            self.checkout_wait_seconds_max = max(self.checkout_wait_seconds_max, wait_seconds)
+
+    def snapshot(self, engine=None):
+        with self._lock:
+            data = {
+                "connections_opened": self.connections_opened,
+                "checkouts": self.checkouts,
+                "checkout_wait_seconds_total": round(self.checkout_wait_seconds_total, 6),
+                "checkout_wait_seconds_max": round(self.checkout_wait_seconds_max, 6),
+            }
+        pool = engine.pool if engine is not None else None
+        if pool is not None and hasattr(pool, 'checkedout'):
+            data.update({
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+            })
+        return data
+
+
+pool_metrics = PoolMetrics()
+
+
+def instrument_pool(engine):
+    """Count every new DBAPI connection the engine's pool opens."""
+    if not event.contains(engine, 'connect', _on_connect):
+        event.listen(engine, 'connect', _on_connect)
+
+
+def _on_connect(dbapi_connection, connection_record):
+    pool_metrics.record_open()
+
+
+def checkout_connection():
+    """
+    Check a connection out of the shared application pool, recording how long
+    the checkout (including the pre-ping) waited.
+
+    The caller must close() the connection to hand it back to the pool.
+    """
+    started = time.perf_counter()
+    conn = db.engine.connect()
+    pool_metrics.record_checkout(time.perf_counter() - started)
+    return conn
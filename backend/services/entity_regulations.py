@@ -0,0 +1,187 @@
+from sqlalchemy import and_, case, func, insert, or_, select, update
+
+from models import db
+from models.models import ActivityMaster, EntityRegulation, RegulationMaster
+
+
+def activity_counts(regulation_ids):
+    """
+    Current mandatory and optional activity counts of several regulations in
+    one grouped query.
+
+    Args:
+        regulation_ids: Regulation IDs to count for
+
+    Returns:
+        Dict of regulation_id -> (mandatory count, optional count), holding
+        only the regulations that exist
+    """
+    regulation_ids = list(dict.fromkeys(regulation_ids))
+    if not regulation_ids:
+        return {}
+
+    # Outer join so regulations without any current activity still come back
+    # (with a zero count) and unknown IDs do not
+    rows = db.session.execute(
+        select(RegulationMaster.regulation_id, ActivityMaster.mandatory_optional, func.count(ActivityMaster.activity_id))
+        .outerjoin(ActivityMaster, and_(
+            ActivityMaster.regulation_id == RegulationMaster.regulation_id,
+            or_(ActivityMaster.obsolete_current != "O", ActivityMaster.obsolete_current.is_(None)),
+        ))
+        .where(RegulationMaster.regulation_id.in_(regulation_ids))
+        .group_by(RegulationMaster.regulation_id, ActivityMaster.mandatory_optional)
+    ).all()
+
+    return _fold_counts(rows)
+
+
+def _fold_counts(rows):
+    # (regulation_id, mandatory_optional, count) rows -> {regulation_id: (mandatory, optional)}
+    counts = {}
+    for regulation_id, mandatory_optional, count in rows:
+        mandatory, optional = counts.get(regulation_id, (0, 0))
+        if mandatory_optional == "M":
+            mandatory += count
+        elif mandatory_optional == "O":
+            optional += count
+        counts[regulation_id] = (mandatory, optional)
+    return counts
+
+
+def add_regulations_to_entity(entity_id, regulation_ids):
+    """
+    Insert the entity_regulation rows of an entity for several regulations,
+    with their activity counts, in one grouped count query and one bulk
+    insert. Unknown regulation IDs are skipped. The caller commits.
+
+    Returns:
+        List of the regulation IDs added
+    """
+    counts = activity_counts(regulation_ids)
+    rows = [{
+        "entity_id": entity_id,
+        "regulation_id": regulation_id,
+        "mandatory_activities": mandatory,
+        "optional_activities": optional,
+        "obsolete_current": None,
+    } for regulation_id, (mandatory, optional) in counts.items()]
+    if rows:
+        db.session.execute(insert(EntityRegulation), rows)
+    return list(counts)
+
+
+def retire_entity_regulations(entity_id, regulation_ids):
+    """
+    Mark several regulations of an entity obsolete in one UPDATE. The caller commits.
+
+    Returns:
+        Number of entity_regulation rows updated
+    """
+    if not regulation_ids:
+        return 0
+    return EntityRegulation.query.filter(
+        EntityRegulation.entity_id == entity_id,
+        EntityRegulation.regulation_id.in_(list(regulation_ids)),
+    ).update({EntityRegulation.obsolete_current: 'O'}, synchronize_session=False)
+
+
+def activity_state(activity):
+    """(mandatory_optional, obsolete_current) of an activity, as passed to apply_activity_change()."""
+    return activity.mandatory_optional, activity.obsolete_current
+
+
+def counter_deltas(state):
+    # (mandatory delta, optional delta) an activity in this state contributes
+    if state is None:
+        return 0, 0
+    mandatory_optional, obsolete_current = state
+    if obsolete_current == "O":
+        return 0, 0
+    return int(mandatory_optional == "M"), int(mandatory_optional == "O")
+
+
+def apply_activity_change(regulation_id, before, after):
+    """
+    Keep the mandatory/optional activity counters of every entity linked to a
+    regulation in step with one activity change, in a single UPDATE. The
+    caller commits, so the counters change in the same transaction as the
+    activity.
+
+    Args:
+        regulation_id: Regulation of the activity
+        before: activity_state() before the change, None for a new activity
+        after: activity_state() after the change
+
+    Returns:
+        Number of entity_regulation rows updated
+    """
+    old_mandatory, old_optional = counter_deltas(before)
+    new_mandatory, new_optional = counter_deltas(after)
+    return apply_activity_deltas({regulation_id: (new_mandatory - old_mandatory, new_optional - old_optional)})
+
+
+def apply_activity_deltas(deltas):
+    """
+    Add counter deltas to the entity_regulation rows of several regulations
+    in one UPDATE. The caller commits.
+
+    Args:
+        deltas: Dict of regulation_id -> (mandatory delta, optional delta)
+
+    Returns:
+        Number of entity_regulation rows updated
+    """
+    deltas = {regulation_id: delta for regulation_id, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return 0
+
+    def per_regulation(index):
+        return case({regulation_id: delta[index] for regulation_id, delta in deltas.items()},
+                    value=EntityRegulation.regulation_id, else_=0)
+
+    # Obsolete links are updated as well, as reconcile_activity_counts() checks every row
+    return db.session.execute(
+        update(EntityRegulation)
+        .where(EntityRegulation.regulation_id.in_(list(deltas)))
+        .values(
+            mandatory_activities=func.coalesce(EntityRegulation.mandatory_activities, 0) + per_regulation(0),
+            optional_activities=func.coalesce(EntityRegulation.optional_activities, 0) + per_regulation(1),
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def reconcile_activity_counts():
+    """
+    Recount the activity counters of every entity_regulation row in one
+    grouped pass over activity_master and fix the rows that drifted.
+
+    Returns:
+        (rows checked, rows corrected)
+    """
+    counts = _fold_counts(db.session.execute(
+        select(ActivityMaster.regulation_id, ActivityMaster.mandatory_optional, func.count())
+        .where(or_(ActivityMaster.obsolete_current != "O", ActivityMaster.obsolete_current.is_(None)))
+        .group_by(ActivityMaster.regulation_id, ActivityMaster.mandatory_optional)
+    ).all())
+
+    links = db.session.execute(select(
+        EntityRegulation.entity_id, EntityRegulation.regulation_id,
+        EntityRegulation.mandatory_activities, EntityRegulation.optional_activities,
+    )).all()
+
+    corrections = []
+    for entity_id, regulation_id, mandatory, optional in links:
+        expected = counts.get(regulation_id, (0, 0))
+        if (mandatory, optional) != expected:
+            corrections.append({
+                "entity_id": entity_id,
+                "regulation_id": regulation_id,
+                "mandatory_activities": expected[0],
+                "optional_activities": expected[1],
+            })
+    if corrections:
+        # Bulk UPDATE by primary key, one executemany
+        db.session.execute(update(EntityRegulation), corrections)
+    db.session.commit()
+    return len(links), len(corrections)
@@ -0,0 +1,108 @@
+import bisect
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from flask import current_app, has_app_context
+from models import db
+from models.models import HolidayMaster
+
+# Seconds a loaded calendar stays valid. Writes in this process invalidate it
+# immediately; the TTL only bounds staleness from writes made by other workers.
+DEFAULT_TTL_SECONDS = 300
+
+
+class HolidayCalendar:
+    """
+    In-memory index of the holiday_master table.
+
+    The table is loaded once into a sorted list of dates per entity (plus a
+    merged list across all entities) and every lookup after that is a bisect
+    over the cached list instead of a database round trip.
+    """
+
+    def __init__(self, ttl_seconds=None):
+        self._lock = threading.Lock()
+        self._ttl_seconds = ttl_seconds
+        self._by_entity = None
+        self._all_dates = None
+        self._loaded_at = 0.0
+        self.load_count = 0
+
+    def _ttl(self):
+        if self._ttl_seconds is not None:
+            return self._ttl_seconds
+        if has_app_context():
+            return current_app.config.get('HOLIDAY_CALENDAR_TTL', DEFAULT_TTL_SECONDS)
+        return DEFAULT_TTL_SECONDS
+
+    def invalidate(self):
+        """Drop the cached calendar so the next lookup reloads it."""
+        with self._lock:
+            self._by_entity = None
+            self._all_dates = None
+
+    def _load(self):
+        rows = db.session.query(HolidayMaster.entity_id, HolidayMaster.holiday_date).filter(
+            (HolidayMaster.obsolete_current != 'O') | (HolidayMaster.obsolete_current.is_(None))
+        ).all()
+
+        by_entity = defaultdict(set)
+        for entity_id, holiday_date in rows:
+            by_entity[entity_id].add(holiday_date)
+
+        self._by_entity = {entity_id: sorted(dates) for entity_id, dates in by_entity.items()}
+        self._all_dates = sorted(set().union(*by_entity.values())) if by_entity else []
+        self._loaded_at = time.monotonic()
+        self.load_count += 1
+
+    def holidays(self, entity_id=None):
+        """
+        Return the sorted holiday dates for an entity.
+
+        Args:
+            entity_id: Entity to look up, or None for the holidays of every entity
+
+        Returns:
+            Sorted list of datetime.date objects
+        """
+        with self._lock:
+            if self._by_entity is None or time.monotonic() - self._loaded_at > self._ttl():
+                self._load()
+            if entity_id is None:
+                return self._all_dates
+            return self._by_entity.get(entity_id, [])
+
+    def is_holiday(self, day, entity_id=None):
+        dates = self.holidays(entity_id)
+        index = bisect.bisect_left(dates, day)
+        return index < len(dates) and dates[index] == day
+
+    def previous_business_day(self, day, entity_id=None):
+        """
+        Move a date back until it is neither a weekend nor a holiday.
+
+        Args:
+            day: The date to check and adjust
+            entity_id: Entity whose holidays apply, or None for any entity's holidays
+
+        Returns:
+            The latest business day on or before the given date
+        """
+        dates = self.holidays(entity_id)
+        while True:
+            if day.weekday() == 5:  # Saturday
+                day -= timedelta(days=1)
+            elif day.weekday() == 6:  # Sunday
+                day -= timedelta(days=2)
+            else:
+                index = bisect.bisect_left(dates, day)
+                if index < len(dates) and dates[index] == day:
+                    day -= timedelta(days=1)
+                else:
+                    return day
+
+
+# Shared instance used by the routes and helpers
+holiday_calendar = HolidayCalendar()
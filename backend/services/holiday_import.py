@@ -0,0 +1,320 @@
+import csv
+import io
+import logging
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import and_, bindparam, insert, or_, select, update
+
+from models import db
+from models.models import EntityMaster, EntityRegulationTasks, HolidayMaster
+from services.dashboard_summary import OPEN_STATUSES, TASK_COLUMNS, record_task_changes
+from services.holiday_calendar import HolidayCalendar
+
+logger = logging.getLogger(__name__)
+
+# entity_id values (any case) meaning "every entity"; an empty cell counts too
+GLOBAL_ENTITY_IDS = ('ALL', 'GLOBAL', '*')
+
+# Holiday rows per upsert statement
+UPSERT_BATCH_SIZE = 1000
+
+_DESCRIPTION_LENGTH = HolidayMaster.__table__.c.description.type.length
+
+
+class HolidayUploadError(Exception):
+    """The calendar file as a whole cannot be read."""
+
+
+def _is_global(entity_id):
+    return not entity_id or entity_id.upper() in GLOBAL_ENTITY_IDS
+
+
+def _parse_date(value):
+    value = str(value).strip()
+    for pattern in ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(value, pattern).date()
+        except ValueError:
+            continue
+    raise ValueError(f"holiday_date {value!r} is not a date (YYYY-MM-DD)")
+
+
+# ------------------------------------------------------------ parsers --
+
+def parse_holiday_csv(stream, default_entity_id=None):
+    """
+    Read a CSV calendar with holiday_date, description and an optional
+    entity_id column.
+
+    Yields:
+        (row number, holiday_date, description, entity_id or None for every
+        entity, error message or None)
+    """
+    reader = csv.reader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    try:
+        headers = [str(name).strip().lower().replace(' ', '_') for name in next(reader)]
+    except StopIteration:
+        raise HolidayUploadError("The file is empty")
+    missing = [name for name in ('holiday_date', 'description') if name not in headers]
+    if missing:
+        raise HolidayUploadError(f"Missing columns: {', '.join(missing)}")
+
+    for number, values in enumerate(reader, start=2):
+        if not any(value.strip() for value in values):
+            continue
+        cells = dict(zip(headers, (value.strip() for value in values)))
+        entity_id = cells.get('entity_id') or default_entity_id
+        try:
+            holiday_date = _parse_date(cells.get('holiday_date', ''))
+        except ValueError as e:
+            yield number, None, None, None, str(e)
+            continue
+        yield number, holiday_date, cells.get('description', ''), None if _is_global(entity_id) else entity_id, None
+
+
+def _ics_lines(stream):
+    # Unfold continuation lines (RFC 5545 3.1) and number the logical lines
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    current, start = None, 0
+    for number, line in enumerate(text, start=1):
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield start, current
+        current, start = line, number
+    if current is not None:
+        yield start, current
+
+
+def _ics_text(value):
+    return value.replace('\\n', ' ').replace('\\N', ' ').replace('\\,', ',').replace('\\;', ';').replace('\\\\', '\\')
+
+
+def _ics_date(value):
+    # DTSTART/DTEND value: 20261109 or 20261109T000000[Z]
+    return datetime.strptime(value[:8], '%Y%m%d').date()
+
+
+def parse_holiday_ics(stream, default_entity_id=None):
+    """
+    Read the all-day events of an iCalendar file; an event spanning several
+    days gives one holiday per day. Every event applies to default_entity_id
+    (None for every entity).
+
+    Yields:
+        (line number of the event, holiday_date, description, entity_id, error message or None)
+    """
+    entity_id = None if _is_global(default_entity_id) else default_entity_id
+    event, seen_calendar = None, False
+    for number, line in _ics_lines(stream):
+        name, _, value = line.partition(':')
+        name = name.split(';', 1)[0].upper()
+        if name == 'BEGIN' and value.upper() == 'VCALENDAR':
+            seen_calendar = True
+        elif name == 'BEGIN' and value.upper() == 'VEVENT':
+            event = {"line": number}
+        elif event is not None and name in ('DTSTART', 'DTEND', 'SUMMARY'):
+            event[name] = value.strip()
+        elif name == 'END' and value.upper() == 'VEVENT' and event is not None:
+            try:
+                start = _ics_date(event['DTSTART'])
+                end = _ics_date(event['DTEND']) if 'DTEND' in event else start + timedelta(days=1)
+            except (KeyError, ValueError):
+                yield event['line'], None, None, None, "event has no valid DTSTART date"
+            else:
+                description = _ics_text(event.get('SUMMARY', ''))
+                day = start
+                while True:
+                    yield event['line'], day, description, entity_id, None
+                    day += timedelta(days=1)
+                    if day >= end:  # DTEND is exclusive
+                        break
+            event = None
+    if not seen_calendar:
+        raise HolidayUploadError("Not an iCalendar file (no BEGIN:VCALENDAR)")
+
+
+def parse_holidays(stream, filename, default_entity_id=None):
+    """Pick the parser from the file extension (.csv or .ics)."""
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension == 'csv':
+        return parse_holiday_csv(stream, default_entity_id)
+    if extension in ('ics', 'ical'):
+        return parse_holiday_ics(stream, default_entity_id)
+    raise HolidayUploadError("Only .csv and .ics calendars can be uploaded")
+
+
+# ------------------------------------------------------------- upsert --
+
+def _upsert_statement(rows):
+    # Multi-row insert that revives and re-describes holidays already on file
+    table = HolidayMaster.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        stmt = mysql_insert(table).values(rows)
+        return stmt.on_duplicate_key_update(description=stmt.inserted.description,
+                                            obsolete_current=stmt.inserted.obsolete_current)
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(table).values(rows)
+        return stmt.on_conflict_do_update(
+            index_elements=[table.c.holiday_date, table.c.entity_id],
+            set_={'description': stmt.excluded.description, 'obsolete_current': stmt.excluded.obsolete_current},
+        )
+    return None
+
+
+def upsert_holidays(rows):
+    """
+    Insert or update holiday_master rows, UPSERT_BATCH_SIZE rows per statement.
+
+    Args:
+        rows: Dicts with holiday_date, description and entity_id
+    """
+    rows = [dict(row, obsolete_current='C') for row in rows]
+    for offset in range(0, len(rows), UPSERT_BATCH_SIZE):
+        batch = rows[offset:offset + UPSERT_BATCH_SIZE]
+        stmt = _upsert_statement(batch)
+        if stmt is not None:
+            db.session.execute(stmt)
+            continue
+        table = HolidayMaster.__table__
+        for row in batch:
+            updated = db.session.execute(
+                update(table)
+                .where(table.c.holiday_date == row['holiday_date'], table.c.entity_id == row['entity_id'])
+                .values(description=row['description'], obsolete_current='C')
+            ).rowcount
+            if not updated:
+                db.session.execute(insert(table).values(row))
+
+
+def import_holidays(entries):
+    """
+    Validate parsed holidays, expand the global ones to every current entity
+    and upsert them. The caller commits.
+
+    Args:
+        entries: (row, holiday_date, description, entity_id, error) tuples from a parser
+
+    Returns:
+        Dict with the holiday rows written, the first and last date, and the
+        per-row errors
+    """
+    entities = set(db.session.execute(select(EntityMaster.entity_id).where(
+        or_(EntityMaster.obsolete_current != 'O', EntityMaster.obsolete_current.is_(None))
+    )).scalars())
+
+    holidays, errors = {}, []
+    for row, holiday_date, description, entity_id, error in entries:
+        if error:
+            errors.append({"row": row, "error": error})
+            continue
+        if not description:
+            errors.append({"row": row, "error": "description is required"})
+            continue
+        if len(description) > _DESCRIPTION_LENGTH:
+            errors.append({"row": row, "error": f"description is longer than {_DESCRIPTION_LENGTH} characters"})
+            continue
+        if entity_id is not None and entity_id not in entities:
+            errors.append({"row": row, "error": f"entity_id {entity_id} does not exist"})
+            continue
+        # A later row for the same day and entity wins, as a second upload would
+        for target in (entities if entity_id is None else (entity_id,)):
+            holidays[(holiday_date, target)] = description
+
+    upsert_holidays([{"holiday_date": holiday_date, "entity_id": entity_id, "description": description}
+                     for (holiday_date, entity_id), description in holidays.items()])
+    dates = [holiday_date for holiday_date, _ in holidays]
+    return {
+        "holidays": len(holidays),
+        "date_from": min(dates) if dates else None,
+        "date_to": max(dates) if dates else None,
+        "errors": errors,
+    }
+
+
+# ----------------------------------------------------------- readjust --
+
+def readjust_due_dates(date_from=None, date_to=None, entity_ids=None, today=None):
+    """
+    Move open tasks whose due date now falls on one of their entity's
+    holidays to the previous business day, as the due date would have been
+    set had the holiday been known. The caller commits.
+
+    Tasks are found with one join of entity_regulation_tasks to
+    holiday_master (on the entity/due date index) and moved with a single
+    executemany UPDATE keyed by (entity, old due date), so the cost follows
+    the number of holiday dates hit rather than the number of tasks. The
+    dashboard summary buckets move in the same transaction. A task whose
+    previous business day is before today is left where it is rather than
+    made overdue.
+
+    Args:
+        date_from: First due date to check, today at the earliest
+        date_to: Last due date to check, open-ended if None
+        entity_ids: Entities to check, every entity if None
+        today: Date the job runs for (tests and backfills)
+
+    Returns:
+        Number of tasks moved
+    """
+    today = today or date.today()
+    date_from = max(date_from or today, today)
+    ert, holiday = EntityRegulationTasks, HolidayMaster
+
+    conditions = [
+        ert.status.in_(OPEN_STATUSES),
+        ert.due_on >= date_from,
+        or_(holiday.obsolete_current != 'O', holiday.obsolete_current.is_(None)),
+    ]
+    if date_to is not None:
+        conditions.append(ert.due_on <= date_to)
+    if entity_ids is not None:
+        conditions.append(ert.entity_id.in_(list(entity_ids)))
+
+    tasks = db.session.execute(
+        select(*(getattr(ert, column) for column in TASK_COLUMNS))
+        .join(holiday, and_(holiday.entity_id == ert.entity_id, holiday.holiday_date == ert.due_on))
+        .where(*conditions)
+    ).mappings().all()
+    if not tasks:
+        return 0
+
+    # A private calendar sees the holidays written earlier in this transaction;
+    # the shared one must not cache them before the caller commits
+    calendar = HolidayCalendar()
+    moves = {}
+    for task in tasks:
+        key = (task['entity_id'], task['due_on'])
+        if key not in moves:
+            moves[key] = calendar.previous_business_day(task['due_on'], task['entity_id'])
+    moves = {key: new_due_on for key, new_due_on in moves.items() if new_due_on >= today}
+    tasks = [task for task in tasks if (task['entity_id'], task['due_on']) in moves]
+    if not tasks:
+        return 0
+
+    # IN (...) cannot be expanded in an executemany, so the statuses are spelled out
+    table = ert.__table__
+    db.session.execute(
+        update(table)
+        .where(table.c.entity_id == bindparam('b_entity_id'), table.c.due_on == bindparam('b_due_on'),
+               or_(*(table.c.status == status for status in OPEN_STATUSES)))
+        .values(due_on=bindparam('b_new_due_on')),
+        [{"b_entity_id": entity_id, "b_due_on": due_on, "b_new_due_on": new_due_on}
+         for (entity_id, due_on), new_due_on in moves.items()],
+    )
+    before = [dict(task) for task in tasks]
+    record_task_changes(before=before,
+                        after=[dict(task, due_on=moves[(task['entity_id'], task['due_on'])]) for task in before])
+
+    logger.info("Moved %d tasks off holidays", len(tasks), extra={
+        "event": "due_date_readjust", "tasks": len(tasks), "dates": len(moves),
+    })
+    return len(tasks)
@@ -0,0 +1,180 @@
+import threading
+from collections import Counter
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import DBAPIError
+
+from config import Config
+from models import db
+from models.models import ActivityMaster, EntityMaster, IdSequence, RegulationMaster, Users
+
+# Tries at creating a counter that another worker may be creating at the same time
+_CREATE_ATTEMPTS = 3
+
+# Generated admin user ids tried before giving up (only taken by hand-made ids)
+_USER_ID_ATTEMPTS = 20
+
+
+class IdAllocator:
+    """
+    Hands out the values of named counters kept in the id_sequences table.
+
+    Every reservation is a short transaction of its own on a separate
+    connection. UPDATE ... SET next_value = next_value + n takes the row
+    lock first, so concurrent workers queue on one row instead of racing
+    on a MAX() scan, and the lock is released before the caller's
+    transaction carries on. A counter that does not exist yet is created
+    from seed(connection), the highest value already in use.
+
+    Values are unique but not gap-free: a reservation commits before the
+    caller's insert, so a value taken by a request that then fails or rolls
+    back is never reused. With block_size > 1 each worker reserves that
+    many values at a time and hands them out from memory; values of a block
+    left unused when the worker stops are skipped as well.
+    """
+
+    def __init__(self, block_size=None):
+        self.block_size = max(1, block_size or Config.ID_SEQUENCE_BLOCK_SIZE)
+        self._blocks = {}  # name -> (next value, end of block) reserved by this worker
+        self._name_locks = {}
+        self._lock = threading.Lock()
+        self.reservations = 0
+
+    def _name_lock(self, name):
+        with self._lock:
+            return self._name_locks.setdefault(name, threading.Lock())
+
+    def next_value(self, name, seed=None, engine=None):
+        """Next value of a counter, from this worker's block if one is cached."""
+        with self._name_lock(name):
+            value, end = self._blocks.get(name, (0, 0))
+            if value >= end:
+                value = self.reserve(name, seed, engine, count=self.block_size)
+                end = value + self.block_size
+            self._blocks[name] = (value + 1, end)
+            return value
+
+    def reserve(self, name, seed=None, engine=None, count=1):
+        """
+        Reserve count consecutive values of a counter, bypassing the cache.
+
+        Args:
+            name: Counter name
+            seed: Callable(connection) returning the highest value already
+                in use, called when the counter does not exist yet (0 if None)
+            engine: Engine of the id_sequences table, the application engine by default
+            count: Number of values
+
+        Returns:
+            The first reserved value
+        """
+        engine = engine or db.engine
+        table = IdSequence.__table__
+        with engine.connect() as connection:
+            for attempt in range(_CREATE_ATTEMPTS):
+                creating = False
+                try:
+                    with connection.begin():
+                        bumped = connection.execute(
+                            update(table).where(table.c.name == name).values(next_value=table.c.next_value + count)
+                        ).rowcount
+                        if bumped:
+                            first = connection.execute(
+                                select(table.c.next_value).where(table.c.name == name)
+                            ).scalar() - count
+                        else:
+                            creating = True
+                            first = (seed(connection) if seed else 0) + 1
+                            connection.execute(insert(table).values(name=name, next_value=first + count))
+                except DBAPIError:
+                    # Another worker created the counter first (duplicate key or
+                    # MySQL deadlock on the gap lock): bump the row it created
+                    if not creating or attempt == _CREATE_ATTEMPTS - 1:
+                        raise
+                    continue
+                with self._lock:
+                    self.reservations += 1
+                return first
+
+    def reset(self):
+        """Forget the cached blocks (their unused values are skipped)."""
+        with self._lock:
+            self._blocks.clear()
+
+
+id_allocator = IdAllocator()
+
+
+def _max_number_after(connection, column, prefix, bare=None):
+    # Highest <n> among the IDs shaped <prefix><n>; an ID equal to the prefix
+    # itself counts as `bare`
+    values = connection.execute(select(column).where(column.startswith(prefix, autoescape=True))).scalars()
+    numbers = [bare if value == prefix else int(value[len(prefix):])
+               for value in values if value[len(prefix):].isdigit() or (value == prefix and bare is not None)]
+    return max(numbers, default=0 if bare is None else bare - 1)
+
+
+def _regulation_counter(prefix):
+    return f"regulation:{prefix}", lambda connection: _max_number_after(connection, RegulationMaster.regulation_id, prefix)
+
+
+def _activity_counter(regulation_id):
+    return f"activity:{regulation_id}", lambda connection: connection.execute(
+        select(func.max(ActivityMaster.activity_id)).where(ActivityMaster.regulation_id == regulation_id)
+    ).scalar() or 0
+
+
+def next_regulation_id(regulation_name):
+    """Next regulation ID: the first 4 letters of the name, upper-cased, and a 3-digit number."""
+    prefix = regulation_name[:4].upper()
+    number = id_allocator.next_value(*_regulation_counter(prefix))
+    return f"{prefix}{number:03d}"
+
+
+def regulation_ids_for(regulation_names):
+    """New regulation IDs for several names at once, one reservation per distinct prefix."""
+    prefixes = [name[:4].upper() for name in regulation_names]
+    numbers = {prefix: id_allocator.reserve(*_regulation_counter(prefix), count=count)
+               for prefix, count in Counter(prefixes).items()}
+    ids = []
+    for prefix in prefixes:
+        ids.append(f"{prefix}{numbers[prefix]:03d}")
+        numbers[prefix] += 1
+    return ids
+
+
+def next_entity_id(entity_name):
+    """Next entity ID: the first 4 letters of the name, upper-cased, and a 3-digit number."""
+    prefix = entity_name[:4].upper()
+    number = id_allocator.next_value(
+        f"entity:{prefix}", lambda connection: _max_number_after(connection, EntityMaster.entity_id, prefix)
+    )
+    return f"{prefix}{number:03d}"
+
+
+def next_activity_id(regulation_id):
+    """Next activity ID of a regulation (activity IDs are numbered per regulation)."""
+    return id_allocator.next_value(*_activity_counter(regulation_id))
+
+
+def activity_ids_for(regulation_id, count):
+    """count new activity IDs of a regulation in one reservation."""
+    first = id_allocator.reserve(*_activity_counter(regulation_id), count=count)
+    return list(range(first, first + count))
+
+
+def next_user_id(base):
+    """
+    Free user ID derived from base: base itself, then base1, base2, ...
+
+    Users can also be created with an ID of their choice, so the allocated
+    ID is checked and the next one taken if it is already in use.
+    """
+    for _ in range(_USER_ID_ATTEMPTS):
+        number = id_allocator.next_value(
+            f"user:{base}", lambda connection: _max_number_after(connection, Users.user_id, base, bare=0)
+        )
+        user_id = base if number == 0 else f"{base}{number}"
+        if db.session.get(Users, user_id) is None:
+            return user_id
+    raise RuntimeError(f"No free user ID found for {base!r}")
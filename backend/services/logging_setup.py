@@ -0,0 +1,131 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+
+# Attributes every LogRecord has; anything else was passed through extra= and
+# is written out as a structured field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+_listener = None
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and any extra= fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The TEXT_FORMAT line followed by any extra= fields as key=value pairs."""
+
+    def __init__(self):
+        super().__init__(TEXT_FORMAT)
+
+    def format(self, record):
+        line = super().format(record)
+        fields = " ".join(f"{key}={value}" for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        return f"{line} {fields}" if fields else line
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    # The queue never leaves the process, so records are handed over as they
+    # are and formatted on the writer thread instead of the request thread
+    def prepare(self, record):
+        return record
+
+
+class DebugSampler(logging.Filter):
+    """
+    Keep one in every `every` DEBUG records per call site (logger and message
+    template); INFO and above always pass. Kept records carry the rate as a
+    sample_1_in field so counts can be scaled back up.
+    """
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = max(1, int(every))
+        self._seen = Counter()
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno != logging.DEBUG or self.every == 1:
+            return True
+        key = (record.name, record.msg)
+        with self._lock:
+            self._seen[key] += 1
+            keep = self._seen[key] % self.every == 1
+        if keep:
+            record.sample_1_in = self.every
+        return keep
+
+
+def parse_levels(spec):
+    """'routes.global_dash=DEBUG, rcms.requests=WARNING' -> {logger name: level}."""
+    levels = {}
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        name, _, level = item.partition('=')
+        if not level or not isinstance(logging.getLevelName(level.strip().upper()), int):
+            raise ValueError(f"Invalid LOG_LEVELS entry {item!r}, expected <logger>=<level>")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(config):
+    """
+    Send every log record through one queue to a background writer thread,
+    so request threads never block on stderr.
+
+    Uses LOG_LEVEL for the root logger, LOG_LEVELS for per-module overrides,
+    LOG_FORMAT ('json' or 'text') and LOG_DEBUG_SAMPLE_EVERY for DEBUG
+    sampling. Configures the process once; later calls are ignored.
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+
+        output = logging.StreamHandler()
+        output.setFormatter(JsonFormatter() if config.get('LOG_FORMAT', 'json') == 'json' else TextFormatter())
+
+        records = queue.SimpleQueue()
+        handler = _QueueHandler(records)
+        handler.addFilter(DebugSampler(config.get('LOG_DEBUG_SAMPLE_EVERY', 1)))
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(config.get('LOG_LEVEL', 'INFO').upper())
+        for name, level in parse_levels(config.get('LOG_LEVELS')).items():
+            logging.getLogger(name).setLevel(level)
+
+        _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Write out every queued record and stop the writer thread."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
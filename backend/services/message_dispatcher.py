@@ -0,0 +1,275 @@
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from flask import current_app
+from sqlalchemy import func, select, update
+from models import db
+from models.models import MessagePayload, MessageQueue
+from services.message_templates import render_payload
+from services.token_provider import token_provider
+
+logger = logging.getLogger(__name__)
+
+# Graph accepts at most 20 requests in one JSON $batch call
+GRAPH_BATCH_LIMIT = 20
+
+# Queue rows whose reminder email has not gone out yet
+PENDING_STATUSES = ('Scheduled', 'Added to Calendar')
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class DispatchMetrics:
+    """Totals across dispatcher runs in this process, plus the last run's numbers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.sent = 0
+        self.failed = 0
+        self.deferred = 0
+        self.last_run = None
+
+    def record(self, stats):
+        with self._lock:
+            self.runs += 1
+            self.sent += stats['sent']
+            self.failed += stats['failed']
+            self.deferred += stats['deferred']
+            self.last_run = stats
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "sent": self.sent,
+                "failed": self.failed,
+                "deferred": self.deferred,
+                "last_run": self.last_run,
+            }
+
+
+dispatch_metrics = DispatchMetrics()
+
+
+def queue_lag(today=None):
+    """
+    Pending reminder count and the age of the oldest due one.
+
+    Returns:
+        Dict with pending (due rows not yet emailed) and lag_seconds (age of the
+        oldest of them, 0 when nothing is due)
+    """
+    now = datetime.combine(today, datetime.min.time()) if today else datetime.now()
+    pending, oldest_date = db.session.execute(
+        select(func.count(), func.min(MessageQueue.date))
+        .where(MessageQueue.status.in_(PENDING_STATUSES), MessageQueue.date <= now.date())
+    ).one()
+    lag = (now - datetime.combine(oldest_date, datetime.min.time())).total_seconds() if oldest_date else 0
+    return {"pending": pending, "lag_seconds": max(lag, 0)}
+
+
+class MessageDispatcher:
+    """
+    Sends due message_queue reminders in claimed batches.
+
+    Each round claims up to concurrency * 20 due rows with
+    SELECT ... FOR UPDATE SKIP LOCKED, so other dispatcher processes skip them
+    and claim the next rows instead of double-sending. The claimed rows are
+    split into Graph $batch calls of 20 sendMail requests, sent in parallel on
+    a bounded pool, and their new statuses written with one UPDATE per status
+    and a single commit, which also releases the row locks. Rows that hit a
+    transient error keep their status and are picked up by a later run.
+    """
+
+    def __init__(self, app, token_source=None):
+        config = app.config
+        self.app = app
+        self.base_url = config.get('GRAPH_API_BASE_URL', 'https://graph.microsoft.com/v1.0').rstrip('/')
+        self.timeout = config.get('GRAPH_REQUEST_TIMEOUT', 10)
+        self.concurrency = config.get('MESSAGE_DISPATCH_CONCURRENCY', 4)
+        self.sender = config.get('MESSAGE_QUEUE_SENDER', 'preethi.b@vardaanglobal.com')
+        self.subject = config.get('MESSAGE_QUEUE_SUBJECT', 'Scheduled Reminder')
+        self._token_source = token_source or token_provider.get_token
+        self._local = threading.local()
+
+    def _http(self):
+        if not hasattr(self._local, 'session'):
+            import requests
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def claim(self, limit, today, exclude=()):
+        conditions = [MessageQueue.status.in_(PENDING_STATUSES), MessageQueue.date <= today]
+        if exclude:
+            conditions.append(MessageQueue.s_no.notin_(exclude))
+        rows = db.session.execute(
+            select(MessageQueue.s_no, MessageQueue.message_des, MessageQueue.email_id, MessageQueue.payload_hash)
+            .where(*conditions)
+            .order_by(MessageQueue.date, MessageQueue.s_no)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        ).all()
+        messages = [row._asdict() for row in rows]
+
+        # Template rows: read each distinct payload once and render it through the cache
+        hashes = {message['payload_hash'] for message in messages if message['payload_hash']}
+        bodies = {}
+        if hashes:
+            for payload in db.session.execute(
+                select(MessagePayload.payload_hash, MessagePayload.template_id, MessagePayload.params)
+                .where(MessagePayload.payload_hash.in_(hashes))
+            ):
+                bodies[payload.payload_hash] = render_payload(payload.template_id, payload.params)
+        for message in messages:
+            message['body'] = bodies.get(message['payload_hash'], message['message_des'])
+        return messages
+
+    def _sub_request(self, message):
+        return {
+            "id": str(message['s_no']),
+            "method": "POST",
+            "url": f"/users/{self.sender}/sendMail",
+            "headers": {
+                "Content-Type": "application/json",
+                "client-request-id": f"message-queue-{message['s_no']}"
+            },
+            "body": {
+                "message": {
+                    "subject": self.subject,
+                    "body": {
+                        "contentType": "HTML",
+                        "content": message['body']
+                    },
+                    "toRecipients": [
+                        {
+                            "emailAddress": {
+                                "address": message['email_id']
+                            }
+                        }
+                    ]
+                }
+            }
+        }
+
+    def send_batch(self, messages, access_token):
+        """
+        Send up to 20 messages in one Graph $batch call.
+
+        Returns:
+            Dict of s_no to 'sent', 'failed' (rejected, will not be retried) or
+            'retry' (transient error, left for the next run)
+        """
+        outcomes = {message['s_no']: 'retry' for message in messages}
+        sendable = []
+        for message in messages:
+            if not message['email_id'] or '@' not in message['email_id']:
+                logger.error("Invalid or empty email address for message %s: %s", message['s_no'], message['email_id'])
+                outcomes[message['s_no']] = 'failed'
+            else:
+                sendable.append(message)
+        if not sendable or not access_token:
+            return outcomes
+
+        import requests
+        try:
+            response = self._http().post(
+                f"{self.base_url}/$batch",
+                data=json.dumps({"requests": [self._sub_request(message) for message in sendable]}),
+                headers={'Authorization': f'Bearer {access_token}', 'Content-Type': 'application/json'},
+                timeout=self.timeout,
+            )
+        except requests.RequestException as e:
+            logger.error("Error sending message batch: %s", e)
+            return outcomes
+
+        if response.status_code != 200:
+            logger.error("Error sending message batch: %s, %s", response.status_code, response.text[:200])
+            return outcomes
+
+        try:
+            items = response.json().get('responses', [])
+        except (ValueError, AttributeError):
+            # e.g. an HTML error page from a proxy: retry the whole batch later
+            logger.error("Error sending message batch: unreadable reply, %s", response.text[:200])
+            return outcomes
+
+        for item in items:
+            s_no = int(item['id'])
+            status = int(item.get('status', 0))
+            if status in (200, 202):
+                outcomes[s_no] = 'sent'
+            elif status not in RETRYABLE_STATUS_CODES:
+                logger.error("Error sending email for message %s: %s, %s", s_no, status, item.get('body'))
+                outcomes[s_no] = 'failed'
+        return outcomes
+
+    def dispatch_round(self, pool, today, exclude=()):
+        """Claim, send and record one round of up to concurrency * 20 messages."""
+        claimed = self.claim(self.concurrency * GRAPH_BATCH_LIMIT, today, exclude)
+        if not claimed:
+            db.session.commit()
+            return {}
+
+        access_token = self._token_source()
+        batches = [claimed[i:i + GRAPH_BATCH_LIMIT] for i in range(0, len(claimed), GRAPH_BATCH_LIMIT)]
+        outcomes = {}
+        for batch_outcomes in pool.map(lambda batch: self.send_batch(batch, access_token), batches):
+            outcomes.update(batch_outcomes)
+
+        for status, outcome in (('Sent', 'sent'), ('Failed', 'failed')):
+            ids = [s_no for s_no, result in outcomes.items() if result == outcome]
+            if ids:
+                db.session.execute(
+                    update(MessageQueue).where(MessageQueue.s_no.in_(ids)).values(status=status),
+                    execution_options={"synchronize_session": False},
+                )
+        db.session.commit()
+        return outcomes
+
+    def run(self, today=None, max_rounds=None):
+        """
+        Drain every due message, round after round, until the queue is empty or
+        a round makes no progress.
+
+        Returns:
+            Run statistics including throughput and the remaining queue lag
+        """
+        started = time.perf_counter()
+        stats = {"claimed": 0, "sent": 0, "failed": 0, "deferred": 0, "rounds": 0}
+        deferred = set()
+        with self.app.app_context(), \
+                ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='message-dispatch') as pool:
+            while max_rounds is None or stats['rounds'] < max_rounds:
+                # Rows deferred earlier in this run wait for the next run
+                outcomes = self.dispatch_round(pool, today or date.today(), deferred)
+                if not outcomes:
+                    break
+                deferred.update(s_no for s_no, result in outcomes.items() if result == 'retry')
+                stats['rounds'] += 1
+                stats['claimed'] += len(outcomes)
+                results = list(outcomes.values())
+                stats['sent'] += results.count('sent')
+                stats['failed'] += results.count('failed')
+                stats['deferred'] += results.count('retry')
+                if results.count('retry') == len(results):
+                    # Graph is unavailable; leave the rest for the next run
+                    break
+
+            elapsed = time.perf_counter() - started
+            stats.update(
+                elapsed_seconds=round(elapsed, 3),
+                messages_per_second=round(stats['sent'] / elapsed, 1) if elapsed else 0.0,
+                **queue_lag(today),
+            )
+        dispatch_metrics.record(stats)
+        return stats
+
+
+def dispatch_due_messages(app=None, token_source=None):
+    """Send every due message_queue reminder once and return the run statistics."""
+    return MessageDispatcher(app or current_app._get_current_object(), token_source).run()
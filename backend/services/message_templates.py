@@ -0,0 +1,133 @@
+import hashlib
+import json
+from datetime import datetime
+from functools import lru_cache
+
+from jinja2 import Environment
+from markupsafe import Markup, escape
+from sqlalchemy import insert
+from models import db
+from models.models import MessagePayload
+
+# Number of rendered bodies kept in memory; identical payloads share one entry
+RENDER_CACHE_SIZE = 1024
+
+# Content of the queued reminder emails, filled in from the message_payload params
+TEMPLATES = {
+    'activity_reminder': {
+        'title': "Reminder: {{ activity }} Due Soon",
+        'content': """
+            <p>Dear {{ user_name }},</p>
+
+            <p>This is a reminder that the following activity is due soon:</p>
+
+            <div class="detail-row">
+                <div class="detail-label">Activity Name</div>
+                <div class="detail-value">{{ activity }}</div>
+            </div>
+
+            <div class="detail-row">
+                <div class="detail-label">Regulation</div>
+                <div class="detail-value">{{ regulation_name }}</div>
+            </div>
+
+            <div class="detail-row">
+                <div class="detail-label">Due Date</div>
+                <div class="detail-value">{{ due_date }}</div>
+            </div>
+
+            {% if document_upload %}<div class="warning">This activity requires document upload. Please ensure all necessary documents are prepared.</div>{% endif %}
+
+            {% if high_criticality %}<div class="critical">This is a high-criticality activity. Please prioritize accordingly.</div>{% endif %}
+
+            <p>Please ensure to complete this activity before the due date.</p>
+
+            <p>Best regards,<br>RCMS Team</p>
+        """,
+        'footer': "This is an automated reminder from RCMS. Please do not reply to this email.",
+    },
+}
+
+# Content is HTML and escapes its params; titles are plain text (also used as the queue row's message_des)
+_html = Environment(autoescape=True)
+_text = Environment(autoescape=False)
+
+
+@lru_cache(maxsize=None)
+def _compiled(template_id):
+    """Compile a template's title and content once per process."""
+    template = TEMPLATES[template_id]
+    return (
+        _text.from_string(template['title']),
+        _html.from_string(template['content']),
+        template['footer'],
+    )
+
+
+def canonical_params(params):
+    """Serialise params so that equal parameter sets always give the same string."""
+    return json.dumps(params, sort_keys=True, separators=(',', ':'), default=str)
+
+
+def payload_hash(template_id, params_json):
+    return hashlib.sha256(f"{template_id}\n{params_json}".encode()).hexdigest()
+
+
+def render_title(template_id, params):
+    title, _, _ = _compiled(template_id)
+    return title.render(**params)
+
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def render_payload(template_id, params_json):
+    """
+    Render the full HTML email of a stored payload.
+
+    Cached by (template_id, params_json), so a dispatcher round renders each
+    distinct body once however many queued messages share it.
+    """
+    from services.email_services import get_email_template
+
+    params = json.loads(params_json)
+    title, content, footer = _compiled(template_id)
+    return get_email_template(escape(title.render(**params)), Markup(content.render(**params)), footer)
+
+
+def store_payload(template_id, params):
+    """
+    Add a template payload to the caller's transaction unless an identical one exists.
+
+    Args:
+        template_id: Key of TEMPLATES
+        params: JSON-serialisable template parameters
+
+    Returns:
+        The payload hash to store on the MessageQueue rows
+    """
+    params_json = canonical_params(params)
+    digest = payload_hash(template_id, params_json)
+    row = {
+        'payload_hash': digest,
+        'template_id': template_id,
+        'params': params_json,
+        'created_at': datetime.now(),
+    }
+
+    table = MessagePayload.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        stmt = mysql_insert(table).values(row)
+        stmt = stmt.on_duplicate_key_update(payload_hash=stmt.inserted.payload_hash)
+    elif dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(table).values(row).on_conflict_do_nothing(index_elements=[table.c.payload_hash])
+    else:
+        if db.session.get(MessagePayload, digest) is None:
+            db.session.execute(insert(table).values(row))
+        return digest
+    db.session.execute(stmt)
+    return digest
@@ -0,0 +1,350 @@
+import json
+import logging
+import random
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+from models import db
+from models.models import NotificationOutbox
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GRAPH_API_BASE_URL = 'https://graph.microsoft.com/v1.0'
+
+# Graph responses worth retrying; any other 4xx is a permanent failure
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+# ---------------------------------------------------------------- enqueue --
+
+def enqueue(kind, graph_path, payload, fallback_path=None, idempotency_key=None):
+    """
+    Add a Graph call to the outbox in the caller's transaction.
+
+    The row is only visible to the worker once the caller commits, so the
+    notification goes out if and only if the write it belongs to succeeded.
+
+    Args:
+        kind: 'mail' or 'event', for monitoring
+        graph_path: Path below the Graph base URL to POST to (e.g. /users/x/sendMail)
+        payload: JSON-serialisable request body
+        fallback_path: Path retried once if graph_path is rejected with a 4xx
+        idempotency_key: Unique key for this notification, generated if omitted.
+            Sent as the client-request-id header on every attempt.
+
+    Returns:
+        The pending NotificationOutbox row
+    """
+    now = datetime.now()
+    message = NotificationOutbox(
+        idempotency_key=idempotency_key or uuid.uuid4().hex,
+        kind=kind,
+        graph_path=graph_path,
+        fallback_path=fallback_path,
+        payload=json.dumps(payload),
+        status='Pending',
+        attempts=0,
+        next_attempt_at=now,
+        created_at=now,
+    )
+    db.session.add(message)
+    return message
+
+
+def enqueue_mail(sender, recipient_email, subject, html_body, fallback_sender=None, save_to_sent_items=False,
+                 idempotency_key=None):
+    """Queue a sendMail call made as the sender's mailbox."""
+    payload = {
+        "message": {
+            "subject": subject,
+            "body": {
+                "contentType": "HTML",
+                "content": html_body
+            },
+            "toRecipients": [
+                {
+                    "emailAddress": {
+                        "address": recipient_email
+                    }
+                }
+            ]
+        }
+    }
+    if save_to_sent_items:
+        payload["saveToSentItems"] = "true"
+    return enqueue(
+        'mail',
+        f"/users/{sender}/sendMail",
+        payload,
+        fallback_path=f"/users/{fallback_sender}/sendMail" if fallback_sender else None,
+        idempotency_key=idempotency_key,
+    )
+
+
+def enqueue_event(mailbox, subject, start_datetime, end_datetime, attendees, description, idempotency_key=None):
+    """
+    Queue a calendar event created in the mailbox's calendar.
+
+    The idempotency key doubles as the event's transactionId, which Graph uses
+    to drop duplicate event creations when a delivery is retried.
+    """
+    idempotency_key = idempotency_key or uuid.uuid4().hex
+    payload = {
+        "subject": subject,
+        "start": {
+            "dateTime": start_datetime,
+            "timeZone": "UTC"
+        },
+        "end": {
+            "dateTime": end_datetime,
+            "timeZone": "UTC"
+        },
+        "attendees": [
+            {
+                "emailAddress": {
+                    "address": email
+                },
+                "type": "required"
+            } for email in attendees
+        ],
+        "body": {
+            "contentType": "HTML",
+            "content": description
+        },
+        "transactionId": idempotency_key
+    }
+    return enqueue('event', f"/users/{mailbox}/events", payload, idempotency_key=idempotency_key)
+
+
+# --------------------------------------------------------------- delivery --
+
+class OutboxMetrics:
+    """Delivery counters of the outbox workers in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.delivery_seconds_total = 0.0
+
+    def record(self, outcome, seconds):
+        with self._lock:
+            if outcome == 'sent':
+                self.sent += 1
+            elif outcome == 'retry':
+                self.retried += 1
+            else:
+                self.failed += 1
+            self.delivery_seconds_total += seconds
+
+    def snapshot(self):
+        with self._lock:
+            deliveries = self.sent + self.retried + self.failed
+            return {
+                "sent": self.sent,
+                "retried": self.retried,
+                "failed": self.failed,
+                "avg_delivery_seconds": round(self.delivery_seconds_total / deliveries, 6) if deliveries else 0.0,
+            }
+
+
+outbox_metrics = OutboxMetrics()
+
+
+def outbox_status_counts():
+    """Number of outbox rows per status."""
+    return dict(db.session.execute(
+        select(NotificationOutbox.status, func.count()).group_by(NotificationOutbox.status)
+    ).all())
+
+
+def _retry_after_seconds(response):
+    try:
+        return float(response.headers.get('Retry-After', 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def deliver(message, access_token, http, base_url, timeout):
+    """
+    Make one delivery attempt of a claimed outbox message.
+
+    Returns:
+        (outcome, error, retry_after) where outcome is 'sent', 'retry' or 'failed'
+    """
+    if not access_token:
+        return 'retry', 'Could not retrieve access token', 0.0
+
+    import requests
+    headers = {
+        'Authorization': f'Bearer {access_token}',
+        'Content-Type': 'application/json',
+        'client-request-id': message['idempotency_key'],
+    }
+    error = None
+    for path in filter(None, (message['graph_path'], message['fallback_path'])):
+        try:
+            response = http.post(f"{base_url}{path}", data=message['payload'], headers=headers, timeout=timeout)
+        except requests.RequestException as e:
+            return 'retry', f"{path}: {e}", 0.0
+
+        if response.status_code in (200, 201, 202):
+            return 'sent', None, 0.0
+        error = f"{path}: {response.status_code} {response.text[:200]}"
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            return 'retry', error, _retry_after_seconds(response)
+        # Rejected outright: try the fallback path, if any
+    return 'failed', error, 0.0
+
+
+class OutboxWorker:
+    """
+    Background delivery of notification_outbox rows.
+
+    A dispatcher thread claims due rows in batches (moving them to 'Sending'
+    with a lease so a crashed worker's rows are picked up again), hands the
+    HTTP calls to a bounded thread pool and records each outcome. Failed
+    attempts are retried with exponential backoff and jitter until
+    OUTBOX_MAX_ATTEMPTS is reached.
+    """
+
+    def __init__(self, app, token_source=None):
+        self.app = app
+        config = app.config
+        self.base_url = config.get('GRAPH_API_BASE_URL', DEFAULT_GRAPH_API_BASE_URL).rstrip('/')
+        self.timeout = config.get('GRAPH_REQUEST_TIMEOUT', 10)
+        self.workers = config.get('OUTBOX_WORKERS', 4)
+        self.batch_size = config.get('OUTBOX_BATCH_SIZE', 50)
+        self.poll_interval = config.get('OUTBOX_POLL_INTERVAL', 2.0)
+        self.max_attempts = config.get('OUTBOX_MAX_ATTEMPTS', 8)
+        self.retry_base_seconds = config.get('OUTBOX_RETRY_BASE_SECONDS', 5)
+        self.retry_max_seconds = config.get('OUTBOX_RETRY_MAX_SECONDS', 900)
+        self.lease_seconds = config.get('OUTBOX_LEASE_SECONDS', 120)
+        self._token_source = token_source
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='outbox')
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _token(self):
+        if self._token_source is None:
+            from services.token_provider import token_provider
+            self._token_source = token_provider.get_token
+        return self._token_source()
+
+    def _http(self):
+        # One keep-alive session per delivery thread
+        if not hasattr(self._local, 'session'):
+            import requests
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def backoff_seconds(self, attempts, retry_after=0.0):
+        delay = min(self.retry_base_seconds * 2 ** (attempts - 1), self.retry_max_seconds)
+        return max(delay + random.uniform(0, delay * 0.1), retry_after)
+
+    def claim_batch(self):
+        """Lease up to batch_size due rows to this worker and return them as plain dicts."""
+        now = datetime.now()
+        rows = db.session.execute(
+            select(NotificationOutbox)
+            .where(NotificationOutbox.status.in_(('Pending', 'Sending')),
+                   NotificationOutbox.next_attempt_at <= now)
+            .order_by(NotificationOutbox.next_attempt_at)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+
+        claimed = []
+        for row in rows:
+            row.status = 'Sending'
+            row.next_attempt_at = now + timedelta(seconds=self.lease_seconds)
+            claimed.append({
+                'id': row.id,
+                'idempotency_key': row.idempotency_key,
+                'graph_path': row.graph_path,
+                'fallback_path': row.fallback_path,
+                'payload': row.payload,
+            })
+        db.session.commit()
+        return claimed
+
+    def record_outcome(self, message_id, outcome, error, retry_after):
+        row = db.session.get(NotificationOutbox, message_id)
+        now = datetime.now()
+        row.attempts += 1
+        row.last_error = error[:500] if error else None
+        if outcome == 'sent':
+            row.status = 'Sent'
+            row.sent_at = now
+        elif outcome == 'retry' and row.attempts < self.max_attempts:
+            row.status = 'Pending'
+            row.next_attempt_at = now + timedelta(seconds=self.backoff_seconds(row.attempts, retry_after))
+        else:
+            row.status = 'Failed'
+
+    def _deliver_timed(self, message, access_token):
+        started = datetime.now()
+        outcome, error, retry_after = deliver(message, access_token, self._http(), self.base_url, self.timeout)
+        outbox_metrics.record(outcome, (datetime.now() - started).total_seconds())
+        if outcome != 'sent':
+            logger.warning("Outbox message %s %s: %s", message['id'], outcome, error)
+        return outcome, error, retry_after
+
+    def run_once(self):
+        """Claim and deliver one batch. Returns the number of rows processed."""
+        with self.app.app_context():
+            claimed = self.claim_batch()
+            if not claimed:
+                return 0
+
+            access_token = self._token()
+            results = self._pool.map(lambda message: self._deliver_timed(message, access_token), claimed)
+            for message, (outcome, error, retry_after) in zip(claimed, results):
+                self.record_outcome(message['id'], outcome, error, retry_after)
+            db.session.commit()
+            return len(claimed)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                processed = self.run_once()
+            except Exception as e:
+                logger.exception("Outbox worker error: %s", e)
+                processed = 0
+            # Keep draining while full batches come back
+            if processed < self.batch_size:
+                self._stop.wait(self.poll_interval)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='outbox-dispatcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def join(self):
+        while self._thread is not None and self._thread.is_alive():
+            self._thread.join(1.0)
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def start_outbox_worker(app, token_source=None):
+    """Start this process's outbox worker for the app (once) and return it."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = OutboxWorker(app, token_source=token_source)
+        return _worker.start()
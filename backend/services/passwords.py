@@ -0,0 +1,171 @@
+import hashlib
+import hmac
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import bcrypt
+
+from config import Config
+
+# Scheme tags stored in users.password_scheme. bcrypt is the only scheme new
+# passwords get; the others are legacy rows rehashed on their next login.
+BCRYPT = 'bcrypt'
+SHA256 = 'sha256'
+MD5 = 'md5'
+PLAIN = 'plain'
+
+_BCRYPT_HASH = re.compile(r'^\$2[aby]\$(?P<rounds>\d\d)\$')
+_HEX = re.compile(r'^[0-9a-f]+$')
+
+
+class HashingBusy(Exception):
+    """Too many password hashes are queued or a hash timed out; the caller should retry later."""
+
+
+class HashingPool:
+    """
+    Bounded pool for bcrypt work.
+
+    At most `workers` hashes run at once and at most `queue_limit` more wait;
+    beyond that run() raises HashingBusy straight away, so a login storm
+    gets fast 503s instead of tying up every request thread in bcrypt. A
+    hash still queued after `timeout` seconds raises HashingBusy as well.
+    """
+
+    def __init__(self, workers=None, queue_limit=None, timeout=None):
+        self.workers = workers or Config.PASSWORD_HASH_WORKERS
+        self.timeout = timeout or Config.PASSWORD_HASH_TIMEOUT
+        self._slots = threading.BoundedSemaphore(self.workers + (queue_limit or Config.PASSWORD_HASH_QUEUE_LIMIT))
+        self._executor = None
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+            return self._executor
+
+    def run(self, function, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashingBusy("Password hashing queue is full")
+        try:
+            future = self._pool().submit(function, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self.rejected += 1
+            raise HashingBusy("Password hashing timed out")
+        with self._lock:
+            self.completed += 1
+        return result
+
+    def record_rehash(self):
+        with self._lock:
+            self.rehashed += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "rehashed": self.rehashed,
+            }
+
+
+hashing_pool = HashingPool()
+
+
+def detect_scheme(stored):
+    """Scheme of an untagged stored password, judged from its format."""
+    if _BCRYPT_HASH.match(stored):
+        return BCRYPT
+    if len(stored) == 64 and _HEX.match(stored):
+        return SHA256
+    if len(stored) == 32 and _HEX.match(stored):
+        return MD5
+    return PLAIN
+
+
+def hash_password(password, rounds=None):
+    """bcrypt hash of a new password, computed on the hashing pool. Returns (hash, scheme tag)."""
+    rounds = rounds or Config.PASSWORD_BCRYPT_ROUNDS
+    hashed = hashing_pool.run(lambda: bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)))
+    return hashed.decode('utf-8'), BCRYPT
+
+
+def _matches(password, stored, scheme):
+    if scheme == BCRYPT:
+        return hashing_pool.run(bcrypt.checkpw, password.encode('utf-8'), stored.encode('utf-8'))
+    if scheme == SHA256:
+        return hmac.compare_digest(hashlib.sha256(password.encode('utf-8')).hexdigest(), stored)
+    if scheme == MD5:
+        return hmac.compare_digest(hashlib.md5(password.encode('utf-8')).hexdigest(), stored)
+    return hmac.compare_digest(password.encode('utf-8'), stored.encode('utf-8'))
+
+
+def needs_rehash(stored, scheme, rounds=None):
+    """True unless the password is already bcrypt at the configured cost."""
+    if scheme != BCRYPT:
+        return True
+    match = _BCRYPT_HASH.match(stored)
+    return not match or int(match.group('rounds')) < (rounds or Config.PASSWORD_BCRYPT_ROUNDS)
+
+
+def verify_password(password, stored, scheme=None):
+    """
+    Check a password against its stored form with the one scheme it uses.
+
+    Args:
+        password: The password as typed
+        stored: users.password
+        scheme: users.password_scheme, detected from the stored value if None
+
+    Returns:
+        (matches, scheme the stored value turned out to use)
+
+    Raises:
+        HashingBusy: The bcrypt pool is saturated
+    """
+    if not stored:
+        return False, scheme
+    if scheme:
+        return _matches(password, stored, scheme), scheme
+
+    scheme = detect_scheme(stored)
+    if _matches(password, stored, scheme):
+        return True, scheme
+    # An untagged plaintext password can look like a hex digest
+    if scheme in (MD5, SHA256) and _matches(password, stored, PLAIN):
+        return True, PLAIN
+    return False, scheme
+
+
+def check_user_password(user, password):
+    """
+    Verify a user's password and, on success, move it to the current bcrypt
+    cost in place (the caller commits).
+
+    Returns:
+        True if the password matched
+    """
+    matches, scheme = verify_password(password, user.password, user.password_scheme)
+    if not matches:
+        return False
+    if needs_rehash(user.password, scheme):
+        user.password, user.password_scheme = hash_password(password)
+        hashing_pool.record_rehash()
+    elif user.password_scheme != scheme:
+        user.password_scheme = scheme
+    return True
@@ -0,0 +1,261 @@
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from functools import partial
+
+from flask import request
+from sqlalchemy import event
+
+# Upper bounds (seconds) of the request duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Requests issuing the same SQL statement this many times are flagged as N+1
+DEFAULT_N_PLUS_ONE_THRESHOLD = 10
+
+# Endpoint label of requests that matched no route (404s)
+UNMATCHED_ENDPOINT = '<unmatched>'
+
+request_log = logging.getLogger('rcms.requests')
+
+# Stats of the request being handled by this thread; None in background workers
+_current_stats = ContextVar('rcms_request_stats', default=None)
+
+
+class RequestStats:
+    """SQL work done while handling one request; only touched by the request's thread."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.statement_counts = Counter()
+        self.status = None
+        self.response_bytes = None
+        self.statement_started = None
+        self.streamed = False
+
+    def record_statement(self, statement, seconds, rows):
+        self.statements += 1
+        self.db_seconds += seconds
+        if rows > 0:
+            self.rows += rows
+        self.statement_counts[statement] += 1
+
+    def repeated_statements(self, threshold):
+        """(count, statement) of every statement executed at least threshold times, most repeated first."""
+        return sorted(((count, statement) for statement, count in self.statement_counts.items() if count >= threshold),
+                      reverse=True)
+
+
+class EndpointTotals:
+    def __init__(self):
+        self.requests = Counter()
+        self.duration_buckets = [0] * len(DURATION_BUCKETS)
+        self.duration_seconds = 0.0
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.response_bytes = 0
+        self.n_plus_one = 0
+
+
+class RequestMetrics:
+    """
+    Per-endpoint totals of every finished request: count per method and
+    status, duration histogram, SQL statements, DB time, rows and response
+    bytes, plus how many requests were flagged as N+1.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = defaultdict(EndpointTotals)
+
+    def record(self, endpoint, method, status, duration, stats, n_plus_one):
+        with self._lock:
+            totals = self._endpoints[endpoint]
+            totals.requests[(method, status)] += 1
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    totals.duration_buckets[index] += 1
+            totals.duration_seconds += duration
+            totals.statements += stats.statements
+            totals.db_seconds += stats.db_seconds
+            totals.rows += stats.rows
+            totals.response_bytes += stats.response_bytes or 0
+            totals.n_plus_one += bool(n_plus_one)
+
+    def snapshot(self):
+        with self._lock:
+            return {endpoint: {
+                "requests": sum(totals.requests.values()),
+                "duration_seconds_total": round(totals.duration_seconds, 6),
+                "sql_statements_total": totals.statements,
+                "db_seconds_total": round(totals.db_seconds, 6),
+                "rows_total": totals.rows,
+                "response_bytes_total": totals.response_bytes,
+                "n_plus_one_requests": totals.n_plus_one,
+            } for endpoint, totals in self._endpoints.items()}
+
+    def prometheus(self):
+        """The totals in the Prometheus text exposition format."""
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            lines = [
+                "# HELP rcms_http_requests_total Requests handled, by endpoint, method and status.",
+                "# TYPE rcms_http_requests_total counter",
+            ]
+            for endpoint, totals in endpoints:
+                for (method, status), count in sorted(totals.requests.items()):
+                    lines.append(f'rcms_http_requests_total{{endpoint="{_label(endpoint)}",method="{method}",status="{status}"}} {count}')
+
+            lines += [
+                "# HELP rcms_http_request_duration_seconds Wall time of the request, by endpoint.",
+                "# TYPE rcms_http_request_duration_seconds histogram",
+            ]
+            for endpoint, totals in endpoints:
+                label = _label(endpoint)
+                for bound, count in zip(DURATION_BUCKETS, totals.duration_buckets):
+                    lines.append(f'rcms_http_request_duration_seconds_bucket{{endpoint="{label}",le="{bound}"}} {count}')
+                count = sum(totals.requests.values())
+                lines.append(f'rcms_http_request_duration_seconds_bucket{{endpoint="{label}",le="+Inf"}} {count}')
+                lines.append(f'rcms_http_request_duration_seconds_sum{{endpoint="{label}"}} {totals.duration_seconds:.6f}')
+                lines.append(f'rcms_http_request_duration_seconds_count{{endpoint="{label}"}} {count}')
+
+            for name, kind, help_text, attribute in (
+                ('rcms_http_request_sql_statements_total', 'counter', 'SQL statements executed by requests', 'statements'),
+                ('rcms_http_request_db_seconds_total', 'counter', 'Time spent executing SQL statements', 'db_seconds'),
+                ('rcms_http_request_db_rows_total', 'counter', 'Rows returned or affected as reported by the driver', 'rows'),
+                ('rcms_http_response_bytes_total', 'counter', 'Response body bytes sent', 'response_bytes'),
+                ('rcms_http_request_n_plus_one_total', 'counter', 'Requests that repeated one SQL statement past the N+1 threshold', 'n_plus_one'),
+            ):
+                lines += [f"# HELP {name} {help_text}, by endpoint.", f"# TYPE {name} {kind}"]
+                for endpoint, totals in endpoints:
+                    value = getattr(totals, attribute)
+                    value = f"{value:.6f}" if isinstance(value, float) else value
+                    lines.append(f'{name}{{endpoint="{_label(endpoint)}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+request_metrics = RequestMetrics()
+
+
+# ------------------------------------------------------------ SQL hooks --
+
+def instrument_queries(engine):
+    """Time every statement the engine executes and add it to the current request's stats."""
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.statement_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    if stats is None or stats.statement_started is None:
+        return
+    stats.record_statement(statement, time.perf_counter() - stats.statement_started, cursor.rowcount)
+    stats.statement_started = None
+
+
+# ------------------------------------------------------ request hooks --
+
+def init_request_metrics(app):
+    """
+    Record wall time, SQL statements, DB time, rows and response size of
+    every request handled by the app, log one structured line per request on the
+    rcms.requests logger and flag requests that look like N+1 query loops.
+    """
+    if not app.config.get('REQUEST_METRICS_ENABLED', True):
+        return
+    threshold = app.config.get('N_PLUS_ONE_THRESHOLD', DEFAULT_N_PLUS_ONE_THRESHOLD)
+
+    @app.before_request
+    def _start_request_stats():
+        _current_stats.set(RequestStats())
+
+    @app.after_request
+    def _record_response(response):
+        stats = _current_stats.get()
+        if stats is None:
+            return response
+        stats.status = response.status_code
+        if not response.is_streamed:
+            stats.response_bytes = response.calculate_content_length()
+            return response
+
+        # Streamed bodies (exports) run their queries after the request context
+        # is torn down: attribute them while the body is sent and finish the
+        # stats when the response is closed
+        stats.streamed = True
+        response.response = _stream_with_stats(response.response, stats)
+        response.call_on_close(partial(_finish, stats, request.endpoint, request.method, request.path, threshold))
+        return response
+
+    @app.teardown_request
+    def _finish_request_stats(exc):
+        stats = _current_stats.get()
+        if stats is None:
+            return
+        _current_stats.set(None)
+        if not stats.streamed:
+            _finish(stats, request.endpoint, request.method, request.path, threshold)
+
+
+def _stream_with_stats(body, stats):
+    stats.response_bytes = 0
+    try:
+        _current_stats.set(stats)
+        for chunk in body:
+            stats.response_bytes += len(chunk)
+            yield chunk
+            # The server may have run other code on this thread in between
+            _current_stats.set(stats)
+    finally:
+        _current_stats.set(None)
+        if hasattr(body, 'close'):
+            body.close()
+
+
+def _finish(stats, endpoint, method, path, threshold):
+    duration = time.perf_counter() - stats.started
+    endpoint = endpoint or UNMATCHED_ENDPOINT
+    status = stats.status or 500
+    repeated = stats.repeated_statements(threshold)
+    request_metrics.record(endpoint, method, status, duration, stats, repeated)
+
+    if repeated:
+        count, statement = repeated[0]
+        request_log.warning("Repeated SQL statement, likely N+1", extra={
+            "event": "n_plus_one", "endpoint": endpoint, "path": path,
+            "repeats": count, "statement": " ".join(statement.split())[:300],
+        })
+    if request_log.isEnabledFor(logging.INFO):
+        request_log.info("%s %s %s", method, path, status, extra={
+            "event": "request",
+            "method": method,
+            "path": path,
+            "endpoint": endpoint,
+            "status": status,
+            "duration_ms": round(duration * 1000, 2),
+            "sql_statements": stats.statements,
+            "db_ms": round(stats.db_seconds * 1000, 2),
+            "rows": stats.rows,
+            "response_bytes": stats.response_bytes,
+            "n_plus_one": bool(repeated),
+        })
@@ -0,0 +1,194 @@
+import hashlib
+import importlib.util
+import logging
+import os
+import re
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, inspect, select, text
+from models import db
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+# <version>_<name>.sql or .py, applied in version order
+MIGRATION_FILE = re.compile(r'^(?P<version>\d{4})_(?P<name>\w+)\.(?P<kind>sql|py)$')
+
+# Named lock held while migrating, so two deploys never apply the same version at once
+LOCK_NAME = 'rcms_schema_migrations'
+LOCK_TIMEOUT_SECONDS = 60
+
+# Bookkeeping table of applied versions, owned by the runner rather than the models
+schema_migrations = Table(
+    'schema_migrations', MetaData(),
+    Column('version', String(20), primary_key=True),
+    Column('name', String(100), nullable=False),
+    Column('checksum', String(64), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+class MigrationError(Exception):
+    """A migration could not be applied or the migration history is inconsistent."""
+
+
+def discover(directory=MIGRATIONS_DIR):
+    """
+    List the migration files of a directory.
+
+    Returns:
+        Dicts with version, name, kind, path and checksum, sorted by version
+    """
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+        path = os.path.join(directory, filename)
+        with open(path, 'rb') as handle:
+            checksum = hashlib.sha256(handle.read()).hexdigest()
+        migrations.append(dict(match.groupdict(), path=path, checksum=checksum))
+
+    versions = [migration['version'] for migration in migrations]
+    duplicates = {version for version in versions if versions.count(version) > 1}
+    if duplicates:
+        raise MigrationError(f"Duplicate migration versions: {', '.join(sorted(duplicates))}")
+    return migrations
+
+
+def split_statements(sql):
+    """Split a .sql migration into statements, dropping -- comment lines."""
+    lines = [line for line in sql.splitlines() if not line.strip().startswith('--')]
+    return [statement.strip() for statement in '\n'.join(lines).split(';') if statement.strip()]
+
+
+def _run_migration(connection, migration):
+    if migration['kind'] == 'sql':
+        with open(migration['path'], encoding='utf-8') as handle:
+            for statement in split_statements(handle.read()):
+                connection.execute(text(statement))
+        return
+
+    spec = importlib.util.spec_from_file_location(f"migration_{migration['version']}", migration['path'])
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.upgrade(connection)
+
+
+@contextmanager
+def _migration_lock(connection):
+    if connection.dialect.name != 'mysql':
+        yield
+        return
+    acquired = connection.execute(
+        text("SELECT GET_LOCK(:name, :timeout)"), {"name": LOCK_NAME, "timeout": LOCK_TIMEOUT_SECONDS}
+    ).scalar()
+    if acquired != 1:
+        raise MigrationError(f"Timed out waiting for the {LOCK_NAME} lock held by another migration run")
+    try:
+        yield
+    finally:
+        connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": LOCK_NAME})
+
+
+def applied_versions(connection):
+    """Applied version -> checksum, or an empty dict before the first migration run."""
+    if not inspect(connection).has_table('schema_migrations'):
+        return {}
+    return dict(connection.execute(select(schema_migrations.c.version, schema_migrations.c.checksum)).all())
+
+
+def _record(connection, migration):
+    connection.execute(schema_migrations.insert().values(
+        version=migration['version'],
+        name=migration['name'],
+        checksum=migration['checksum'],
+        applied_at=datetime.now(),
+    ))
+    connection.commit()
+
+
+def status(engine=None):
+    """
+    Applied and pending migrations of the database.
+
+    Returns:
+        List of dicts with version, name, applied and modified (the file changed
+        after it was applied)
+    """
+    engine = engine or db.engine
+    with engine.connect() as connection:
+        applied = applied_versions(connection)
+    return [{
+        "version": migration['version'],
+        "name": migration['name'],
+        "applied": migration['version'] in applied,
+        "modified": migration['version'] in applied and applied[migration['version']] != migration['checksum'],
+    } for migration in discover()]
+
+
+def upgrade(engine=None, target=None, stamp_only=False):
+    """
+    Bring the database schema up to the target version (the latest by default).
+
+    A database without any tables is created from the models in one step and
+    every migration up to the target is recorded as applied, which is what
+    running them all would produce. Otherwise each pending migration runs in
+    version order and is recorded as soon as it succeeds; MySQL DDL is not
+    transactional, so a failed migration stops the run and must be fixed
+    before the next one.
+
+    Args:
+        engine: Engine to migrate, the application engine by default
+        target: Last version to apply
+        stamp_only: Record the pending migrations as applied without running
+            them, for databases that were migrated by hand
+
+    Returns:
+        List of (version, name, action) for every migration handled, where
+        action is 'applied', 'created' or 'stamped'
+    """
+    engine = engine or db.engine
+    migrations = [m for m in discover() if target is None or m['version'] <= target]
+    if target is not None and target not in {migration['version'] for migration in migrations}:
+        raise MigrationError(f"Unknown migration version {target}")
+
+    handled = []
+    with engine.connect() as connection:
+        with _migration_lock(connection):
+            fresh = not [name for name in inspect(connection).get_table_names() if name != 'schema_migrations']
+            if fresh and target is not None and not stamp_only:
+                raise MigrationError("A new database can only be created at the latest version")
+            schema_migrations.create(connection, checkfirst=True)
+            connection.commit()
+
+            if fresh and not stamp_only:
+                # Schema at head straight from the models
+                import models.models  # noqa: F401  register the tables
+                db.metadata.create_all(connection)
+                connection.commit()
+
+            applied = applied_versions(connection)
+            for migration in migrations:
+                if migration['version'] in applied:
+                    if applied[migration['version']] != migration['checksum']:
+                        logger.warning("Migration %s_%s changed after it was applied",
+                                       migration['version'], migration['name'])
+                    continue
+
+                if fresh and not stamp_only:
+                    action = 'created'
+                elif stamp_only:
+                    action = 'stamped'
+                else:
+                    try:
+                        _run_migration(connection, migration)
+                    except Exception as e:
+                        connection.rollback()
+                        raise MigrationError(f"Migration {migration['version']}_{migration['name']} failed: {e}") from e
+                    action = 'applied'
+                _record(connection, migration)
+                handled.append((migration['version'], migration['name'], action))
+    return handled
@@ -0,0 +1,145 @@
+import logging
+import threading
+import time
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Refresh this many seconds before the cached token expires
+DEFAULT_REFRESH_MARGIN_SECONDS = 300
+
+
+def msal_token_source(config=Config):
+    """
+    Build a token source backed by one shared MSAL ConfidentialClientApplication.
+
+    The MSAL client is created on first use, so importing this module (and
+    the routes that use it) does not touch the network.
+
+    Returns:
+        Callable returning the MSAL acquire_token_for_client() result dict
+    """
+    lock = threading.Lock()
+    client = []
+    scopes = [config.GRAPH_SCOPE]
+
+    def acquire():
+        with lock:
+            if not client:
+                from msal import ConfidentialClientApplication
+                client.append(ConfidentialClientApplication(
+                    config.GRAPH_CLIENT_ID,
+                    authority=f"https://login.microsoftonline.com/{config.GRAPH_TENANT_ID}",
+                    client_credential=config.GRAPH_CLIENT_SECRET,
+                ))
+        return client[0].acquire_token_for_client(scopes=scopes)
+
+    return acquire
+
+
+class TokenProvider:
+    """
+    Process-wide cache of the Graph application bearer token.
+
+    get_token() serves the cached token until refresh_margin seconds before
+    it expires. Inside that window the cached token is still returned while
+    one background refresh replaces it; once it has expired, callers wait for
+    a single synchronous refresh instead of each fetching their own token.
+
+    The source is any callable returning an MSAL-style result dict
+    ({"access_token": ..., "expires_in": ...} or {"error": ...}), so tests can
+    plug in a fake without network access.
+    """
+
+    def __init__(self, source=None, refresh_margin=DEFAULT_REFRESH_MARGIN_SECONDS, clock=time.monotonic):
+        self._source = source
+        self._refresh_margin = refresh_margin
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._token = None
+        self._expires_at = 0.0
+        self._background_refresh = None
+        self.fetches = 0
+        self.fetch_errors = 0
+        self.cache_hits = 0
+        self.background_refreshes = 0
+
+    def set_source(self, source):
+        """Swap the token source (e.g. for a fake in tests) and drop the cached token."""
+        with self._lock:
+            self._source = source
+            self._token = None
+            self._expires_at = 0.0
+
+    def invalidate(self):
+        """Drop the cached token, e.g. after Graph rejected it with a 401."""
+        with self._lock:
+            self._token = None
+            self._expires_at = 0.0
+
+    def _fetch(self):
+        # Single flight: whoever holds _refresh_lock fetches, everyone else reuses the result
+        with self._refresh_lock:
+            with self._lock:
+                if self._token and self._clock() < self._expires_at - self._refresh_margin:
+                    return self._token
+                if self._source is None:
+                    self._source = msal_token_source()
+                source = self._source
+
+            try:
+                result = source() or {}
+            except Exception as e:
+                result = {"error": "exception", "error_description": str(e)}
+
+            with self._lock:
+                self.fetches += 1
+                if 'access_token' in result:
+                    self._token = result['access_token']
+                    self._expires_at = self._clock() + float(result.get('expires_in', 3600))
+                    return self._token
+                self.fetch_errors += 1
+                logger.error("Token retrieval failed: %s, %s (correlation ID %s)", result.get('error'),
+                             result.get('error_description'), result.get('correlation_id'))
+                # Keep serving a token that has not expired yet
+                return self._token if self._clock() < self._expires_at else None
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._background_refresh is not None and self._background_refresh.is_alive():
+                return
+            self.background_refreshes += 1
+            self._background_refresh = threading.Thread(target=self._fetch, name='token-refresh', daemon=True)
+            self._background_refresh.start()
+
+    def get_token(self):
+        """Return a bearer token for Graph, or None if none could be obtained."""
+        with self._lock:
+            now = self._clock()
+            token = self._token
+            fresh = token is not None and now < self._expires_at - self._refresh_margin
+            usable = token is not None and now < self._expires_at
+            if usable:
+                self.cache_hits += 1
+        if fresh:
+            return token
+        if usable:
+            self._refresh_in_background()
+            return token
+        return self._fetch()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "fetches": self.fetches,
+                "fetch_errors": self.fetch_errors,
+                "cache_hits": self.cache_hits,
+                "background_refreshes": self.background_refreshes,
+                "expires_in_seconds": max(round(self._expires_at - self._clock(), 1), 0) if self._token else 0,
+            }
+
+
+# Shared instance used by the routes, email services and the outbox worker
+token_provider = TokenProvider(refresh_margin=Config.GRAPH_TOKEN_REFRESH_MARGIN)
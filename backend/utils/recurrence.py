@@ -0,0 +1,112 @@
+# numpy is imported inside each function so that loading the routes does not
+# pay for it; only the first due date calculation does
+
+# ActivityMaster.frequency codes mapped to the step between two due dates,
+# either a number of weeks ('W') or a number of months ('M')
+FREQUENCY_STEPS = {
+    52: ('W', 1),   # Weekly
+    26: ('W', 2),   # Fortnightly
+    12: ('M', 1),   # Monthly
+    6: ('M', 2),    # Every 2 months
+    4: ('M', 3),    # Quarterly
+    3: ('M', 4),    # Every 4 months
+    2: ('M', 6),    # Half-yearly
+    1: ('M', 12),   # Annually
+}
+
+
+def _month_lengths(months):
+    """Number of days in each month of a datetime64[M] array."""
+    return ((months + 1).astype('datetime64[D]') - months.astype('datetime64[D]')).astype(int)
+
+
+def occurrences(frequency_timeline, frequency, horizon):
+    """
+    Generate every due date of an activity up to a horizon in one step.
+
+    Month based steps clamp the day of month the same way repeatedly adding
+    relativedelta(months=n) does: once a short month pulls the 31st back to the
+    30th (or Feb 28th), later dates keep the shorter day.
+
+    Args:
+        frequency_timeline: The first due date of the series
+        frequency: The frequency code (52=weekly, 12=monthly, etc.)
+        horizon: Last date (inclusive) to generate
+
+    Returns:
+        numpy datetime64[D] array starting with frequency_timeline. One-time and
+        unknown frequencies only yield the first date.
+    """
+    import numpy as np
+    anchor = np.datetime64(frequency_timeline, 'D')
+    end = np.datetime64(horizon, 'D')
+    if anchor > end:
+        return np.array([], dtype='datetime64[D]')
+
+    step = FREQUENCY_STEPS.get(frequency)
+    if step is None:
+        return np.array([anchor])
+
+    unit, size = step
+    if unit == 'W':
+        count = int((end - anchor).astype(int) // (7 * size)) + 1
+        return anchor + np.arange(count) * np.timedelta64(7 * size, 'D')
+
+    anchor_month = anchor.astype('datetime64[M]')
+    anchor_day = int((anchor - anchor_month.astype('datetime64[D]')).astype(int)) + 1
+    span = int((end.astype('datetime64[M]') - anchor_month).astype(int))
+    months = anchor_month + np.arange(span // size + 1) * size
+    days = np.minimum.accumulate(np.minimum(_month_lengths(months), anchor_day))
+    dates = months.astype('datetime64[D]') + (days - 1)
+    return dates[dates <= end]
+
+
+def business_day_calendar(holidays=()):
+    """Build a reusable Monday-Friday numpy business-day calendar with the given holidays."""
+    import numpy as np
+    return np.busdaycalendar(weekmask='1111100', holidays=np.asarray(list(holidays), dtype='datetime64[D]'))
+
+
+def shift_to_business_days(dates, holidays=()):
+    """
+    Move every date that falls on a weekend or holiday back to the previous
+    business day as a single array operation.
+
+    Args:
+        dates: datetime64[D] array (or list of dates) to adjust
+        holidays: Iterable of holiday dates, or a calendar from business_day_calendar()
+
+    Returns:
+        datetime64[D] array of adjusted dates
+    """
+    import numpy as np
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    if dates.size == 0:
+        return dates
+    if not isinstance(holidays, np.busdaycalendar):
+        holidays = business_day_calendar(holidays)
+    return np.busday_offset(dates, 0, roll='backward', busdaycal=holidays)
+
+
+def next_occurrence(frequency_timeline, frequency, on_or_after):
+    """
+    Return the first due date of the series falling on or after a date.
+
+    One-time and unknown frequencies return frequency_timeline unchanged.
+    """
+    step = FREQUENCY_STEPS.get(frequency)
+    if step is None or frequency_timeline >= on_or_after:
+        return frequency_timeline
+
+    import numpy as np
+    unit, size = step
+    step_days = 7 * size if unit == 'W' else 31 * size
+    horizon = np.datetime64(on_or_after, 'D') + np.timedelta64(step_days, 'D')
+    dates = occurrences(frequency_timeline, frequency, horizon)
+    return dates[dates >= np.datetime64(on_or_after, 'D')][0].astype(object)
+
+
+def to_dates(dates):
+    """Convert a datetime64[D] array into a list of datetime.date objects."""
+    import numpy as np
+    return np.asarray(dates, dtype='datetime64[D]').astype(object).tolist()
@@ -0,0 +1,149 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, has_app_context, make_response, request
+
+DEFAULT_TTL_SECONDS = 60
+DEFAULT_MAX_ENTRIES = 256
+
+
+class ResponseCache:
+    """
+    In-process TTL + LRU cache of rendered GET responses.
+
+    Entries are tagged with namespaces (e.g. 'regulations', 'tasks') and the
+    write routes drop every entry of the namespaces they touch. Like the
+    holiday calendar, invalidation is per process: the TTL bounds how stale a
+    response can be after a write handled by another worker.
+    """
+
+    def __init__(self, ttl_seconds=None, max_entries=None):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._ttl_seconds = ttl_seconds
+        self._max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _setting(self, override, key, default):
+        if override is not None:
+            return override
+        if has_app_context():
+            return current_app.config.get(key, default)
+        return default
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry['expires_at'] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, namespaces, body, mimetype, etag, ttl_seconds=None):
+        ttl = ttl_seconds if ttl_seconds is not None else self._setting(
+            self._ttl_seconds, 'RESPONSE_CACHE_TTL', DEFAULT_TTL_SECONDS)
+        max_entries = self._setting(self._max_entries, 'RESPONSE_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+        with self._lock:
+            self._entries[key] = {
+                'namespaces': namespaces,
+                'body': body,
+                'mimetype': mimetype,
+                'etag': etag,
+                'expires_at': time.monotonic() + ttl,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *namespaces):
+        """Drop every entry tagged with any of the namespaces (all entries if none are given)."""
+        with self._lock:
+            if not namespaces:
+                self._entries.clear()
+            else:
+                stale = [key for key, entry in self._entries.items()
+                         if set(entry['namespaces']) & set(namespaces)]
+                for key in stale:
+                    del self._entries[key]
+            self.invalidations += 1
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "not_modified": self.not_modified,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+# Shared instance used by the read and write routes
+response_cache = ResponseCache()
+
+
+def uncached(response):
+    """
+    Mark a response as not to be stored by cached_response (or any HTTP
+    cache), e.g. a fallback payload served while the database is down.
+    """
+    response = make_response(response)
+    response.cache_control.no_store = True
+    return response
+
+
+def cached_response(*namespaces, ttl_seconds=None):
+    """
+    Cache a GET view's successful responses keyed by path and query string.
+    Responses marked with uncached() are passed through without an entry.
+
+    Cached and fresh responses both carry an ETag, and a request whose
+    If-None-Match matches it gets an empty 304 instead of the payload.
+
+    Args:
+        namespaces: Tags used by response_cache.invalidate() to drop the entries
+        ttl_seconds: Per-view TTL, defaults to RESPONSE_CACHE_TTL
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or not current_app.config.get('RESPONSE_CACHE_ENABLED', True):
+                return view(*args, **kwargs)
+
+            key = (request.path, tuple(sorted(request.args.items(multi=True))))
+            entry = response_cache.get(key)
+            if entry is not None:
+                response = current_app.response_class(entry['body'], mimetype=entry['mimetype'])
+                response.set_etag(entry['etag'])
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.direct_passthrough or response.cache_control.no_store:
+                    return response
+                response.add_etag()
+                etag, _ = response.get_etag()
+                response_cache.set(key, namespaces, response.get_data(), response.mimetype, etag, ttl_seconds)
+
+            response.make_conditional(request)
+            if response.status_code == 304:
+                response_cache.record_not_modified()
+            return response
+        return wrapper
+    return decorator